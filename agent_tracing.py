@@ -0,0 +1,71 @@
+"""
+Tracing hooks for the LangGraph agent side of the care navigator (see tracing.py).
+
+- traced_http_client: httpx client factory for MultiServerMCPClient connections that
+  sends the current trace context with every MCP request
+- trace_tools: wraps MCP tools so each call is a client span the server continues
+- LLMSpanHandler: LangChain callback that records every chat model call as a span
+"""
+from langchain_core.callbacks import BaseCallbackHandler
+from mcp.shared._httpx_utils import create_mcp_http_client
+
+import tracing
+
+
+async def _inject_traceparent(request):
+    for key, value in tracing.inject().items():
+        request.headers[key] = value
+
+
+def traced_http_client(headers=None, timeout=None, auth=None):
+    """MCP httpx client factory that propagates the trace context"""
+    client = create_mcp_http_client(headers=headers, timeout=timeout, auth=auth)
+    client.event_hooks["request"].append(_inject_traceparent)
+    return client
+
+
+def _traced_coroutine(tool_name, coroutine):
+    async def call_tool(*args, **kwargs):
+        with tracing.span(f"tool {tool_name}", tracing.KIND_CLIENT, **{"mcp.tool": tool_name}):
+            return await coroutine(*args, **kwargs)
+    return call_tool
+
+
+def trace_tools(tools):
+    """Record each call of these LangChain MCP tools as a span (no-op when tracing is off)"""
+    if not tracing.enabled():
+        return tools
+    for tool in tools:
+        if tool.coroutine is not None:
+            tool.coroutine = _traced_coroutine(tool.name, tool.coroutine)
+    return tools
+
+
+class LLMSpanHandler(BaseCallbackHandler):
+    """Records each chat model call as a span under the span current when it starts"""
+
+    def __init__(self):
+        self._spans = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        name = (serialized or {}).get("name") or "chat_model"
+        span = tracing.start_span(f"llm {name}", tracing.KIND_CLIENT,
+                                  attributes={"llm.messages": sum(len(batch) for batch in messages)})
+        if span is not None:
+            self._spans[run_id] = span
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            if key in usage:
+                span.set_attribute(f"llm.{key}", usage[key])
+        span.end()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.record_error(error)
+            span.end()
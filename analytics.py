@@ -0,0 +1,230 @@
+"""
+Population analytics as materialized views.
+
+Each view is a set of vectorized pandas aggregates (value counts, crosstabs,
+groupbys over tables joined on patient_id) computed from the cached tables. The
+result is kept with the versions of the files it read and served as-is until one
+of them changes (or, for views relative to today, until the date changes), so a
+dashboard tile costs a dictionary lookup however many patients there are.
+"""
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from compact import as_datetime64
+
+# name -> (CSV files read, function(frames, today) -> JSON-ready dict, description, depends on today)
+VIEWS = {}
+
+# Statuses of SDOH referrals still being worked on
+OPEN_SDOH_STATUSES = ["Referred", "Engaged"]
+
+# Most common values listed per column by the conditions view
+TOP_CONDITIONS = 20
+
+AGE_BANDS = [0, 18, 35, 50, 65, 80, np.inf]
+AGE_BAND_LABELS = ["0-17", "18-34", "35-49", "50-64", "65-79", "80+"]
+
+
+def view(name, files, description, daily=False):
+    def register(fn):
+        VIEWS[name] = (files, fn, description, daily)
+        return fn
+    return register
+
+
+def _counts(series):
+    """value -> count, keys as strings, largest first"""
+    return {str(key): int(count) for key, count in series.value_counts(dropna=False).items()}
+
+
+def _risk_levels(hra_df):
+    return pd.to_numeric(hra_df["risk_level"], errors="coerce").astype("Int64")
+
+
+def _crosstab(rows, columns):
+    """{row value: {column value: count}} without the zero cells"""
+    table = pd.crosstab(rows.astype(str), columns.astype(str))
+    return {str(r): {str(c): int(n) for c, n in counts.items() if n} for r, counts in table.iterrows()}
+
+
+@view("summary", ["demographics.csv", "hra_status.csv", "sdoh_resources.csv"],
+      "Headline counts for dashboard tiles", daily=True)
+def summary_view(frames, today):
+    hra = frames["hra_status.csv"]
+    sdoh = frames["sdoh_resources.csv"]
+    due = as_datetime64(hra["next_assessment_due"])
+    open_referrals = sdoh["status"].isin(OPEN_SDOH_STATUSES)
+    return {
+        "patients": int(len(frames["demographics.csv"])),
+        "high_risk_patients": int((_risk_levels(hra) >= 4).sum()),
+        "hra_overdue": int(((due < np.datetime64(today, "D")) & (hra["status"] != "Completed")).sum()),
+        "hra_not_completed": int((hra["status"] != "Completed").sum()),
+        "open_sdoh_referrals": int(open_referrals.sum()),
+        "patients_with_open_referrals": int(sdoh.loc[open_referrals, "patient_id"].nunique()),
+    }
+
+
+@view("risk_levels", ["hra_status.csv"], "Patients by HRA risk level, and by HRA status and risk level")
+def risk_levels_view(frames, today):
+    hra = frames["hra_status.csv"]
+    risk = _risk_levels(hra)
+    return {
+        "by_risk_level": _counts(risk),
+        "by_status_and_risk_level": _crosstab(hra["status"], risk),
+    }
+
+
+@view("insurance", ["demographics.csv", "hra_status.csv"],
+      "Patients, mean age and HRA risk by insurance provider")
+def insurance_view(frames, today):
+    demographics = frames["demographics.csv"][["patient_id", "insurance_provider", "age"]]
+    hra = frames["hra_status.csv"][["patient_id"]].assign(risk_level=_risk_levels(frames["hra_status.csv"]))
+    joined = demographics.merge(hra.drop_duplicates("patient_id"), on="patient_id", how="left")
+    joined["high_risk"] = joined["risk_level"] >= 4
+    grouped = joined.groupby("insurance_provider", dropna=False, observed=True).agg(
+        patients=("patient_id", "size"),
+        mean_age=("age", "mean"),
+        mean_risk_level=("risk_level", "mean"),
+        high_risk_patients=("high_risk", "sum"),
+    )
+    return {
+        str(provider): {
+            "patients": int(row.patients),
+            "mean_age": round(float(row.mean_age), 1) if pd.notna(row.mean_age) else None,
+            "mean_risk_level": round(float(row.mean_risk_level), 2) if pd.notna(row.mean_risk_level) else None,
+            "high_risk_patients": int(row.high_risk_patients),
+        }
+        for provider, row in grouped.sort_values("patients", ascending=False).iterrows()
+    }
+
+
+@view("sdoh_status", ["sdoh_resources.csv"], "SDOH referrals by status and by resource type and status")
+def sdoh_status_view(frames, today):
+    sdoh = frames["sdoh_resources.csv"]
+    return {
+        "referrals": int(len(sdoh)),
+        "patients_with_referrals": int(sdoh["patient_id"].nunique()),
+        "by_status": _counts(sdoh["status"]),
+        "by_resource_type_and_status": _crosstab(sdoh["resource_type"], sdoh["status"]),
+    }
+
+
+@view("demographics", ["demographics.csv"], "Patients by gender, age band and ethnicity")
+def demographics_view(frames, today):
+    demographics = frames["demographics.csv"]
+    bands = pd.cut(pd.to_numeric(demographics["age"], errors="coerce"), AGE_BANDS, right=False,
+                   labels=AGE_BAND_LABELS)
+    return {
+        "by_gender": _counts(demographics["gender"]),
+        "by_age_band": {str(band): int(n) for band, n in bands.value_counts(sort=False).items()},
+        "by_ethnicity": _counts(demographics["ethnicity"]),
+    }
+
+
+@view("conditions", ["medical.csv"], "Most common medical conditions, allergies and medications")
+def conditions_view(frames, today):
+    medical = frames["medical.csv"]
+
+    def top(column, n=TOP_CONDITIONS):
+        values = medical[column].dropna().astype(str).str.split("|").explode().str.strip()
+        values = values[(values != "") & (values != "None")]
+        return {str(value): int(count) for value, count in values.value_counts().head(n).items()}
+
+    return {column: top(column) for column in ("conditions", "allergies", "medications")}
+
+
+def _sum(parts):
+    """Counts (numbers, or dicts of counts to any depth) added up key by key"""
+    if isinstance(parts[0], dict):
+        keys = dict.fromkeys(key for part in parts for key in part)
+        return {key: _sum([part[key] for part in parts if key in part]) for key in keys}
+    return sum(parts)
+
+
+def _merge_insurance(parts):
+    # Means of the parts' (rounded) means weighted by patients: may differ from the whole's in the last
+    # digit, and more when some patients lack an age or an HRA risk level
+    merged = {}
+    for provider in dict.fromkeys(provider for part in parts for provider in part):
+        rows = [part[provider] for part in parts if provider in part]
+
+        def mean(field, digits):
+            weighted = [(row[field], row["patients"]) for row in rows if row[field] is not None]
+            weight = sum(n for _, n in weighted)
+            return round(sum(value * n for value, n in weighted) / weight, digits) if weight else None
+
+        merged[provider] = {
+            "patients": sum(row["patients"] for row in rows),
+            "mean_age": mean("mean_age", 1),
+            "mean_risk_level": mean("mean_risk_level", 2),
+            "high_risk_patients": sum(row["high_risk_patients"] for row in rows),
+        }
+    return merged
+
+
+def _merge_conditions(parts):
+    # Only each part's top values are known, so counts just outside a part's top list are missed
+    return {column: dict(sorted(counts.items(), key=lambda item: -item[1])[:TOP_CONDITIONS])
+            for column, counts in _sum(parts).items()}
+
+
+# View name -> function combining its data over disjoint sets of patients; other views' counts are added up
+MERGES = {"insurance": _merge_insurance, "conditions": _merge_conditions}
+
+
+def merge_results(name, results):
+    """One view's result from its results over disjoint sets of patients (e.g. shards)"""
+    return {
+        "view": name,
+        "refreshed_at": min(result["refreshed_at"] for result in results),
+        "data": MERGES.get(name, _sum)([result["data"] for result in results]),
+    }
+
+
+class MaterializedViews:
+    """Computes each view on first use and again only when its inputs change"""
+
+    def __init__(self, table_store):
+        self.tables = table_store
+        self._results = {}
+        self._locks = {name: threading.Lock() for name in VIEWS}
+
+    def _version(self, name, today):
+        files, _, _, daily = VIEWS[name]
+        return tuple(self.tables.stamp(f) for f in files) + ((today,) if daily else ())
+
+    def get(self, name, today):
+        """The view's current result; raises KeyError for an unknown view"""
+        files, fn, _, _ = VIEWS[name]
+        version = self._version(name, today)
+        cached = self._results.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        # One refresh per change; meanwhile other readers get the previous result rather than wait
+        lock = self._locks[name]
+        if not lock.acquire(blocking=cached is None):
+            return cached[1]
+        try:
+            cached = self._results.get(name)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            frames, stamps = {}, []
+            for f in files:
+                table = self.tables.get(f)
+                if table is None:
+                    raise FileNotFoundError(f)
+                frames[f] = table.df
+                stamps.append(table.stamp)
+            result = {
+                "view": name,
+                "refreshed_at": datetime.now().isoformat(timespec="seconds"),
+                "data": fn(frames, today),
+            }
+            # The versions actually read: a table still loading may have given its previous version
+            self._results[name] = (tuple(stamps) + version[len(files):], result)
+            return result
+        finally:
+            lock.release()
@@ -1,40 +1,174 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
 import pandas as pd
+import contextlib
 import os
+import signal
+import sys
+import uuid
+import functools
+import json
+import threading
+from datetime import datetime
+
+import profiling
+from analytics import VIEWS as ANALYTICS_VIEWS, MaterializedViews
+import sdoh_bulk
+import sdoh_import
+import sharding
+from engagement_rollups import WINDOWS, parse_time_period
+from hra_worklist import CursorError
+import tracing
+from change_feed import ChangeFeed
+import compact
+from profiling import phase
+from shared_tables import file_lock
+from single_flight import SingleFlight
+from table_store import TableStore
 
 app = Flask(__name__)
+profiling.init_app(app)
+tracing.instrument_flask(app, "api_server")
+
+# Define base data directory (API_DATA_DIR points the server at another dataset)
+DATA_DIR = os.environ.get(
+    "API_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "csv_data")
+)
+
+# Worker processes serving the API (API_WORKERS). With more than one, parsed tables are published once
+# as memory-mapped files in API_SHARED_TABLES (default <data dir>/.shared_tables) that every worker
+# attaches to, SDOH writers also lock across processes, and the SDOH change feed is shared through its journal.
+WORKERS = int(os.environ.get("API_WORKERS", "1"))
+SHARED_TABLES_DIR = os.environ.get("API_SHARED_TABLES") or (
+    os.path.join(DATA_DIR, ".shared_tables") if WORKERS > 1 else None)
+
+# This server's shard when it is one of several behind shard_router.py (API_SHARD): the ids it
+# generates for new SDOH resources are then in the shard's namespace (see sharding.py)
+SHARD = os.environ.get("API_SHARD")
+RESOURCE_ID_NAMESPACE = sharding.resource_id_namespace(int(SHARD)) if SHARD else ""
+
+# Parsed, indexed tables, reloaded only when their CSV file changes
+tables = TableStore(DATA_DIR, SHARED_TABLES_DIR)
+
+# Population aggregates, recomputed only when the tables they read change
+analytics_views = MaterializedViews(tables)
+
+# Sequenced SDOH mutations for incremental consumers (journal keeps sequence numbers across restarts)
+sdoh_changes = ChangeFeed(os.environ.get(
+    "SDOH_CHANGE_JOURNAL", os.path.join(DATA_DIR, "sdoh_resources.changes.jsonl")
+), shared=WORKERS > 1)
+
+# Identical concurrent reads share one computation
+read_flight = SingleFlight()
+
+# Serializes read-modify-write cycles on sdoh_resources.csv
+sdoh_write_lock = threading.Lock()
 
-# Define base data directory
-DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "csv_data")
+# Per-patient tables served at /api/patients/<patient_id>/<table>
+PATIENT_TABLES = {
+    "demographics": "demographics.csv",
+    "engagement": "engagement.csv",
+    "hra_status": "hra_status.csv",
+    "medical_conditions": "medical.csv",
+    "sdoh_resources": "sdoh_resources.csv",
+}
 
-# Helper function to load CSV data
+# Helper function to load CSV data (shared and cached: copy before mutating)
 def load_csv_data(file_name):
-    file_path = os.path.join(DATA_DIR, file_name)
-    if not os.path.exists(file_path):
-        return None
-    return pd.read_csv(file_path)
+    with phase("load"):
+        table = tables.get(file_name)
+    return table.df if table is not None else None
+
+# Helper function to select one patient's rows from a table
+def patient_rows(file_name, patient_id):
+    with phase("load"):
+        table = tables.get(file_name)
+    with phase("filter"):
+        return table.rows(patient_id)
+
+# Helper function to turn pipe-separated medical columns into lists
+def split_pipe_columns(medical_df):
+    with phase("split"):
+        medical_df = compact.decode(medical_df)
+        for column in ['allergies', 'conditions', 'medications']:
+            medical_df[column] = medical_df[column].apply(
+                lambda x: x.split('|') if pd.notna(x) and x != 'None' else []
+            )
+    return medical_df
+
+# Helper function to convert a table to JSON-ready records (compact columns back to text)
+def to_records(df):
+    with phase("serialize"):
+        return compact.to_records(df)
+
+# Helper function to share a read endpoint's response between identical concurrent requests
+def coalesced(view):
+    """
+    Identical requests (path, query string and If-None-Match) that arrive while one
+    is being computed wait for it and get a copy of its response, marked X-Coalesced.
+    """
+    @functools.wraps(view)
+    def coalesced_view(*args, **kwargs):
+        key = (request.path, request.query_string, request.headers.get('If-None-Match'))
+
+        def render():
+            response = app.make_response(view(*args, **kwargs))
+            return response.get_data(), response.status_code, list(response.headers.items())
+
+        (body, status, headers), shared = read_flight.do(key, render)
+        response = Response(body, status, headers)
+        if shared:
+            response.headers['X-Coalesced'] = '1'
+        return response
+    return coalesced_view
+
+# Helper functions to commit SDOH changes
+def sdoh_writer(view):
+    """Run an endpoint that rewrites sdoh_resources.csv under sdoh_write_lock (no lost updates)"""
+    @functools.wraps(view)
+    def locked_view(*args, **kwargs):
+        with sdoh_write_lock:
+            if WORKERS == 1:
+                return view(*args, **kwargs)
+            with file_lock(os.path.join(DATA_DIR, 'sdoh_resources.csv.lock')):
+                return view(*args, **kwargs)
+    return locked_view
+
+def write_sdoh(sdoh_df):
+    """
+    Publish sdoh_df as the next version of sdoh_resources.csv: written to a temporary
+    file, then loaded and swapped in by the table store, so readers see the old
+    version or the new one, never a partial write, and never wait for a re-parse
+    """
+    tmp_path = f"{tables.path('sdoh_resources.csv')}.tmp"
+    with open(tmp_path, 'w', newline='') as f:
+        compact.decode(sdoh_df).to_csv(f, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+    tables.replace('sdoh_resources.csv', tmp_path)
+
+def upsert_events(changed):
+    """Change feed entries for changed SDOH rows (missing values as null so every consumer can parse them)"""
+    return [
+        {"op": "upsert", "patient_id": row["patient_id"], "resource_id": row["resource_id"], "resource": row}
+        for row in to_records(changed.astype(object).where(changed.notna(), None))
+    ]
 
 # Helper function to find patient_id from demographics
 def find_patient_id(first_name, last_name, dob):
     """Helper function to find a patient ID based on demographics"""
     # Load demographics data
-    demographics_df = load_csv_data('demographics.csv')
-    if demographics_df is None:
+    with phase("load"):
+        demographics = tables.get('demographics.csv')
+    if demographics is None:
         return None
     
     # Find matching patient (case-insensitive for names)
-    result = demographics_df[
-        (demographics_df['first_name'].str.lower() == first_name.lower()) &
-        (demographics_df['last_name'].str.lower() == last_name.lower()) &
-        (demographics_df['date_of_birth'] == dob)
-    ]
-    
-    if result.empty:
-        return None
-    
-    return result['patient_id'].iloc[0]
+    with phase("resolve"):
+        return demographics.find_identity(first_name, last_name, dob)
 
 @app.route('/api/find_patient', methods=['GET'])
+@coalesced
 def api_find_patient():
     """API endpoint to find a patient ID by demographics"""
     first_name = request.args.get('first_name')
@@ -51,7 +185,59 @@ def api_find_patient():
     else:
         return jsonify({"error": f"No patient found with name {first_name} {last_name} and DOB {dob}"}), 404
 
+@app.route('/api/patients/search', methods=['GET'])
+@coalesced
+def search_patients():
+    """
+    API endpoint to find patients when the exact name or date of birth is not known
+    
+    Query parameters (at least one name is required):
+    - first_name, last_name: may be misspelled (matched by sound and by spelling)
+    - dob: date of birth YYYY-MM-DD; optional, a close date still scores
+    - limit: maximum candidates returned (default 10, max 100)
+    
+    Returns candidates ranked by score (1.0 is an exact match on everything given).
+    """
+    first_name = request.args.get('first_name', '')
+    last_name = request.args.get('last_name', '')
+    dob = request.args.get('dob', '')
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    if not first_name.strip() and not last_name.strip():
+        return jsonify({"error": "Provide first_name and/or last_name"}), 400
+    
+    with phase("load"):
+        demographics = tables.get('demographics.csv')
+    if demographics is None:
+        return jsonify({"error": "Demographics data not found"}), 404
+    
+    with phase("resolve"):
+        candidates = demographics.search_index.search(first_name, last_name, dob, limit)
+    return jsonify({"candidates": candidates, "count": len(candidates)})
+
+@app.route('/api/patients/autocomplete', methods=['GET'])
+def autocomplete_patients():
+    """
+    API endpoint for patient type-ahead
+    
+    Query parameters:
+    - q: the start of a last and/or first name, e.g. "smi", "smith pat", "pat smi";
+      words with digits filter on date of birth, e.g. "smith 1979"
+    - limit: maximum matches returned (default 10, max 50)
+    """
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    
+    with phase("load"):
+        demographics = tables.get('demographics.csv')
+    if demographics is None:
+        return jsonify({"error": "Demographics data not found"}), 404
+    
+    with phase("resolve"):
+        matches = demographics.prefix_index.complete(query, limit)
+    return jsonify({"matches": matches, "count": len(matches)})
+
 @app.route('/api/demographics', methods=['GET'])
+@coalesced
 def get_demographics():
     """Endpoint to fetch patient demographics data"""
     first_name = request.args.get('first_name')
@@ -68,23 +254,39 @@ def get_demographics():
         if not patient_id:
             return jsonify({"error": f"Patient with name {first_name} {last_name} and DOB {dob} not found"}), 404
         
-        result = demographics_df[demographics_df['patient_id'] == patient_id]
-        return jsonify(result.to_dict(orient='records'))
+        result = patient_rows('demographics.csv', patient_id)
+        return jsonify(to_records(result))
     
     # Return all records if no identifiers specified
-    return jsonify(demographics_df.to_dict(orient='records'))
+    return jsonify(to_records(demographics_df))
+
+# Helper function to add windowed engagement metrics to engagement rows
+def with_engagement_window(engagement, rows, time_period):
+    rollups = engagement.engagement_rollups(datetime.now().strftime("%Y-%m-%d"))
+    # Rows come straight from the cached table, so their labels are row positions
+    return rows.assign(**rollups.metrics(rows.index.to_numpy(), time_period))
 
 @app.route('/api/engagement', methods=['GET'])
+@coalesced
 def get_engagement():
-    """Endpoint to fetch patient engagement metrics"""
+    """
+    Endpoint to fetch patient engagement metrics
+    
+    With time_period (30days, 90days or 365days) each record also has the metrics
+    for that window up to today: enrolled_days, enrollment_coverage,
+    visited_in_period, engagement_status and days_since_last_visit.
+    """
     first_name = request.args.get('first_name')
     last_name = request.args.get('last_name')
     dob = request.args.get('dob')
-    print(f"Received request for engagement data: {first_name} {last_name} {dob}")
+    time_period = request.args.get('time_period')
+    if time_period is not None:
+        time_period = parse_time_period(time_period)
+        if time_period is None:
+            return jsonify({"error": f"time_period must be one of {', '.join(WINDOWS)}"}), 400
     # Find by demographics if provided
     if all([first_name, last_name, dob]):
         patient_id = find_patient_id(first_name, last_name, dob)
-        print(patient_id)
         if not patient_id:
             return jsonify({"error": f"Patient with name {first_name} {last_name} and DOB {dob} not found"}), 404
     
@@ -99,15 +301,45 @@ def get_engagement():
         if not patient_id:
             return jsonify({"error": f"Patient with name {first_name} {last_name} and DOB {dob} not found"}), 404
         
-        result = engagement_df[engagement_df['patient_id'] == patient_id]
+        result = patient_rows('engagement.csv', patient_id)
         if result.empty:
             return jsonify({"error": f"Engagement data not found for {first_name} {last_name}"}), 404
-        return jsonify(result.to_dict(orient='records'))
+        if time_period:
+            result = with_engagement_window(tables.get('engagement.csv'), result, time_period)
+        return jsonify(to_records(result))
     
     # Return all records if no identifiers specified
-    return jsonify(engagement_df.to_dict(orient='records'))
+    if time_period:
+        engagement_df = with_engagement_window(tables.get('engagement.csv'), engagement_df, time_period)
+    return jsonify(to_records(engagement_df))
+
+@app.route('/api/engagement/summary', methods=['GET'])
+@coalesced
+def get_engagement_summary():
+    """
+    Endpoint for population engagement over a window up to today
+    
+    Query parameters:
+    - time_period: 30days (default), 90days or 365days
+    
+    Returns patient counts by engagement_status, enrolled and visited patients,
+    and mean enrollment coverage of the window.
+    """
+    time_period = parse_time_period(request.args.get('time_period', '30days'))
+    if time_period is None:
+        return jsonify({"error": f"time_period must be one of {', '.join(WINDOWS)}"}), 400
+    
+    with phase("load"):
+        engagement = tables.get('engagement.csv')
+    if engagement is None:
+        return jsonify({"error": "Engagement data not found"}), 404
+    
+    with phase("filter"):
+        rollups = engagement.engagement_rollups(datetime.now().strftime("%Y-%m-%d"))
+    return jsonify(rollups.summary(time_period))
 
 @app.route('/api/hra_status', methods=['GET'])
+@coalesced
 def get_hra_status():
     """Endpoint to fetch Health Risk Assessment status"""
     first_name = request.args.get('first_name')
@@ -125,15 +357,65 @@ def get_hra_status():
         if not patient_id:
             return jsonify({"error": f"Patient with name {first_name} {last_name} and DOB {dob} not found"}), 404
         
-        result = hra_df[hra_df['patient_id'] == patient_id]
+        result = patient_rows('hra_status.csv', patient_id)
         if result.empty:
             return jsonify({"error": f"HRA status not found for {first_name} {last_name}"}), 404
-        return jsonify(result.to_dict(orient='records'))
+        return jsonify(to_records(result))
     
     # Return all records if no identifiers specified
-    return jsonify(hra_df.to_dict(orient='records'))
+    return jsonify(to_records(hra_df))
+
+@app.route('/api/hra_status/worklist', methods=['GET'])
+@coalesced
+def get_hra_worklist():
+    """
+    Endpoint for the HRA worklist: patients by next assessment due date (most
+    overdue first), then risk level (highest first)
+    
+    Query parameters:
+    - status: comma-separated HRA statuses to include (default: Pending,Not Started,Expired)
+    - min_risk: lowest risk level to include (default 0: all)
+    - due_before: only assessments due before this date (YYYY-MM-DD), e.g. today for overdue ones
+    - limit: page size (default 50, max 500)
+    - cursor: "next_cursor" from the previous page
+    """
+    statuses = [s.strip() for s in request.args.get('status', 'Pending,Not Started,Expired').split(',') if s.strip()]
+    min_risk = request.args.get('min_risk', 0, type=int)
+    due_before = request.args.get('due_before') or None
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    cursor = request.args.get('cursor') or None
+    if due_before and pd.isna(pd.to_datetime(due_before, format="%Y-%m-%d", errors="coerce")):
+        return jsonify({"error": "due_before must be a date in YYYY-MM-DD format"}), 400
+    
+    with phase("load"):
+        hra = tables.get('hra_status.csv')
+        demographics = tables.get('demographics.csv')
+    if hra is None or demographics is None:
+        return jsonify({"error": "HRA status data not found"}), 404
+    
+    with phase("filter"):
+        try:
+            page, total, next_cursor = hra.hra_worklist.page(statuses, min_risk, due_before, limit, cursor)
+        except CursorError as e:
+            return jsonify({"error": str(e)}), 400
+    
+    with phase("resolve"):
+        # Add each patient's name and date of birth
+        index = demographics.patient_index
+        people = demographics.df.iloc[[index[pid][0] for pid in page["patient_id"] if pid in index]]
+        people = compact.decode(people[["patient_id", "first_name", "last_name", "date_of_birth"]])
+        page = compact.decode(page).merge(people, on="patient_id", how="left")
+        due = pd.to_datetime(page["next_assessment_due"], errors="coerce")
+        page["days_until_due"] = (due - pd.Timestamp(datetime.now().date())).dt.days
+    
+    return jsonify({
+        "patients": to_records(page.astype(object).where(page.notna(), None)),
+        "total": total,
+        "next_cursor": next_cursor,
+    })
 
 @app.route('/api/medical_conditions', methods=['GET'])
+@coalesced
 def get_medical_conditions():
     """Endpoint to fetch medical conditions data"""
     first_name = request.args.get('first_name')
@@ -145,27 +427,23 @@ def get_medical_conditions():
     if medical_df is None:
         return jsonify({"error": "Medical data not found"}), 404
     
-    # Process pipe-separated values
-    for column in ['allergies', 'conditions', 'medications']:
-        medical_df[column] = medical_df[column].apply(
-            lambda x: x.split('|') if pd.notna(x) and x != 'None' else []
-        )
-    
     # Find by demographics if provided
     if all([first_name, last_name, dob]):
         patient_id = find_patient_id(first_name, last_name, dob)
         if not patient_id:
             return jsonify({"error": f"Patient with name {first_name} {last_name} and DOB {dob} not found"}), 404
         
-        result = medical_df[medical_df['patient_id'] == patient_id]
+        result = patient_rows('medical.csv', patient_id)
         if result.empty:
             return jsonify({"error": f"Medical data not found for {first_name} {last_name}"}), 404
-        return jsonify(result.to_dict(orient='records'))
+        # Process pipe-separated values
+        return jsonify(to_records(split_pipe_columns(result)))
     
     # Return all records if no identifiers specified
-    return jsonify(medical_df.to_dict(orient='records'))
+    return jsonify(to_records(split_pipe_columns(medical_df)))
 
 @app.route('/api/sdoh_resources', methods=['GET'])
+@coalesced
 def get_sdoh_resources():
     """Endpoint to fetch Social Determinants of Health resources"""
     first_name = request.args.get('first_name')
@@ -183,15 +461,16 @@ def get_sdoh_resources():
         if not patient_id:
             return jsonify({"error": f"Patient with name {first_name} {last_name} and DOB {dob} not found"}), 404
         
-        result = sdoh_df[sdoh_df['patient_id'] == patient_id]
+        result = patient_rows('sdoh_resources.csv', patient_id)
         if result.empty:
             return jsonify({"resources": [], "message": f"No SDOH resources found for {first_name} {last_name}"}), 200
-        return jsonify(result.to_dict(orient='records'))
+        return jsonify(to_records(result))
     
     # Return all records if no identifiers specified
-    return jsonify(sdoh_df.to_dict(orient='records'))
+    return jsonify(to_records(sdoh_df))
 
 @app.route('/api/sdoh_resources/update', methods=['POST'])
+@sdoh_writer
 def update_sdoh_resources():
     """
     Endpoint to update or add SDOH resources for a patient
@@ -228,16 +507,17 @@ def update_sdoh_resources():
     patient_id = data["patient_id"]
     resources = data["resources"]
     
-    # Load current SDOH resources data
-    file_path = os.path.join(DATA_DIR, 'sdoh_resources.csv')
-    sdoh_df = pd.read_csv(file_path) if os.path.exists(file_path) else pd.DataFrame(columns=[
+    # Load current SDOH resources data (a private copy, since it is modified below)
+    sdoh_df = load_csv_data('sdoh_resources.csv')
+    sdoh_df = compact.decode(sdoh_df) if sdoh_df is not None else pd.DataFrame(columns=[
         "resource_id", "patient_id", "resource_type", "provider", 
         "referral_date", "status", "notes"
     ])
     
     # Verify patient exists
-    demographics_df = load_csv_data('demographics.csv')
-    if demographics_df is None or not (demographics_df['patient_id'] == patient_id).any():
+    with phase("load"):
+        demographics = tables.get('demographics.csv')
+    if demographics is None or not demographics.has_patient(patient_id):
         return jsonify({"error": f"Patient with ID {patient_id} not found"}), 404
     
     # Track changes
@@ -269,7 +549,7 @@ def update_sdoh_resources():
                 }), 404
         else:
             # This is a new resource
-            resource_id = f"RS{uuid.uuid4().hex[:5].upper()}"
+            resource_id = f"RS{RESOURCE_ID_NAMESPACE}{uuid.uuid4().hex[:5].upper()}"
             
             # Validate required fields for new resources
             if not all(key in resource for key in ["resource_type", "provider", "status"]):
@@ -294,7 +574,11 @@ def update_sdoh_resources():
     
     # Save the updated dataframe back to CSV
     try:
-        sdoh_df.to_csv(file_path, index=False)
+        with phase("write"):
+            write_sdoh(sdoh_df)
+        changed = sdoh_df[sdoh_df["resource_id"].isin(updated_resources + new_resources) &
+                          (sdoh_df["patient_id"] == patient_id)]
+        sdoh_changes.publish(upsert_events(changed))
         return jsonify({
             "success": True,
             "patient_id": patient_id,
@@ -308,6 +592,7 @@ def update_sdoh_resources():
 
 
 @app.route('/api/sdoh_resources/delete/<patient_id>', methods=['DELETE'])
+@sdoh_writer
 def delete_patient_sdoh_resources(patient_id):
     """
     Endpoint to delete all SDOH resources for a specific patient
@@ -316,14 +601,12 @@ def delete_patient_sdoh_resources(patient_id):
     - patient_id: The ID of the patient whose SDOH resources should be deleted
     """
     # Load current SDOH resources data
-    file_path = os.path.join(DATA_DIR, 'sdoh_resources.csv')
-    if not os.path.exists(file_path):
+    sdoh_df = load_csv_data('sdoh_resources.csv')
+    if sdoh_df is None:
         return jsonify({"error": "SDOH resources data not found"}), 404
     
-    sdoh_df = pd.read_csv(file_path)
-    
     # Check if patient has any resources
-    patient_resources = sdoh_df[sdoh_df["patient_id"] == patient_id]
+    patient_resources = patient_rows('sdoh_resources.csv', patient_id)
     if patient_resources.empty:
         return jsonify({
             "success": True,
@@ -341,7 +624,12 @@ def delete_patient_sdoh_resources(patient_id):
     
     # Save the updated dataframe back to CSV
     try:
-        sdoh_df.to_csv(file_path, index=False)
+        with phase("write"):
+            write_sdoh(sdoh_df)
+        sdoh_changes.publish([
+            {"op": "delete", "patient_id": patient_id, "resource_id": resource_id}
+            for resource_id in resource_ids
+        ])
         return jsonify({
             "success": True,
             "patient_id": patient_id,
@@ -353,7 +641,207 @@ def delete_patient_sdoh_resources(patient_id):
             "error": f"Failed to save data: {str(e)}"
         }), 500
 
+@app.route('/api/sdoh_resources/import', methods=['POST'])
+@sdoh_writer
+def import_sdoh_resources():
+    """
+    Endpoint to bulk import SDOH resources for many patients
+    
+    Upload a CSV file or NDJSON (one JSON object per line) as the request body or
+    as a multipart "file" field. The format comes from ?format=csv|ndjson, else the
+    Content-Type (text/csv, application/x-ndjson) or the uploaded file's extension.
+    
+    Columns / keys: patient_id (required), resource_id, resource_type, provider,
+    referral_date (YYYY-MM-DD), status, notes
+    - a row whose resource_id exists for that patient updates the non-empty fields it has
+    - a row without a resource_id (or with one not in the table) adds a new resource,
+      which needs resource_type, provider and status
+    
+    Query parameters:
+    - on_error: "abort" (default) imports nothing if any row is invalid;
+      "skip" imports the valid rows and reports the rest
+    - dry_run: "true" reports what would be imported without saving (the
+      inserted_resource_ids are then only provisional)
+    
+    Errors are reported per row ("row" 1 is the first data row).
+    """
+    data, fmt = sdoh_import.request_upload(request)
+    on_error = request.args.get('on_error', 'abort')
+    dry_run = request.args.get('dry_run', 'false').lower() in ('1', 'true')
+    if on_error not in ('abort', 'skip'):
+        return jsonify({"error": "on_error must be 'abort' or 'skip'"}), 400
+    if not data.strip():
+        return jsonify({"error": "Empty upload"}), 400
+    
+    with phase("parse"):
+        try:
+            rows = sdoh_import.parse_upload(data, fmt)
+        except sdoh_import.ImportFormatError as e:
+            return jsonify({"error": str(e)}), 400
+    
+    with phase("load"):
+        demographics = tables.get('demographics.csv')
+        sdoh = tables.get('sdoh_resources.csv')
+    known_patients = demographics.df["patient_id"] if demographics is not None else []
+    sdoh_df = compact.decode(sdoh.df) if sdoh is not None else pd.DataFrame(columns=sdoh_import.SDOH_COLUMNS)
+    
+    with phase("merge"):
+        merged, summary, changed, row_errors = sdoh_import.plan_import(
+            rows, sdoh_df, known_patients, datetime.now().strftime("%Y-%m-%d"), RESOURCE_ID_NAMESPACE)
+    
+    result = {**summary, "errors": row_errors, "dry_run": dry_run}
+    if summary["rejected"] and on_error == 'abort':
+        result.update({"success": False, "updated": 0, "inserted": 0, "inserted_resource_ids": {}})
+        return jsonify(result), 422
+    if dry_run or (not summary["updated"] and not summary["inserted"]):
+        return jsonify({"success": True, **result}), 200
+    
+    try:
+        with phase("write"):
+            write_sdoh(merged)
+        sdoh_changes.publish(upsert_events(changed))
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to save data: {str(e)}"
+        }), 500
+    return jsonify({"success": True, **result}), 200
+
+@app.route('/api/sdoh_resources/owners', methods=['POST'])
+def get_sdoh_resource_owners():
+    """
+    Endpoint to find which of some resource ids exist, and whose they are
+    (shard_router.py asks every shard before importing)
+    
+    Request body format: {"resource_ids": ["RS41876", ...]}
+    Returns {"owners": {resource_id: patient_id}} for the ids in the table.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get("resource_ids"), list):
+        return jsonify({"error": "Invalid request data. 'resource_ids' (a list) is required."}), 400
+    sdoh = tables.get('sdoh_resources.csv')
+    if sdoh is None:
+        return jsonify({"owners": {}})
+    found = sdoh.df[sdoh.df["resource_id"].isin([str(rid) for rid in data["resource_ids"]])]
+    return jsonify({"owners": dict(zip(found["resource_id"].astype(str), found["patient_id"].astype(str)))})
+
+@app.route('/api/sdoh_resources/bulk', methods=['POST'])
+@sdoh_writer
+def bulk_update_sdoh_resources():
+    """
+    Endpoint to apply several SDOH mutations across many patients in one commit
+    
+    Request body format:
+    {
+        "operations": [
+            {"op": "delete", "patient_ids": ["PT0F013D1E", "PT2E370DEB"]},
+            {"op": "set_status", "where": {"status": "Referred", "older_than_days": 90}, "status": "Expired"},
+            {"op": "reassign_provider", "where": {"provider": "Local Food Bank"}, "provider": "Regional Food Bank"}
+        ],
+        "dry_run": false  # Optional - report what would change without saving
+    }
+    
+    Operations run in order; filters ("where") may use patient_ids, resource_ids,
+    resource_type, provider, status (value or list), referred_before (YYYY-MM-DD)
+    and older_than_days. Either every operation is saved or, if any is invalid, none.
+    """
+    data = request.get_json(silent=True)
+    if not data or "operations" not in data:
+        return jsonify({"error": "Invalid request data. 'operations' is required."}), 400
+    dry_run = bool(data.get("dry_run", False))
+    
+    with phase("load"):
+        sdoh = tables.get('sdoh_resources.csv')
+    if sdoh is None:
+        return jsonify({"error": "SDOH resources data not found"}), 404
+    
+    with phase("filter"):
+        try:
+            sdoh_df, results, changed, deleted = sdoh_bulk.apply_operations(
+                compact.decode(sdoh.df), data["operations"], datetime.now().strftime("%Y-%m-%d"))
+        except sdoh_bulk.BulkOperationError as e:
+            return jsonify({"error": str(e)}), 400
+    
+    result = {
+        "success": True,
+        "dry_run": dry_run,
+        "operations": results,
+        "resources_updated": len(changed),
+        "resources_deleted": len(deleted),
+        "patients_affected": sorted(set(changed["patient_id"]) | set(deleted["patient_id"])),
+    }
+    if dry_run or (changed.empty and deleted.empty):
+        return jsonify(result), 200
+    
+    try:
+        with phase("write"):
+            write_sdoh(sdoh_df)
+        sdoh_changes.publish(upsert_events(changed) + [
+            {"op": "delete", "patient_id": patient_id, "resource_id": resource_id}
+            for patient_id, resource_id in zip(deleted["patient_id"], deleted["resource_id"])
+        ])
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to save data: {str(e)}"
+        }), 500
+    return jsonify(result), 200
+
+@app.route('/api/sdoh_resources/changes', methods=['GET'])
+def get_sdoh_changes():
+    """
+    Long-poll endpoint for SDOH mutations in sequence order
+    
+    Query parameters:
+    - since: last sequence number seen; omit to just get the current position
+    - timeout: seconds to wait for a change when there is none yet (default 0, max 60)
+    - limit: maximum changes returned (default 1000)
+    
+    Each change is {"seq", "ts", "op": "upsert" | "delete", "patient_id", "resource_id",
+    "resource" (upserts only)}. "reset": true means changes after `since` are no
+    longer available: re-read the SDOH table and continue from last_seq.
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({"changes": [], "last_seq": sdoh_changes.position(), "reset": False})
+    timeout = min(request.args.get('timeout', 0, type=float), 60.0)
+    limit = min(request.args.get('limit', 1000, type=int), 10000)
+    
+    changes, last_seq, reset = sdoh_changes.read(since, limit, timeout)
+    return jsonify({"changes": changes, "last_seq": last_seq, "reset": reset})
+
+@app.route('/api/sdoh_resources/changes/stream', methods=['GET'])
+def stream_sdoh_changes():
+    """
+    Server-Sent Events stream of SDOH mutations
+    
+    Starts after ?since= or the Last-Event-ID header (default: the current position).
+    Every change is an "sdoh_change" event whose id is its sequence number; a "reset"
+    event means changes were missed and the client should reload the table.
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = sdoh_changes.position()
+    
+    def events(since):
+        while True:
+            changes, last_seq, reset = sdoh_changes.read(since, timeout=15.0)
+            if reset:
+                yield f"event: reset\ndata: {json.dumps({'last_seq': last_seq})}\n\n"
+                since = last_seq
+                continue
+            if not changes:
+                # Keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+            for change in changes:
+                yield f"id: {change['seq']}\nevent: sdoh_change\ndata: {json.dumps(change, default=str)}\n\n"
+                since = change['seq']
+    
+    return Response(events(since), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/complete', methods=['GET'])
+@coalesced
 def get_patient_complete():
     """Endpoint to fetch complete patient data including all associated records"""
     first_name = request.args.get('first_name')
@@ -377,18 +865,15 @@ def get_patient_complete():
     if any(df is None for df in [demographics_df, medical_df, engagement_df, hra_df, sdoh_df]):
         return jsonify({"error": "One or more required data files not found"}), 404
     
-    # Process medical data pipe-separated values
-    for column in ['allergies', 'conditions', 'medications']:
-        medical_df[column] = medical_df[column].apply(
-            lambda x: x.split('|') if pd.notna(x) and x != 'None' else []
-        )
-    
     # Filter data for the requested patient
-    demographics = demographics_df[demographics_df['patient_id'] == patient_id]
-    medical = medical_df[medical_df['patient_id'] == patient_id]
-    engagement = engagement_df[engagement_df['patient_id'] == patient_id]
-    hra = hra_df[hra_df['patient_id'] == patient_id]
-    sdoh = sdoh_df[sdoh_df['patient_id'] == patient_id]
+    demographics = patient_rows('demographics.csv', patient_id)
+    medical = patient_rows('medical.csv', patient_id)
+    engagement = patient_rows('engagement.csv', patient_id)
+    hra = patient_rows('hra_status.csv', patient_id)
+    sdoh = patient_rows('sdoh_resources.csv', patient_id)
+    
+    # Process medical data pipe-separated values
+    medical = split_pipe_columns(medical)
     
     # Check if patient exists
     if demographics.empty:
@@ -396,14 +881,100 @@ def get_patient_complete():
     
     # Combine all data into one response
     patient_data = {
-        "demographics": demographics.to_dict(orient='records')[0] if not demographics.empty else None,
-        "medical": medical.to_dict(orient='records')[0] if not medical.empty else None,
-        "engagement": engagement.to_dict(orient='records')[0] if not engagement.empty else None,
-        "hra_status": hra.to_dict(orient='records')[0] if not hra.empty else None,
-        "sdoh_resources": sdoh.to_dict(orient='records') if not sdoh.empty else []
+        "demographics": to_records(demographics)[0] if not demographics.empty else None,
+        "medical": to_records(medical)[0] if not medical.empty else None,
+        "engagement": to_records(engagement)[0] if not engagement.empty else None,
+        "hra_status": to_records(hra)[0] if not hra.empty else None,
+        "sdoh_resources": to_records(sdoh) if not sdoh.empty else []
     }
     return jsonify(patient_data)
 
+@app.route('/api/patients/<patient_id>/<table>', methods=['GET'])
+@coalesced
+def get_patient_table(patient_id, table):
+    """
+    Endpoint to fetch one table's records for a patient by patient_id
+    
+    Tables: demographics, engagement, hra_status, medical_conditions, sdoh_resources.
+    Responses carry an ETag; send it back in If-None-Match to get 304 when unchanged.
+    """
+    file_name = PATIENT_TABLES.get(table)
+    if file_name is None:
+        return jsonify({"error": f"Unknown table {table}; choose from {', '.join(PATIENT_TABLES)}"}), 404
+    if load_csv_data(file_name) is None:
+        return jsonify({"error": f"{table} data not found"}), 404
+    
+    with phase("load"):
+        demographics = tables.get('demographics.csv')
+    if demographics is None or not demographics.has_patient(patient_id):
+        return jsonify({"error": f"Patient with ID {patient_id} not found"}), 404
+    
+    result = patient_rows(file_name, patient_id)
+    if table == "medical_conditions":
+        result = split_pipe_columns(result)
+    response = jsonify(to_records(result))
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/api/analytics', methods=['GET'])
+def list_analytics_views():
+    """Endpoint listing the population analytics views"""
+    return jsonify({"views": {name: description for name, (_, _, description, _) in ANALYTICS_VIEWS.items()}})
+
+@app.route('/api/analytics/<view_name>', methods=['GET'])
+def get_analytics_view(view_name):
+    """
+    Endpoint for one population analytics view (see /api/analytics for the list)
+    
+    Views are materialized: computed once and served from memory until a table
+    they read changes. Responses carry an ETag for If-None-Match revalidation.
+    """
+    if view_name not in ANALYTICS_VIEWS:
+        return jsonify({"error": f"Unknown view {view_name}; choose from {', '.join(ANALYTICS_VIEWS)}"}), 404
+    with phase("filter"):
+        try:
+            result = analytics_views.get(view_name, datetime.now().strftime("%Y-%m-%d"))
+        except FileNotFoundError as e:
+            return jsonify({"error": f"Data not found: {e}"}), 404
+    response = jsonify(result)
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/api/versions', methods=['GET'])
+def get_table_versions():
+    """Endpoint reporting a version per table that changes whenever its data file does"""
+    return jsonify({"tables": {table: tables.stamp(file_name) for table, file_name in PATIENT_TABLES.items()}})
+
+
+def serve_workers(host, port, workers):
+    """Pre-fork server: `workers` forked processes accept connections on one listening socket"""
+    server = make_server(host, port, app, threaded=True)
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+    print(f" * Serving on http://{host}:{port} with {workers} worker processes")
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        while children:
+            pid, _ = os.wait()
+            children.remove(pid)
+    finally:
+        for pid in children:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # API_HOST=0.0.0.0 to serve other machines, e.g. as one shard behind shard_router.py
+    host = os.environ.get("API_HOST", "127.0.0.1")
+    port = int(os.environ.get("API_PORT", 5000))
+    if WORKERS > 1:
+        serve_workers(host, port, WORKERS)
+    else:
+        app.run(debug=os.environ.get("API_DEBUG", "1") == "1", host=host, port=port)
\ No newline at end of file
@@ -0,0 +1,528 @@
+"""
+Benchmark harness for the Flask API in api_server.py.
+
+Generates synthetic patient datasets with data/patients.py and data/data_gen.py,
+drives every /api/* endpoint through Flask's test client (SDOH reads also while
+another client keeps updating the file) and reports throughput, p50/p95/p99
+latency and peak RSS as JSON, plus the memory the cached tables take (RSS growth
+from loading them, and per table as plain text columns vs compact.py encodings).
+It also checks answers that only go wrong at scale (see search_check); a failed
+check makes the run exit non-zero like a regression.
+
+Each dataset size runs in its own subprocess so peak RSS is not polluted by the
+previous size. Datasets are cached on disk by (size, seed) and every run works
+on a fresh copy, so results from different commits are directly comparable.
+
+Usage:
+    python bench_api.py --sizes 1000 100000 1000000 --output results.json
+    python bench_api.py --sizes 1000 --compare baseline.json
+"""
+import argparse
+import contextlib
+import importlib.metadata
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+GENERATOR_DIR = os.path.join(ROOT_DIR, "data")
+DEFAULT_DATA_ROOT = os.path.join(ROOT_DIR, ".bench_data")
+CSV_FILES = ["demographics.csv", "medical.csv", "engagement.csv", "hra_status.csv", "sdoh_resources.csv"]
+
+# Patients generated per batch; keeps generator memory bounded at 1M patients
+GENERATION_BATCH = 50000
+
+# Bump when the result layout or the request mix changes
+SCHEMA_VERSION = 4
+
+# Fixed "today" for bulk datasets so regenerating them gives identical files
+BULK_REFERENCE_DATE = "2025-06-01"
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+
+def summarize_latencies(latencies):
+    """Summarize per-request latencies (seconds) into milliseconds"""
+    ordered = sorted(latencies)
+    to_ms = lambda v: round(v * 1000.0, 3) if v is not None else None
+    return {
+        "p50": to_ms(percentile(ordered, 50)),
+        "p95": to_ms(percentile(ordered, 95)),
+        "p99": to_ms(percentile(ordered, 99)),
+        "mean": to_ms(sum(ordered) / len(ordered)) if ordered else None,
+        "max": to_ms(ordered[-1]) if ordered else None,
+    }
+
+
+# ---- Dataset generation ----
+def append_csv(source, target):
+    """Append a CSV file to target, skipping the header if target already exists"""
+    exists = os.path.exists(target)
+    with open(source, newline='') as src, open(target, 'a', newline='') as dst:
+        header = src.readline()
+        if not exists:
+            dst.write(header)
+        shutil.copyfileobj(src, dst)
+
+
+def generate_dataset(num_patients, seed, output_dir):
+    """Generate a dataset in batches using the data/ generators"""
+    if GENERATOR_DIR not in sys.path:
+        sys.path.insert(0, GENERATOR_DIR)
+    import data_gen
+    from patients import generate_patient_data
+
+    random.seed(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    remaining = num_patients
+    with tempfile.TemporaryDirectory() as batch_dir:
+        while remaining > 0:
+            batch = min(GENERATION_BATCH, remaining)
+            patients = generate_patient_data(batch)
+            hra_data = data_gen.generate_hra_status(patients)
+            sdoh_data = data_gen.generate_sdoh_resources(patients)
+
+            # The writers are chatty; keep the benchmark output clean
+            with contextlib.redirect_stdout(io.StringIO()):
+                data_gen.write_demographics_csv(patients, batch_dir)
+                data_gen.write_medical_csv(patients, batch_dir)
+                data_gen.write_engagement_csv(patients, batch_dir)
+                data_gen.write_hra_status_csv(hra_data, batch_dir)
+                data_gen.write_sdoh_resources_csv(sdoh_data, batch_dir)
+
+            for file_name in CSV_FILES:
+                append_csv(os.path.join(batch_dir, file_name), os.path.join(output_dir, file_name))
+            remaining -= batch
+
+
+def generate_bulk_dataset(num_patients, seed, output_dir):
+    """Generate a dataset with unique IDs and identities using data/bulk_gen.py"""
+    if GENERATOR_DIR not in sys.path:
+        sys.path.insert(0, GENERATOR_DIR)
+    import bulk_gen
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        bulk_gen.write_dataset(output_dir, num_patients, seed=seed, reference_date=BULK_REFERENCE_DATE)
+
+
+def ensure_dataset(num_patients, seed, data_root, generator="classic"):
+    """Return the cached dataset directory for (size, seed, generator), generating it if needed"""
+    suffix = "" if generator == "classic" else f"-{generator}"
+    dataset_dir = os.path.join(data_root, f"{num_patients}-{seed}{suffix}")
+    marker = os.path.join(dataset_dir, ".complete")
+    if os.path.exists(marker):
+        return dataset_dir
+
+    shutil.rmtree(dataset_dir, ignore_errors=True)
+    print(f"Generating {num_patients} patients (seed {seed}, {generator}) in {dataset_dir}", file=sys.stderr)
+    started = time.perf_counter()
+    if generator == "bulk":
+        generate_bulk_dataset(num_patients, seed, dataset_dir)
+    else:
+        generate_dataset(num_patients, seed, dataset_dir)
+    with open(marker, 'w') as f:
+        f.write(f"{time.perf_counter() - started:.1f}s\n")
+    return dataset_dir
+
+
+# ---- Peak RSS tracking ----
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter for this process (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak RSS of this process in MB, since the last reset when supported"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    # ru_maxrss is KB on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    divisor = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0
+    return round(maxrss / divisor, 1)
+
+
+def current_rss_mb():
+    """Current RSS of this process in MB (Linux only, None elsewhere)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    return None
+
+
+def table_memory(dataset_dir):
+    """
+    Per table: rows and deep memory in MB as plain text columns and compacted.
+
+    Deep memory counts a string object once per cell, even where the CSV parser
+    shares one object between equal cells, so text_mb overstates what the text
+    columns really cost; tables_rss_mb is the measured figure.
+    """
+    import pandas as pd
+    from compact import memory_bytes, read_table
+    to_mb = lambda n: round(n / (1024.0 * 1024.0), 1)
+    tables = {}
+    for file_name in CSV_FILES:
+        path = os.path.join(dataset_dir, file_name)
+        text = pd.read_csv(path)
+        rows, text_bytes = len(text), memory_bytes(text)
+        del text
+        tables[file_name.replace(".csv", "")] = {
+            "rows": rows,
+            "text_mb": to_mb(text_bytes),
+            "compact_mb": to_mb(memory_bytes(read_table(path))),
+        }
+    return tables
+
+
+# ---- Request scenarios ----
+def build_scenarios(data_dir, seed, args):
+    """Build the request mix for every /api/* endpoint from a sample of patients"""
+    import pandas as pd
+
+    demographics = pd.read_csv(os.path.join(data_dir, "demographics.csv"),
+                               usecols=["patient_id", "first_name", "last_name", "date_of_birth"])
+    sdoh = pd.read_csv(os.path.join(data_dir, "sdoh_resources.csv"), usecols=["resource_id", "patient_id"])
+
+    sample = demographics.sample(n=min(256, len(demographics)), random_state=seed).to_dict(orient='records')
+    identities = [
+        {"first_name": p["first_name"], "last_name": p["last_name"], "dob": p["date_of_birth"]}
+        for p in sample
+    ]
+
+    # Patients that own at least one resource drive the mutation endpoints
+    owned = sdoh.drop_duplicates("patient_id")
+    owned = owned.sample(n=min(len(owned), args.requests + args.warmup), random_state=seed)
+    resource_owners = owned.to_dict(orient='records')
+    del demographics, sdoh, owned
+
+    def identity_query(path):
+        return lambda i: ("GET", path, {"query_string": identities[i % len(identities)]})
+
+    def update_request(i):
+        owner = resource_owners[i % len(resource_owners)]
+        body = {
+            "patient_id": owner["patient_id"],
+            "resources": [
+                {"resource_id": owner["resource_id"], "notes": f"benchmark update {i}"},
+                {"resource_type": "Food", "provider": "Local Food Bank", "status": "Referred",
+                 "referral_date": "2025-01-01", "notes": "benchmark insert"},
+            ],
+        }
+        return ("POST", "/api/sdoh_resources/update", {"json": body})
+
+    def delete_request(i):
+        # Walk distinct owners so every call deletes real rows
+        owner = resource_owners[i % len(resource_owners)]
+        return ("DELETE", f"/api/sdoh_resources/delete/{owner['patient_id']}", {})
+
+    def full_table(path):
+        return lambda i: ("GET", path, {})
+
+    per_patient = args.requests
+    full = args.full_table_requests
+    scenarios = [
+        ("find_patient", identity_query("/api/find_patient"), per_patient),
+        ("demographics", identity_query("/api/demographics"), per_patient),
+        ("engagement", identity_query("/api/engagement"), per_patient),
+        ("hra_status", identity_query("/api/hra_status"), per_patient),
+        ("medical_conditions", identity_query("/api/medical_conditions"), per_patient),
+        ("sdoh_resources", identity_query("/api/sdoh_resources"), per_patient),
+        ("complete", identity_query("/api/complete"), per_patient),
+        ("demographics_all", full_table("/api/demographics"), full),
+        ("engagement_all", full_table("/api/engagement"), full),
+        ("hra_status_all", full_table("/api/hra_status"), full),
+        ("medical_conditions_all", full_table("/api/medical_conditions"), full),
+        ("sdoh_resources_all", full_table("/api/sdoh_resources"), full),
+        ("sdoh_update", update_request, per_patient),
+        ("sdoh_delete", delete_request, per_patient),
+        # Reads while another client keeps rewriting the file: compare with sdoh_resources
+        ("sdoh_resources_during_updates", identity_query("/api/sdoh_resources"), per_patient, update_request),
+    ]
+    if args.endpoints:
+        scenarios = [s for s in scenarios if s[0] in args.endpoints]
+    return scenarios
+
+
+def run_background(client, make_request, stop):
+    """Issue requests back to back until stop is set; returns the thread and its request counter"""
+    issued = [0]
+
+    def loop():
+        while not stop.is_set():
+            method, path, kwargs = make_request(issued[0])
+            client.open(path, method=method, **kwargs).get_data()
+            issued[0] += 1
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    return thread, issued
+
+
+def run_scenario(client, make_request, count, warmup, background=None):
+    """
+    Issue warmup + count requests and collect latencies for the measured part,
+    with background requests (another client, e.g. a writer) running meanwhile if given
+    """
+    if background is not None:
+        stop = threading.Event()
+        thread, issued = run_background(client.application.test_client(), background, stop)
+    latencies = []
+    errors = 0
+    status_codes = {}
+    started = None
+    for i in range(warmup + count):
+        method, path, kwargs = make_request(i)
+        if i == warmup:
+            started = time.perf_counter()
+        t0 = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+        elapsed = time.perf_counter() - t0
+        if i >= warmup:
+            latencies.append(elapsed)
+            status_codes[str(response.status_code)] = status_codes.get(str(response.status_code), 0) + 1
+            if response.status_code >= 500:
+                errors += 1
+    wall = time.perf_counter() - started if started is not None else 0.0
+    result = {
+        "requests": count,
+        "errors": errors,
+        "status_codes": status_codes,
+        "throughput_rps": round(count / wall, 2) if wall > 0 else None,
+        "latency_ms": summarize_latencies(latencies),
+    }
+    if background is not None:
+        stop.set()
+        thread.join()
+        result["background_requests"] = issued[0]
+    return result
+
+
+def search_check(client, data_dir, seed, names=20, queries=200):
+    """
+    Search for patients with the most common names by exact name and date of birth:
+    each must come back with a perfect score. A common name has thousands of
+    candidates at scale, which must not crowd out the patient with that date.
+    """
+    import pandas as pd
+
+    demographics = pd.read_csv(os.path.join(data_dir, "demographics.csv"),
+                               usecols=["patient_id", "first_name", "last_name", "date_of_birth"], dtype=str)
+    common = demographics.groupby(["first_name", "last_name"]).size().nlargest(names).index
+    patients = demographics[pd.MultiIndex.from_frame(demographics[["first_name", "last_name"]]).isin(common)]
+    patients = patients.sample(n=min(queries, len(patients)), random_state=seed).to_dict(orient='records')
+    missed = []
+    for patient in patients:
+        response = client.get("/api/patients/search", query_string={
+            "first_name": patient["first_name"], "last_name": patient["last_name"],
+            "dob": patient["date_of_birth"], "limit": 100})
+        candidates = response.get_json()["candidates"] if response.status_code == 200 else []
+        if not any(c["patient_id"] == patient["patient_id"] and c["score"] == 1.0 for c in candidates):
+            missed.append(patient["patient_id"])
+    return {"queries": len(patients), "missed": len(missed), "missed_patient_ids": missed[:10]}
+
+
+def run_size(dataset_dir, args):
+    """Benchmark one dataset (runs inside the worker subprocess)"""
+    work_dir = tempfile.mkdtemp(prefix="bench_api_")
+    try:
+        # Mutating endpoints rewrite the CSVs, so always work on a copy
+        for file_name in CSV_FILES:
+            shutil.copy(os.path.join(dataset_dir, file_name), work_dir)
+
+        # Before the import: the server binds its table store and change journal to the directory then
+        os.environ["API_DATA_DIR"] = work_dir
+        sys.path.insert(0, ROOT_DIR)
+        import api_server
+        api_server.app.testing = True
+        client = api_server.app.test_client()
+
+        # What the cached tables cost once loaded
+        rss_before_load = current_rss_mb()
+        for file_name in CSV_FILES:
+            api_server.tables.get(file_name)
+        rss_after_load = current_rss_mb()
+
+        checks = {"search_common_name_exact_dob": search_check(client, work_dir, args.seed)}
+
+        scenarios = build_scenarios(work_dir, args.seed, args)
+        baseline_rss = peak_rss_mb()
+
+        endpoints = {}
+        # The API prints on some paths; keep benchmark stdout for JSON only
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name, make_request, count, *background in scenarios:
+                can_reset = reset_peak_rss()
+                result = run_scenario(client, make_request, count, args.warmup, *background)
+                result["peak_rss_mb"] = peak_rss_mb() if can_reset else None
+                endpoints[name] = result
+
+        return {
+            "dataset": {
+                name.replace(".csv", ""): sum(1 for _ in open(os.path.join(dataset_dir, name))) - 1
+                for name in CSV_FILES
+            },
+            "baseline_rss_mb": baseline_rss,
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+            "tables_rss_mb": round(rss_after_load - rss_before_load, 1) if rss_before_load is not None else None,
+            # Measured last so parsing the tables a second time does not inflate the peaks above
+            "table_memory": table_memory(dataset_dir),
+            "endpoints": endpoints,
+            "checks": checks,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# ---- Reporting ----
+def git_revision():
+    """Current commit and dirty flag, so results can be matched to a tree"""
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR,
+                                         stderr=subprocess.DEVNULL, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"],
+                                             cwd=ROOT_DIR, stderr=subprocess.DEVNULL, text=True).strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def environment_info():
+    """Versions that affect the numbers"""
+    info = {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()}
+    for package in ["flask", "pandas", "numpy"]:
+        try:
+            info[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            info[package] = None
+    return info
+
+
+def compare_results(current, baseline, threshold):
+    """Print p50/p95 ratios against a previous run and return the regressions"""
+    regressions = []
+    baseline_by_size = {r["patients"]: r for r in baseline.get("results", [])}
+    for result in current["results"]:
+        previous = baseline_by_size.get(result["patients"])
+        if not previous:
+            continue
+        for name, stats in result["endpoints"].items():
+            before = previous["endpoints"].get(name)
+            if not before:
+                continue
+            for metric in ["p50", "p95"]:
+                old, new = before["latency_ms"][metric], stats["latency_ms"][metric]
+                if not old or new is None:
+                    continue
+                ratio = new / old
+                flag = "REGRESSION" if ratio > 1 + threshold else ""
+                print(f"{result['patients']:>9} {name:<24} {metric} {old:>10.2f} -> {new:>10.2f} ms "
+                      f"x{ratio:5.2f} {flag}", file=sys.stderr)
+                if flag:
+                    regressions.append({"patients": result["patients"], "endpoint": name, "metric": metric,
+                                        "before_ms": old, "after_ms": new, "ratio": round(ratio, 3)})
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the api_server.py endpoints")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000],
+                        help="Patient counts to benchmark")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for data generation and request mix")
+    parser.add_argument("--generator", choices=["classic", "bulk"], default="classic",
+                        help="classic uses data_gen.py; bulk uses data/bulk_gen.py (unique IDs and identities)")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per patient-level endpoint")
+    parser.add_argument("--full-table-requests", type=int, default=5,
+                        help="Measured requests per full-table endpoint")
+    parser.add_argument("--warmup", type=int, default=3, help="Unmeasured warmup requests per endpoint")
+    parser.add_argument("--endpoints", nargs="+", help="Only run these scenarios")
+    parser.add_argument("--data-root", default=DEFAULT_DATA_ROOT, help="Where generated datasets are cached")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression")
+    parser.add_argument("--worker", metavar="DATASET_DIR", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_size(args.worker, args)))
+        return 0
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "compare", "worker", "data_root")}
+    report = {
+        "schema_version": SCHEMA_VERSION,
+        "benchmark": "api",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git": git_revision(),
+        "environment": environment_info(),
+        "config": config,
+        "results": [],
+    }
+
+    forwarded = list(argv if argv is not None else sys.argv[1:])
+    for size in args.sizes:
+        dataset_dir = ensure_dataset(size, args.seed, args.data_root, args.generator)
+        print(f"Benchmarking {size} patients", file=sys.stderr)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), *forwarded, "--worker", dataset_dir],
+                                check=True, stdout=subprocess.PIPE, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["patients"] = size
+        report["results"].append(result)
+
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare_results(report, json.load(f), args.threshold)
+
+    failed_checks = [(result["patients"], name) for result in report["results"]
+                     for name, check in result["checks"].items() if check["missed"]]
+    for patients, name in failed_checks:
+        print(f"{patients:>9} check {name} FAILED", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 1 if report.get("regressions") or failed_checks else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+"""
+End-to-end benchmark of the care navigator tool path.
+
+Starts a local api_server.py and cn_server.py, then drives the MCP tools through
+MultiServerMCPClient and a LangGraph ReAct agent. The LLM is replaced by a
+deterministic scripted chat model, so no network or credentials are needed.
+
+Reports, as JSON:
+- per-tool latency with a breakdown into MCP transport, HTTP hop and API handler
+- agent sessions per second and session latency at each concurrency level
+
+The breakdown is differential: the same upstream requests are timed once through
+a real HTTP connection and once through Flask's in-process test client.
+  api_handler   = test client time
+  http_hop      = direct HTTP time - api_handler
+  mcp_transport = tool call time - direct HTTP time
+
+Usage:
+    python bench_mcp.py --patients 1000 --concurrency 1 4 16 --output mcp.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timezone
+
+import requests
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langgraph.prebuilt import create_react_agent
+
+from bench_api import (CSV_FILES, DEFAULT_DATA_ROOT, environment_info, ensure_dataset, git_revision,
+                       summarize_latencies)
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Bump when the result layout or the request mix changes
+SCHEMA_VERSION = 1
+
+# Read-only tools are benchmarked by default; mutating ones can be added with --tools
+READ_TOOLS = [
+    "get_patient_demographics",
+    "get_patient_engagement_metrics",
+    "get_patient_hra_status",
+    "get_patient_medical_conditions",
+    "get_patient_sdoh_resources",
+    "get_complete_patient_data",
+    "update_care_plan",
+]
+WRITE_TOOLS = ["update_sdoh_resources", "delete_patient_sdoh_resources"]
+
+# API endpoint behind each single-request read tool
+READ_PATHS = {
+    "get_patient_demographics": "/api/demographics",
+    "get_patient_engagement_metrics": "/api/engagement",
+    "get_patient_hra_status": "/api/hra_status",
+    "get_patient_medical_conditions": "/api/medical_conditions",
+    "get_patient_sdoh_resources": "/api/sdoh_resources",
+    "get_complete_patient_data": "/api/complete",
+}
+
+
+# ---- Deterministic chat model ----
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model stand-in that replays a tool call described in the user message.
+
+    The human message is JSON: {"tool": "<name>", "args": {...}}. On the first turn
+    the model emits exactly that tool call; once a tool result is in the history it
+    answers with a short summary. Output is a pure function of the input messages.
+    """
+    latency_ms: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _reply(self, messages):
+        tool_results = [m for m in messages if isinstance(m, ToolMessage)]
+        if tool_results:
+            last = tool_results[-1]
+            return AIMessage(content=f"{last.name} returned {len(str(last.content))} characters")
+
+        script = json.loads(messages[-1].content)
+        call_id = f"call_{zlib.crc32(json.dumps(script, sort_keys=True).encode()):08x}"
+        return AIMessage(content="", tool_calls=[{"name": script["tool"], "args": script["args"], "id": call_id}])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000.0)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+
+# ---- Tool workload ----
+def tool_arguments(tool_name, identity, i):
+    """Arguments for a tool call against one patient"""
+    args = dict(identity)
+    if tool_name == "get_patient_engagement_metrics":
+        args["time_period"] = "30days"
+    elif tool_name == "update_care_plan":
+        args["care_plan_items"] = ["Follow up in 2 weeks"]
+    elif tool_name == "update_sdoh_resources":
+        args["resources"] = [{"resource_type": "Food", "provider": "Local Food Bank",
+                              "status": "Referred", "notes": f"benchmark {i}"}]
+    return args
+
+
+def upstream_requests(tool_name, identity, patient_id, i):
+    """The API requests a tool issues, as (method, path, kwargs) for requests/test client"""
+    query = {"first_name": identity["first_name"], "last_name": identity["last_name"], "dob": identity["dob"]}
+    find = ("GET", "/api/find_patient", {"params": query})
+    if tool_name == "update_care_plan":
+        return [find]
+    if tool_name == "update_sdoh_resources":
+        body = {"patient_id": patient_id, "resources": tool_arguments(tool_name, identity, i)["resources"]}
+        return [find, ("POST", "/api/sdoh_resources/update", {"json": body})]
+    if tool_name == "delete_patient_sdoh_resources":
+        return [find, ("DELETE", f"/api/sdoh_resources/delete/{patient_id}", {})]
+    return [("GET", READ_PATHS[tool_name], {"params": query})]
+
+
+def load_identities(data_dir, count, seed):
+    """Sample patients to drive the tools with"""
+    import pandas as pd
+    demographics = pd.read_csv(os.path.join(data_dir, "demographics.csv"),
+                               usecols=["patient_id", "first_name", "last_name", "date_of_birth"])
+    sample = demographics.sample(n=min(count, len(demographics)), random_state=seed)
+    return [
+        {"patient_id": row["patient_id"],
+         "identity": {"first_name": row["first_name"], "last_name": row["last_name"], "dob": row["date_of_birth"]}}
+        for row in sample.to_dict(orient='records')
+    ]
+
+
+# ---- Server processes ----
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server process exited with code {process.returncode}")
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.5):
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for port {port}")
+
+
+@contextlib.contextmanager
+def running_servers(data_dir, api_port, mcp_port, log_dir):
+    """Start api_server.py and cn_server.py and stop them on exit"""
+    env = dict(os.environ, API_DATA_DIR=data_dir, API_PORT=str(api_port), API_DEBUG="0",
+               API_BASE_URL=f"http://127.0.0.1:{api_port}/api", MCP_PORT=str(mcp_port))
+    processes = []
+    try:
+        for script, port in [("api_server.py", api_port), ("cn_server.py", mcp_port)]:
+            log = open(os.path.join(log_dir, script.replace(".py", ".log")), 'w')
+            process = subprocess.Popen([sys.executable, os.path.join(ROOT_DIR, script)], env=env,
+                                       stdout=log, stderr=subprocess.STDOUT, cwd=ROOT_DIR)
+            processes.append((process, log))
+            wait_for_port(port, process)
+        yield
+    finally:
+        for process, log in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+
+
+# ---- Measurements ----
+def time_direct_http(base_url, plan, http):
+    t0 = time.perf_counter()
+    for method, path, kwargs in plan:
+        http.request(method, f"{base_url}{path}", **kwargs).content
+    return time.perf_counter() - t0
+
+
+def time_test_client(client, plan):
+    t0 = time.perf_counter()
+    for method, path, kwargs in plan:
+        kwargs = dict(kwargs)
+        if "params" in kwargs:
+            kwargs["query_string"] = kwargs.pop("params")
+        client.open(path, method=method, **kwargs).get_data()
+    return time.perf_counter() - t0
+
+
+async def measure_tools(tools, tool_names, patients, args, api_base_url, data_dir):
+    """Sequential per-tool timings through MCP, direct HTTP and the in-process handler"""
+    # Before the import: the server binds its table store and change journal to the directory then
+    os.environ["API_DATA_DIR"] = data_dir
+    sys.path.insert(0, ROOT_DIR)
+    import api_server
+    client = api_server.app.test_client()
+    http = requests.Session()
+
+    by_name = {tool.name: tool for tool in tools}
+    results = {}
+    for tool_name in tool_names:
+        tool = by_name[tool_name]
+        samples = {"tool": [], "http": [], "handler": []}
+        for i in range(args.warmup + args.tool_calls):
+            patient = patients[i % len(patients)]
+            plan = upstream_requests(tool_name, patient["identity"], patient["patient_id"], i)
+
+            t0 = time.perf_counter()
+            await tool.ainvoke(tool_arguments(tool_name, patient["identity"], i))
+            tool_time = time.perf_counter() - t0
+            http_time = time_direct_http(api_base_url.rsplit("/api", 1)[0], plan, http)
+            with contextlib.redirect_stdout(io.StringIO()):
+                handler_time = time_test_client(client, plan)
+
+            if i >= args.warmup:
+                samples["tool"].append(tool_time)
+                samples["http"].append(http_time)
+                samples["handler"].append(handler_time)
+
+        tool_ms = summarize_latencies(samples["tool"])
+        http_ms = summarize_latencies(samples["http"])
+        handler_ms = summarize_latencies(samples["handler"])
+        results[tool_name] = {
+            "calls": args.tool_calls,
+            "tool_call_ms": tool_ms,
+            "direct_http_ms": http_ms,
+            "api_handler_ms": handler_ms,
+            "breakdown_p50_ms": {
+                "mcp_transport": round(max(tool_ms["p50"] - http_ms["p50"], 0.0), 3),
+                "http_hop": round(max(http_ms["p50"] - handler_ms["p50"], 0.0), 3),
+                "api_handler": handler_ms["p50"],
+            },
+        }
+    return results
+
+
+async def measure_sessions(agent, tool_names, patients, sessions, concurrency):
+    """Run agent sessions at a fixed concurrency and report sessions per second"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    workload = itertools.cycle(itertools.product(tool_names, range(len(patients))))
+    scripts = []
+    for i in range(sessions):
+        tool_name, patient_index = next(workload)
+        patient = patients[patient_index]
+        scripts.append({"tool": tool_name, "args": tool_arguments(tool_name, patient["identity"], i)})
+
+    async def run_session(script):
+        nonlocal errors
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                await agent.ainvoke({"messages": json.dumps(script)})
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_session(script) for script in scripts))
+    wall = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "errors": errors,
+        "sessions_per_second": round(sessions / wall, 2) if wall > 0 else None,
+        "session_latency_ms": summarize_latencies(latencies),
+    }
+
+
+async def run_benchmark(args, data_dir, api_port, mcp_port):
+    api_base_url = f"http://127.0.0.1:{api_port}/api"
+    client = MultiServerMCPClient({
+        "care_navigator": {
+            "url": f"http://127.0.0.1:{mcp_port}/mcp",
+            "transport": "streamable_http"
+        }
+    })
+    tools = await client.get_tools()
+    tool_names = args.tools or READ_TOOLS
+    patients = load_identities(data_dir, args.sample_patients, args.seed)
+
+    per_tool = await measure_tools(tools, tool_names, patients, args, api_base_url, data_dir)
+
+    model = ScriptedChatModel(latency_ms=args.llm_latency_ms)
+    agent = create_react_agent(model, tools)
+    session_results = [
+        await measure_sessions(agent, tool_names, patients, args.sessions, concurrency)
+        for concurrency in args.concurrency
+    ]
+    return {"tools": per_tool, "sessions": session_results}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the MCP tool path end to end with a stub LLM")
+    parser.add_argument("--patients", type=int, default=1000, help="Dataset size to serve from the API")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for data generation and request mix")
+    parser.add_argument("--generator", choices=["classic", "bulk"], default="classic",
+                        help="Dataset generator (see bench_api.py)")
+    parser.add_argument("--tools", nargs="+", choices=READ_TOOLS + WRITE_TOOLS,
+                        help="Tools to drive (defaults to the read-only tools)")
+    parser.add_argument("--tool-calls", type=int, default=50, help="Measured calls per tool for the breakdown")
+    parser.add_argument("--warmup", type=int, default=3, help="Unmeasured warmup calls per tool")
+    parser.add_argument("--sessions", type=int, default=100, help="Agent sessions per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16],
+                        help="Concurrent agent sessions to test")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="Simulated latency per stub LLM call")
+    parser.add_argument("--sample-patients", type=int, default=64, help="Distinct patients in the workload")
+    parser.add_argument("--data-root", default=DEFAULT_DATA_ROOT, help="Where generated datasets are cached")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    dataset_dir = ensure_dataset(args.patients, args.seed, args.data_root, args.generator)
+
+    work_dir = tempfile.mkdtemp(prefix="bench_mcp_")
+    try:
+        data_dir = os.path.join(work_dir, "csv_data")
+        os.makedirs(data_dir)
+        for file_name in CSV_FILES:
+            shutil.copy(os.path.join(dataset_dir, file_name), data_dir)
+
+        api_port, mcp_port = free_port(), free_port()
+        with running_servers(data_dir, api_port, mcp_port, work_dir):
+            results = asyncio.run(run_benchmark(args, data_dir, api_port, mcp_port))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "data_root")}
+    report = {
+        "schema_version": SCHEMA_VERSION,
+        "benchmark": "mcp",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git": git_revision(),
+        "environment": environment_info(),
+        "config": config,
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
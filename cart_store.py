@@ -0,0 +1,297 @@
+"""
+Per-session shopping carts for the MCP_STORE server.
+
+Carts are spread over lock-striped shards by session id, so concurrent tool calls
+for different shoppers rarely contend. Each shard keeps its sessions in
+least-recently-used order, which makes both idle eviction and the memory bound
+(max_sessions overall, max_items per cart) O(1) per operation. The whole store can
+be snapshotted to a JSON file and restored on start-up.
+
+Every cart carries a version that goes up with each committed change, and each
+item remembers the version that last touched it (removed items leave a bounded
+tombstone), so a client holding version N can fetch just what changed since N.
+Versions come from one store-wide counter (saved with snapshots): a cart created
+again after its session's was evicted starts above any version the old one gave
+out, so a client still holding one of those gets the full cart.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+SNAPSHOT_VERSION = 3
+
+# Removed-item markers kept per cart for incremental reads; a client further
+# behind than the oldest dropped marker gets the full cart instead
+MAX_TOMBSTONES = 256
+
+
+class CartFullError(ValueError):
+    """Raised when a change would put more than max_items distinct items in a cart"""
+
+
+def cart_diff(before, after):
+    """Changes between two versions of a cart's items"""
+    diff = {"added": {}, "updated": {}, "removed": {}}
+    for key, quantity in after.items():
+        if key not in before:
+            diff["added"][key] = quantity
+        elif before[key] != quantity:
+            diff["updated"][key] = {"from": before[key], "to": quantity}
+    for key, quantity in before.items():
+        if key not in after:
+            diff["removed"][key] = quantity
+    return diff
+
+
+class Cart:
+    """Items of one session; only touch it while its shard lock is held"""
+    __slots__ = ("items", "last_access", "version", "item_versions", "tombstones", "floor")
+
+    def __init__(self, items=None, last_access=None, version=0, item_versions=None):
+        self.items = dict(items or {})
+        self.last_access = time.monotonic() if last_access is None else last_access
+        self.version = version
+        self.item_versions = dict(item_versions or dict.fromkeys(self.items, version))
+        self.tombstones = {}
+        # Oldest version an incremental read can start from
+        self.floor = version
+
+    def commit(self, items, clock):
+        """Replace the items, taking the next version from clock if anything changed; returns the diff"""
+        diff = cart_diff(self.items, items)
+        if not any(diff.values()):
+            return diff
+        self.version = next(clock)
+        for key in (*diff["added"], *diff["updated"]):
+            self.item_versions[key] = self.version
+            self.tombstones.pop(key, None)
+        for key in diff["removed"]:
+            del self.item_versions[key]
+            self.tombstones[key] = self.version
+        while len(self.tombstones) > MAX_TOMBSTONES:
+            oldest = next(iter(self.tombstones))
+            self.floor = max(self.floor, self.tombstones.pop(oldest))
+        self.items = items
+        return diff
+
+    def changes_since(self, since_version):
+        """(changed items, removed keys) after since_version, or None if a full read is needed"""
+        if since_version < self.floor or since_version > self.version:
+            return None
+        changed = {key: self.items[key] for key, version in self.item_versions.items() if version > since_version}
+        removed = [key for key, version in self.tombstones.items() if version > since_version]
+        return changed, removed
+
+
+class _Shard:
+    __slots__ = ("lock", "sessions")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+
+
+class ShardedCartStore:
+    """
+    Session id -> cart, sharded for concurrent access.
+
+    num_shards    lock stripes; a power of two comfortably above the core count
+    max_sessions  carts kept in memory; the least recently used go first
+    idle_ttl      seconds after which an untouched cart is dropped
+    max_items     distinct items allowed in a single cart
+    """
+
+    def __init__(self, num_shards=64, max_sessions=100_000, idle_ttl=1800.0, max_items=1000):
+        self.num_shards = num_shards
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_items = max_items
+        self._per_shard = max(1, -(-max_sessions // num_shards))
+        self._shards = [_Shard() for _ in range(num_shards)]
+        # Source of every cart version (next() on it is atomic)
+        self._clock = itertools.count(1)
+        self._snapshot_thread = None
+        self._snapshot_stop = threading.Event()
+
+    def _shard(self, session_id):
+        return self._shards[zlib.crc32(session_id.encode()) % self.num_shards]
+
+    def _evict(self, shard, now):
+        """Drop idle carts from the LRU end, then any over the shard's capacity"""
+        sessions = shard.sessions
+        while sessions:
+            oldest = next(iter(sessions.values()))
+            if now - oldest.last_access < self.idle_ttl:
+                break
+            sessions.popitem(last=False)
+        while len(sessions) > self._per_shard:
+            sessions.popitem(last=False)
+
+    @contextmanager
+    def edit(self, session_id):
+        """Lock the session's shard and yield its Cart, creating it if needed"""
+        shard = self._shard(session_id)
+        with shard.lock:
+            now = time.monotonic()
+            cart = shard.sessions.get(session_id)
+            if cart is None:
+                cart = shard.sessions[session_id] = Cart(last_access=now, version=next(self._clock))
+            else:
+                shard.sessions.move_to_end(session_id)
+            cart.last_access = now
+            try:
+                yield cart
+            finally:
+                self._evict(shard, now)
+
+    def get_items(self, session_id, since_version=None):
+        """
+        A session's items as {"version": n, "items": {...}}.
+
+        With since_version, only what changed after it: {"version": n, "since_version":
+        since_version, "changed": {...}, "removed": [...]}. If that version is too old
+        (or unknown, e.g. the cart was evicted) the full form is returned instead.
+        """
+        shard = self._shard(session_id)
+        with shard.lock:
+            cart = shard.sessions.get(session_id)
+            if cart is None:
+                return {"version": 0, "items": {}}
+            shard.sessions.move_to_end(session_id)
+            cart.last_access = time.monotonic()
+            if since_version is not None:
+                changes = cart.changes_since(since_version)
+                if changes is not None:
+                    return {"version": cart.version, "since_version": since_version,
+                            "changed": changes[0], "removed": changes[1]}
+            return {"version": cart.version, "items": dict(cart.items)}
+
+    def set_item(self, session_id, key, quantity):
+        """Set one item's quantity; returns the cart's new version"""
+        with self.edit(session_id) as cart:
+            if key not in cart.items and len(cart.items) >= self.max_items:
+                raise CartFullError(f"A cart can hold at most {self.max_items} distinct items")
+            cart.commit({**cart.items, key: quantity}, self._clock)
+            return cart.version
+
+    def transact(self, session_id, change):
+        """
+        Apply change(items) to a copy of the session's items and commit it atomically.
+
+        If change raises (or the result is over max_items) the cart is left as it was.
+        Returns {"diff": ..., "item_count": ..., "version": ...}.
+        """
+        with self.edit(session_id) as cart:
+            items = dict(cart.items)
+            change(items)
+            if len(items) > self.max_items:
+                raise CartFullError(f"A cart can hold at most {self.max_items} distinct items")
+            diff = cart.commit(items, self._clock)
+            return {"diff": diff, "item_count": len(items), "version": cart.version}
+
+    def remove_item(self, session_id, key):
+        """Remove an item; returns (its quantity or None if absent, the cart's version)"""
+        shard = self._shard(session_id)
+        with shard.lock:
+            cart = shard.sessions.get(session_id)
+            if cart is None:
+                return None, 0
+            cart.last_access = time.monotonic()
+            shard.sessions.move_to_end(session_id)
+            if key not in cart.items:
+                return None, cart.version
+            items = dict(cart.items)
+            quantity = items.pop(key)
+            cart.commit(items, self._clock)
+            return quantity, cart.version
+
+    def evict_idle(self):
+        """Drop every cart idle for longer than idle_ttl; returns how many went"""
+        dropped = 0
+        for shard in self._shards:
+            with shard.lock:
+                before = len(shard.sessions)
+                self._evict(shard, time.monotonic())
+                dropped += before - len(shard.sessions)
+        return dropped
+
+    def __len__(self):
+        return sum(len(shard.sessions) for shard in self._shards)
+
+    # ---- Persistence ----
+    def snapshot(self):
+        """JSON-ready copy of every cart; each shard is locked only while it is copied"""
+        sessions = {}
+        for shard in self._shards:
+            with shard.lock:
+                now = time.monotonic()
+                for session_id, cart in shard.sessions.items():
+                    sessions[session_id] = {"items": dict(cart.items), "version": cart.version,
+                                            "item_versions": dict(cart.item_versions),
+                                            "idle_seconds": now - cart.last_access}
+        # Taken after the copies, so it is above every version in them
+        return {"version": SNAPSHOT_VERSION, "saved_at": time.time(), "clock": next(self._clock),
+                "sessions": sessions}
+
+    def save_snapshot(self, path):
+        """Write a snapshot atomically (temp file + rename)"""
+        data = self.snapshot()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        return len(data["sessions"])
+
+    def load_snapshot(self, path):
+        """Restore carts from a snapshot, skipping any that have expired since; returns how many loaded"""
+        if not os.path.exists(path):
+            return 0
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported cart snapshot version {data.get('version')!r} in {path}")
+        # Versions continue above any issued before the snapshot
+        self._clock = itertools.count(max(next(self._clock), data["clock"] + 1))
+        now = time.monotonic()
+        downtime = max(time.time() - data["saved_at"], 0.0)
+        # Oldest first so the LRU order of every shard is preserved
+        entries = sorted(data["sessions"].items(), key=lambda item: -item[1]["idle_seconds"])
+        loaded = 0
+        for session_id, entry in entries:
+            idle = entry["idle_seconds"] + downtime
+            if idle >= self.idle_ttl:
+                continue
+            shard = self._shard(session_id)
+            with shard.lock:
+                shard.sessions[session_id] = Cart(entry["items"], last_access=now - idle, version=entry["version"],
+                                                  item_versions=entry["item_versions"])
+                shard.sessions.move_to_end(session_id)
+                self._evict(shard, now)
+            loaded += 1
+        return loaded
+
+    def start_snapshots(self, path, interval=30.0):
+        """Save a snapshot every interval seconds in a daemon thread (plus a final one on stop)"""
+        if self._snapshot_thread is not None:
+            return
+
+        def run():
+            while not self._snapshot_stop.wait(interval):
+                self.evict_idle()
+                self.save_snapshot(path)
+            self.save_snapshot(path)
+
+        self._snapshot_thread = threading.Thread(target=run, daemon=True, name="cart-snapshots")
+        self._snapshot_thread.start()
+
+    def stop_snapshots(self):
+        if self._snapshot_thread is None:
+            return
+        self._snapshot_stop.set()
+        self._snapshot_thread.join()
+        self._snapshot_thread = None
@@ -0,0 +1,169 @@
+"""
+Sequenced feed of data changes for incremental consumers.
+
+Every published change gets the next sequence number. The most recent `capacity`
+changes are kept in memory for readers and appended to an NDJSON journal, so
+sequence numbers keep increasing across restarts. A reader that asks for changes
+after a sequence number that is no longer retained (or that the feed has never
+issued) is told to reset, i.e. re-read the full data and continue from last_seq.
+
+A shared feed is one journal written by several processes (e.g. API workers):
+sequence numbers are assigned under a lock file after catching up with the
+journal, and readers catch up with it (one stat call when nothing changed)
+before answering, so every process serves the same sequence.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from shared_tables import file_lock
+
+# Seconds between journal checks while a shared feed's reader waits for changes
+POLL_INTERVAL = 0.2
+
+
+class ChangeFeed:
+    def __init__(self, journal_path=None, capacity=10000, shared=False):
+        if shared and not journal_path:
+            raise ValueError("A shared change feed needs a journal")
+        self.journal_path = journal_path
+        self.capacity = capacity
+        self.shared = shared
+        self.last_seq = 0
+        self._events = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self._journal_lines = 0
+        # (inode, bytes read) of the journal, to read only what other processes appended
+        self._journal_position = (None, 0)
+        if journal_path and os.path.exists(journal_path):
+            self._load_journal()
+
+    def _load_journal(self):
+        self._events.clear()
+        self.last_seq = 0
+        self._journal_lines = 0
+        self._journal_position = (None, 0)
+        self._read_journal()
+
+    def _read_journal(self):
+        """Take in the journal's complete lines past the position already read"""
+        inode, offset = self._journal_position
+        with open(self.journal_path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+            inode = os.fstat(f.fileno()).st_ino
+        # A line without its newline is still being written (or was torn by a crash)
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            self._events.append(event)
+            self.last_seq = max(self.last_seq, event["seq"])
+            self._journal_lines += 1
+        self._journal_position = (inode, offset + end)
+
+    def _refresh(self):
+        """Catch up with changes other processes journaled (shared feeds only)"""
+        if not self.shared:
+            return
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return
+        inode, offset = self._journal_position
+        if st.st_ino != inode or st.st_size < offset:
+            # Compacted (replaced) by another process: what it kept is the retained window
+            self._load_journal()
+        elif st.st_size > offset:
+            self._read_journal()
+
+    def _append_journal(self, events):
+        if not self.journal_path:
+            return
+        # Keep the journal at most twice the retained window
+        if self._journal_lines + len(events) > 2 * self.capacity:
+            tmp_path = f"{self.journal_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(event, default=str) + "\n" for event in self._events)
+                f.flush()
+                os.fsync(f.fileno())
+                position = (os.fstat(f.fileno()).st_ino, f.tell())
+            os.replace(tmp_path, self.journal_path)
+            self._journal_lines = len(self._events)
+            self._journal_position = position
+            return
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(event, default=str) + "\n" for event in events)
+            f.flush()
+            os.fsync(f.fileno())
+            self._journal_position = (os.fstat(f.fileno()).st_ino, f.tell())
+        self._journal_lines += len(events)
+
+    def publish(self, changes):
+        """Assign sequence numbers to a batch of change dicts, record and announce them"""
+        if not changes:
+            return []
+        with self._cond:
+            if not self.shared:
+                events = self._publish(changes)
+            else:
+                with file_lock(f"{self.journal_path}.lock"):
+                    self._refresh()
+                    events = self._publish(changes)
+            self._cond.notify_all()
+        return events
+
+    def _publish(self, changes):
+        now = time.time()
+        events = []
+        for change in changes:
+            self.last_seq += 1
+            events.append({"seq": self.last_seq, "ts": now, **change})
+        self._events.extend(events)
+        self._append_journal(events)
+        return events
+
+    def position(self):
+        """The last sequence number issued (by any process, for a shared feed)"""
+        with self._cond:
+            self._refresh()
+            return self.last_seq
+
+    def _read(self, since, limit):
+        oldest = self._events[0]["seq"] if self._events else self.last_seq + 1
+        if since > self.last_seq or since < oldest - 1:
+            return [], True
+        # Sequence numbers in the window are contiguous, so since maps to a position
+        start = since - oldest + 1
+        events = list(itertools.islice(self._events, start, start + limit))
+        return events, False
+
+    def read(self, since, limit=1000, timeout=0.0):
+        """
+        Changes with seq > since, waiting up to timeout seconds for the first one.
+
+        Returns (events, last_seq, reset). When reset is True the events between
+        since and the oldest retained change are gone: re-read everything and
+        continue from last_seq.
+        """
+        with self._cond:
+            self._refresh()
+            if timeout > 0 and since == self.last_seq:
+                if not self.shared:
+                    self._cond.wait_for(lambda: self.last_seq > since, timeout)
+                else:
+                    # Other processes' changes announce themselves only in the journal
+                    deadline = time.monotonic() + timeout
+                    while self.last_seq <= since and time.monotonic() < deadline:
+                        self._cond.wait(min(POLL_INTERVAL, deadline - time.monotonic()))
+                        self._refresh()
+            events, reset = self._read(since, limit)
+            return events, self.last_seq, reset
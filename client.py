@@ -3,6 +3,7 @@ import asyncio
 import json
 import os
 import pdb
+import uuid
 
 from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_openai import ChatOpenAI
@@ -13,13 +14,17 @@ from langgraph.prebuilt import create_react_agent
 # Initialize model
 model = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
 
+# The store keeps one cart per session; every tool call in this run shares this one
+CART_SESSION = os.environ.get("CART_SESSION") or uuid.uuid4().hex
+
 
 async def main(query: str):
     """Main function to process queries using the MCP client."""
     client = MultiServerMCPClient({
         "mcpstore": {
             "url": "http://127.0.0.1:8001/mcp",  # Replace with the remote server's URL
-            "transport": "streamable_http"
+            "transport": "streamable_http",
+            "headers": {"X-Cart-Session": CART_SESSION}
         }
     })
     tools = await client.get_tools()
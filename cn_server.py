@@ -1,22 +1,45 @@
 from fastmcp import FastMCP
+import os
 import requests
 import urllib.parse
 
+import tracing
+from resources import PatientResources
+from single_flight import AsyncSingleFlight
+from tool_metrics import ToolMetrics
+
 # Define API server base URL
-API_BASE_URL = "http://127.0.0.1:5000/api"
+API_BASE_URL = os.environ.get("API_BASE_URL", "http://127.0.0.1:5000/api")
 
 mcp = FastMCP("CARE_NAVIGATOR")
 
+# Export spans when TRACE_DIR is set
+tracing.configure("cn_server")
+
+# Per-tool metrics; upstream API calls go through its session so their time is attributed to the tool
+tool_metrics = ToolMetrics("CARE_NAVIGATOR")
+tool_metrics.register(mcp)
+http = tool_metrics.http
+
+# Identical concurrent read-tool calls share one upstream lookup (and run off the event loop)
+read_flight = AsyncSingleFlight()
+
+# Cached patient records as resources (demographics://patient/{patient_id}, ...) with change notifications
+patient_resources = PatientResources(API_BASE_URL, http)
+patient_resources.register(mcp)
+
 
 # ---- Demographics Tools/Resources ----
 @mcp.tool()
+@tool_metrics.instrument
+@read_flight.coalesce_tool
 def get_patient_demographics(first_name: str, last_name: str, dob: str) -> dict:
     """Retrieve basic demographic information for a patient
        demographics API returns Age, email, phone, address, and insurance information.
     """
     try:
         # Call the API with demographic parameters directly
-        response = requests.get(f"{API_BASE_URL}/demographics", 
+        response = http.get(f"{API_BASE_URL}/demographics", 
                                params={"first_name": first_name, "last_name": last_name, "dob": dob})
         response.raise_for_status()
         data = response.json()
@@ -30,35 +53,79 @@ def get_patient_demographics(first_name: str, last_name: str, dob: str) -> dict:
         return {"error": f"API request error: {str(e)}"}
 
 
+@mcp.tool()
+@tool_metrics.instrument
+@read_flight.coalesce_tool
+def search_patients(first_name: str = "", last_name: str = "", dob: str = "", limit: int = 5) -> dict:
+    """Find patients when a name may be misspelled or the date of birth is uncertain.
+       Returns ranked candidates (patient_id, names, date_of_birth, score 0-1) in one call;
+       use a candidate's exact names and date of birth with the other tools.
+    """
+    try:
+        response = http.get(f"{API_BASE_URL}/patients/search",
+                            params={"first_name": first_name, "last_name": last_name, "dob": dob, "limit": limit})
+        if response.status_code == 400:
+            return response.json()
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        return {"error": f"API request error: {str(e)}"}
+
+
 # ---- Engagement Tools/Resources ----
 @mcp.tool()
+@tool_metrics.instrument
+@read_flight.coalesce_tool
 def get_patient_engagement_metrics(first_name: str, last_name: str, dob: str, time_period: str = "30days") -> dict:
-    """Get engagement status for a patient over a specified time period"""
+    """Get engagement status for a patient over a specified time period
+       time_period is one of "30days", "90days" or "365days" (up to today); the result has the
+       program dates and last visit plus enrolled_days, enrollment_coverage, visited_in_period,
+       engagement_status and days_since_last_visit for that window.
+    """
     try:
         # Call the API with demographic parameters directly
-        response = requests.get(f"{API_BASE_URL}/engagement", 
-                               params={"first_name": first_name, "last_name": last_name, "dob": dob})
+        response = http.get(f"{API_BASE_URL}/engagement", 
+                               params={"first_name": first_name, "last_name": last_name, "dob": dob,
+                                       "time_period": time_period})
+        if response.status_code == 400:
+            return response.json()
         response.raise_for_status()
         data = response.json()
         
         if not data:
             return {"error": f"No engagement metrics found for {first_name} {last_name}"}
             
-        # Add time_period parameter to result even though the API doesn't use it currently
-        result = data[0]
-        result["time_period"] = time_period
-        return result
+        return data[0]
+    except requests.exceptions.RequestException as e:
+        return {"error": f"API request error: {str(e)}"}
+
+@mcp.tool()
+@tool_metrics.instrument
+@read_flight.coalesce_tool
+def get_engagement_summary(time_period: str = "30days") -> dict:
+    """Population engagement over "30days", "90days" or "365days" up to today: patient counts by
+       engagement status (Active, Enrolled, Visited, Inactive), enrolled and visited patients and
+       mean enrollment coverage.
+    """
+    try:
+        response = http.get(f"{API_BASE_URL}/engagement/summary", params={"time_period": time_period})
+        if response.status_code == 400:
+            return response.json()
+        response.raise_for_status()
+        return response.json()
     except requests.exceptions.RequestException as e:
         return {"error": f"API request error: {str(e)}"}
 
 
 # ---- HRA Status Tools/Resources ----
 @mcp.tool()
+@tool_metrics.instrument
+@read_flight.coalesce_tool
 def get_patient_hra_status(first_name: str, last_name: str, dob: str) -> dict:
     """Get patient's Health Risk Assessment status"""
     try:
         # Call the API with demographic parameters directly
-        response = requests.get(f"{API_BASE_URL}/hra_status", 
+        response = http.get(f"{API_BASE_URL}/hra_status", 
                                params={"first_name": first_name, "last_name": last_name, "dob": dob})
         response.raise_for_status()
         data = response.json()
@@ -70,13 +137,40 @@ def get_patient_hra_status(first_name: str, last_name: str, dob: str) -> dict:
     except requests.exceptions.RequestException as e:
         return {"error": f"API request error: {str(e)}"}
 
+@mcp.tool()
+@tool_metrics.instrument
+@read_flight.coalesce_tool
+def get_hra_worklist(status: str = "Pending,Not Started,Expired", min_risk: int = 0, due_before: str = "",
+                     limit: int = 20, cursor: str = "") -> dict:
+    """Patients whose Health Risk Assessment needs action, most overdue first and highest risk first.
+       status: comma-separated HRA statuses; min_risk: lowest risk level (1-5) to include;
+       due_before: YYYY-MM-DD to list only assessments due before that date (e.g. today for overdue ones).
+       Pass "next_cursor" from the result as cursor to get the next page.
+    """
+    params = {"status": status, "min_risk": min_risk, "limit": limit}
+    if due_before:
+        params["due_before"] = due_before
+    if cursor:
+        params["cursor"] = cursor
+    try:
+        response = http.get(f"{API_BASE_URL}/hra_status/worklist", params=params)
+        if response.status_code == 400:
+            return response.json()
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        return {"error": f"API request error: {str(e)}"}
+
+
 # ---- Medical Conditions Tools/Resources ----
 @mcp.tool()
+@tool_metrics.instrument
+@read_flight.coalesce_tool
 def get_patient_medical_conditions(first_name: str, last_name: str, dob: str) -> dict:
     """Get patient's medical conditions, allergies, and medications"""
     try:
         # Call the API with demographic parameters directly
-        response = requests.get(f"{API_BASE_URL}/medical_conditions", 
+        response = http.get(f"{API_BASE_URL}/medical_conditions", 
                                params={"first_name": first_name, "last_name": last_name, "dob": dob})
         response.raise_for_status()
         data = response.json()
@@ -91,11 +185,13 @@ def get_patient_medical_conditions(first_name: str, last_name: str, dob: str) ->
 
 # ---- SDOH Resources Tools ----
 @mcp.tool()
+@tool_metrics.instrument
+@read_flight.coalesce_tool
 def get_patient_sdoh_resources(first_name: str, last_name: str, dob: str) -> dict:
     """Get Social Determinants of Health resources for a patient"""
     try:
         # Call the API with demographic parameters directly
-        response = requests.get(f"{API_BASE_URL}/sdoh_resources", 
+        response = http.get(f"{API_BASE_URL}/sdoh_resources", 
                                params={"first_name": first_name, "last_name": last_name, "dob": dob})
         response.raise_for_status()
         data = response.json()
@@ -109,24 +205,48 @@ def get_patient_sdoh_resources(first_name: str, last_name: str, dob: str) -> dic
 
 # ---- Complete Patient Data Tool ----
 @mcp.tool()
+@tool_metrics.instrument
+@read_flight.coalesce_tool
 def get_complete_patient_data(first_name: str, last_name: str, dob: str) -> dict:
     """Get complete patient data including demographics, medical, engagement, HRA status, and SDOH resources"""
     try:
         # Call the API with demographic parameters directly
-        response = requests.get(f"{API_BASE_URL}/complete", 
+        response = http.get(f"{API_BASE_URL}/complete", 
                                params={"first_name": first_name, "last_name": last_name, "dob": dob})
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         return {"error": f"API request error: {str(e)}"}
 
+# ---- Population Analytics Tools ----
+@mcp.tool()
+@tool_metrics.instrument
+@read_flight.coalesce_tool
+def get_population_analytics(view: str = "summary") -> dict:
+    """Population-level counts across all patients (no patient identifiers).
+       view is one of: summary (headline counts), risk_levels (by HRA risk level and status),
+       insurance (patients, mean age and risk by insurance provider), sdoh_status (referrals by
+       status and resource type), demographics (by gender, age band, ethnicity),
+       conditions (most common conditions, allergies, medications).
+    """
+    try:
+        response = http.get(f"{API_BASE_URL}/analytics/{urllib.parse.quote(view, safe='')}")
+        if response.status_code == 404:
+            return response.json()
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        return {"error": f"API request error: {str(e)}"}
+
+
 # ---- Care Plan Tools ----
 @mcp.tool()
+@tool_metrics.instrument
 def update_care_plan(first_name: str, last_name: str, dob: str, care_plan_items: list) -> dict:
     """Update a patient's care plan with new items"""
     try:
         # Call the find patient API to get patient_id
-        response = requests.get(f"{API_BASE_URL}/find_patient", 
+        response = http.get(f"{API_BASE_URL}/find_patient", 
                                params={"first_name": first_name, "last_name": last_name, "dob": dob})
         response.raise_for_status()
         data = response.json()
@@ -142,6 +262,7 @@ def update_care_plan(first_name: str, last_name: str, dob: str, care_plan_items:
         return {"error": f"API request error: {str(e)}"}
 
 @mcp.tool()
+@tool_metrics.instrument
 def update_sdoh_resources(first_name: str, last_name: str, dob: str, resources: list) -> dict:
     """
     Update or add SDOH resources for a patient
@@ -160,7 +281,7 @@ def update_sdoh_resources(first_name: str, last_name: str, dob: str, resources:
     """
     try:
         # First, get patient_id from demographics
-        response = requests.get(f"{API_BASE_URL}/find_patient", 
+        response = http.get(f"{API_BASE_URL}/find_patient", 
                               params={"first_name": first_name, "last_name": last_name, "dob": dob})
         response.raise_for_status()
         data = response.json()
@@ -177,9 +298,10 @@ def update_sdoh_resources(first_name: str, last_name: str, dob: str, resources:
         }
         
         # Call the API to update resources
-        response = requests.post(f"{API_BASE_URL}/sdoh_resources/update", json=payload)
+        response = http.post(f"{API_BASE_URL}/sdoh_resources/update", json=payload)
         response.raise_for_status()
         result = response.json()
+        patient_resources.notify_changed("sdoh_resources", patient_id)
         
         # Add patient info to the response for context
         result["patient"] = f"{first_name} {last_name} (DOB: {dob})"
@@ -189,6 +311,7 @@ def update_sdoh_resources(first_name: str, last_name: str, dob: str, resources:
         return {"error": f"API request error: {str(e)}"}
 
 @mcp.tool()
+@tool_metrics.instrument
 def delete_patient_sdoh_resources(first_name: str, last_name: str, dob: str) -> dict:
     """
     Delete all SDOH resources for a specific patient
@@ -200,7 +323,7 @@ def delete_patient_sdoh_resources(first_name: str, last_name: str, dob: str) ->
     """
     try:
         # First, get patient_id from demographics
-        response = requests.get(f"{API_BASE_URL}/find_patient", 
+        response = http.get(f"{API_BASE_URL}/find_patient", 
                               params={"first_name": first_name, "last_name": last_name, "dob": dob})
         response.raise_for_status()
         data = response.json()
@@ -211,9 +334,10 @@ def delete_patient_sdoh_resources(first_name: str, last_name: str, dob: str) ->
         patient_id = data.get("patient_id")
         
         # Call the API to delete SDOH resources for this patient
-        response = requests.delete(f"{API_BASE_URL}/sdoh_resources/delete/{patient_id}")
+        response = http.delete(f"{API_BASE_URL}/sdoh_resources/delete/{patient_id}")
         response.raise_for_status()
         result = response.json()
+        patient_resources.notify_changed("sdoh_resources", patient_id)
         
         # Add patient info to the response for context
         result["patient"] = f"{first_name} {last_name} (DOB: {dob})"
@@ -223,6 +347,37 @@ def delete_patient_sdoh_resources(first_name: str, last_name: str, dob: str) ->
         return {"error": f"API request error: {str(e)}"}
 
 
+@mcp.tool()
+@tool_metrics.instrument
+def bulk_update_sdoh_resources(operations: list, dry_run: bool = False) -> dict:
+    """
+    Apply SDOH changes across many patients at once, saved together (all or nothing)
+    
+    Parameters:
+    - operations: List of operations, applied in order:
+        - {"op": "delete", "patient_ids": [...]}: delete all resources of these patients
+        - {"op": "set_status", "where": {...}, "status": "Expired"}: change the status of matching resources
+        - {"op": "reassign_provider", "where": {...}, "provider": "..."}: move matching resources to a provider
+      "where" may combine patient_ids, resource_ids, resource_type, provider, status
+      (a value or a list), referred_before (YYYY-MM-DD) and older_than_days, e.g.
+      {"status": "Referred", "older_than_days": 90}
+    - dry_run: If true, only report how many resources would change
+    """
+    try:
+        response = http.post(f"{API_BASE_URL}/sdoh_resources/bulk",
+                             json={"operations": operations, "dry_run": dry_run})
+        if response.status_code == 400:
+            return response.json()
+        response.raise_for_status()
+        result = response.json()
+        if not result.get("dry_run"):
+            for patient_id in result.get("patients_affected", []):
+                patient_resources.notify_changed("sdoh_resources", patient_id)
+        return result
+    except requests.exceptions.RequestException as e:
+        return {"error": f"API request error: {str(e)}"}
+
+
 
 if __name__ == "__main__":
-    mcp.run(transport="streamable-http", host="127.0.0.1", port=8001)
\ No newline at end of file
+    mcp.run(transport="streamable-http", host="127.0.0.1", port=int(os.environ.get("MCP_PORT", 8001)))
\ No newline at end of file
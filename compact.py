@@ -0,0 +1,144 @@
+"""
+Compact in-memory column encodings for the cached tables.
+
+- Low-cardinality text columns (gender, status, names, pipe-separated condition
+  lists, ...) become pandas categoricals: one small code per row instead of a
+  Python string object.
+- YYYY-MM-DD date columns become int32 days since 1970-01-01, with MISSING_DAY
+  for an empty cell: 4 bytes per row instead of a ~60 byte string object.
+
+read_table parses these columns straight into categoricals, so a string object
+is created per distinct value rather than per row (freed per-row strings would
+stay in the process's heap), and dates are converted by their distinct values.
+
+Encoding is lossless: a date column whose text would not come back byte for byte
+(another format, junk values) is left as text. Rows are decoded back to the
+original strings only when serialized (to_records, decode), so responses and
+rewritten CSV files are unchanged.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_COLUMNS = {"gender", "blood_type", "ethnicity", "marital_status", "insurance_provider",
+                       "first_name", "last_name", "resource_type", "provider", "status", "notes",
+                       "allergies", "conditions", "medications"}
+
+DATE_COLUMNS = {"date_of_birth", "start_date", "end_date", "last_visit", "completion_date",
+                "next_assessment_due", "referral_date"}
+
+# An empty date cell
+MISSING_DAY = np.iinfo(np.int32).min
+
+# A column with more distinct values than this per row is kept as plain text
+MAX_CATEGORY_RATIO = 0.5
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def is_day_column(series):
+    """Whether a column holds encoded dates"""
+    return series.name in DATE_COLUMNS and series.dtype == np.int32
+
+
+def encode_days(values):
+    """A column of YYYY-MM-DD text (plain or categorical) as int32 days, or None if that would not round-trip"""
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype("category")
+    categories = values.cat.categories
+    if len(categories) and categories.dtype != object:
+        return None
+    parsed = pd.to_datetime(categories.astype(object), format="%Y-%m-%d", errors="coerce")
+    if parsed.isna().any():
+        return None
+    days = parsed.to_numpy("datetime64[D]").astype(np.int64)
+    if not (format_days(days) == categories.to_numpy(dtype=object)).all():
+        return None
+    # Code -1 (an empty cell) takes the appended MISSING_DAY
+    return np.append(days, MISSING_DAY).astype(np.int32)[values.cat.codes.to_numpy()]
+
+
+def format_days(days):
+    """int32 days -> object array of YYYY-MM-DD strings, NaN where missing"""
+    # Dates repeat a lot: format each distinct day once
+    uniques, inverse = np.unique(np.asarray(days), return_inverse=True)
+    text = uniques.astype("datetime64[D]").astype(str).astype(object)
+    text[uniques == MISSING_DAY] = np.nan
+    return text[inverse]
+
+
+def day_number(text):
+    """A YYYY-MM-DD string as days since 1970-01-01, or None if it is not exactly such a date"""
+    try:
+        day = date.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+    # fromisoformat also takes other ISO forms (YYYYMMDD, ...) that the text columns never matched
+    return day.toordinal() - _EPOCH_ORDINAL if day.isoformat() == text else None
+
+
+def as_datetime64(series):
+    """A date column (encoded or text) as datetime64[D] values, NaT where missing or invalid"""
+    if is_day_column(series):
+        days = series.to_numpy()
+        return np.where(days == MISSING_DAY, np.datetime64("NaT"), days.astype("datetime64[D]"))
+    return pd.to_datetime(series, errors="coerce").to_numpy("datetime64[D]")
+
+
+def compact(df):
+    """Re-encode a parsed table's categorical and date columns in place; returns df"""
+    for column in df.columns:
+        values = df[column]
+        categorical = isinstance(values.dtype, pd.CategoricalDtype)
+        if not (categorical or values.dtype == object):
+            continue
+        if column in DATE_COLUMNS:
+            days = encode_days(values)
+            if days is not None:
+                df[column] = days
+            elif categorical:
+                df[column] = values.astype(object)
+        elif column in CATEGORICAL_COLUMNS and len(values):
+            distinct = len(values.cat.categories) if categorical else values.nunique()
+            if distinct > MAX_CATEGORY_RATIO * len(values):
+                if categorical:
+                    df[column] = values.astype(object)
+            elif not categorical:
+                df[column] = values.astype("category")
+    return df
+
+
+def read_table(path):
+    """Parse a CSV file into the compact representation"""
+    return compact(pd.read_csv(path, dtype={column: "category" for column in CATEGORICAL_COLUMNS | DATE_COLUMNS}))
+
+
+def _text(values):
+    """One encoded column as an object array of the original text"""
+    if is_day_column(values):
+        return format_days(values.to_numpy())
+    return values.to_numpy(dtype=object)
+
+
+def _is_encoded(values):
+    # Categoricals, and any other extension array (e.g. shared_tables.MappedTextArray)
+    return is_day_column(values) or isinstance(values.dtype, pd.api.extensions.ExtensionDtype)
+
+
+def decode(df):
+    """A copy of df with encoded columns turned back into the original text (safe to mutate)"""
+    return df.assign(**{column: _text(df[column]) for column in df.columns if _is_encoded(df[column])})
+
+
+def to_records(df):
+    """Rows as dicts of the original text, like decode(df).to_dict(orient="records") without copying df"""
+    columns = [(_text(df[column]) if _is_encoded(df[column]) else df[column].to_numpy()).tolist()
+               for column in df.columns]
+    names = list(df.columns)
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def memory_bytes(df):
+    """Deep memory use of a DataFrame (string objects included)"""
+    return int(df.memory_usage(index=True, deep=True).sum())
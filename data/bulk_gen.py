@@ -0,0 +1,589 @@
+"""
+Vectorized, multiprocess synthetic data generator for load tests.
+
+Produces the same five tables as data_gen.py (demographics, medical, engagement,
+hra_status, sdoh_resources) with the same columns and value pools, but:
+- every column is generated with NumPy for a whole chunk of patients at once
+- chunks are generated in worker processes and streamed to CSV or Parquet in order
+- at most a fixed window of chunks is in flight, so memory does not grow with size
+- each chunk has its own seed derived from (seed, chunk index), so the output is
+  identical for a given seed, chunk size and reference date, whatever the worker count
+- patient and resource IDs are allocated without collisions, and (first name, last
+  name, date of birth) triples are unique, so id- and identity-keyed lookups are valid
+- names follow a Zipf-like frequency over large pools, ages follow an age-band profile
+  and SDOH fan-out per patient is configurable (see distributions.py)
+
+Usage:
+    python bulk_gen.py --patients 10000000 --seed 7 --workers 8 --output-dir /tmp/load
+    python bulk_gen.py --patients 1000000 --format parquet --output-dir /tmp/load
+    python bulk_gen.py --patients 1000000 --output-dir /tmp/load --verify
+    python bulk_gen.py --patients 1000000 --age-profile medicare --sdoh-fanout poisson:1.5 --max-resources 8
+"""
+import argparse
+import functools
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from data_gen import (HRA_STATUS_OPTIONS, PROVIDER_REGIONS, RESOURCE_TYPES, RISK_LEVELS, SDOH_STATUS_OPTIONS,
+                      create_directory_if_not_exists)
+from distributions import (AGE_PROFILES, FIRST_NAMES, LAST_NAMES, age_weights, name_weights, parse_fanout,
+                           sample_fanout, sample_ranks)
+from patients import (ALLERGIES, BLOOD_TYPES, CONDITIONS, ETHNICITIES, GENDERS, INSURANCE_PROVIDERS,
+                      MARITAL_STATUSES, MEDICATIONS)
+
+DEFAULT_CHUNK_SIZE = 100000
+MIN_AGE, MAX_AGE = 18, 90
+
+# name_skew: Zipf exponent for name frequency (0 = uniform)
+# age_profile: key of distributions.AGE_PROFILES
+# sdoh_fanout: resources per patient, see distributions.parse_fanout
+# max_resources: cap on resources per patient; also sizes each patient's resource ID block
+DEFAULT_DISTRIBUTIONS = {
+    "name_skew": 1.0,
+    "age_profile": "us_adult",
+    "sdoh_fanout": "uniform",
+    "max_resources": 3,
+}
+
+# Patient IDs are PT + 8 hex digits
+PATIENT_ID_SPACE = 2 ** 32
+
+TABLE_COLUMNS = {
+    "demographics": ["patient_id", "first_name", "last_name", "full_name", "gender",
+                     "age", "date_of_birth", "blood_type", "ethnicity", "marital_status",
+                     "ssn", "email", "phone", "address", "insurance_provider",
+                     "policy_number", "group_number"],
+    "medical": ["patient_id", "allergies", "conditions", "medications"],
+    "engagement": ["patient_id", "start_date", "end_date", "last_visit"],
+    "hra_status": ["patient_id", "status", "completion_date", "risk_score", "risk_level", "next_assessment_due"],
+    "sdoh_resources": ["resource_id", "patient_id", "resource_type", "provider", "referral_date", "status", "notes"],
+}
+
+HEX_DIGITS = np.frombuffer(b"0123456789ABCDEF", dtype=np.uint8)
+
+
+# ---- Vectorized formatting helpers ----
+def _pick(rng, options, n):
+    """Uniform choice from a list, as an object array"""
+    return np.asarray(options, dtype=object)[rng.integers(0, len(options), n)]
+
+
+def _digits(values, width):
+    """Zero-padded decimal digits of non-negative ints as an (n, width) ASCII matrix"""
+    out = np.empty((len(values), width), dtype=np.uint8)
+    remaining = np.asarray(values, dtype=np.int64).copy()
+    for position in range(width - 1, -1, -1):
+        out[:, position] = 48 + remaining % 10
+        remaining //= 10
+    return out
+
+
+def _hex(values, width):
+    """Upper-case hex digits of non-negative ints as an (n, width) ASCII matrix"""
+    values = np.asarray(values, dtype=np.uint64)
+    out = np.empty((len(values), width), dtype=np.uint8)
+    for position in range(width):
+        shift = np.uint64(4 * (width - 1 - position))
+        out[:, position] = HEX_DIGITS[((values >> shift) & np.uint64(15)).astype(np.intp)]
+    return out
+
+
+def _join(n, *parts):
+    """Concatenate ASCII matrices and literal byte strings into one string column"""
+    blocks = [np.broadcast_to(np.frombuffer(p, dtype=np.uint8), (n, len(p))) if isinstance(p, bytes) else p
+              for p in parts]
+    matrix = np.ascontiguousarray(np.concatenate(blocks, axis=1))
+    return matrix.view(f"S{matrix.shape[1]}").ravel().astype(str).astype(object)
+
+
+def _iso_dates(days):
+    """datetime64[D] (or day offsets from the epoch) as YYYY-MM-DD strings"""
+    return np.datetime_as_string(np.asarray(days, dtype="datetime64[D]"), unit="D").astype(object)
+
+
+def _joined_samples(rng, items, n, max_k):
+    """
+    Vectorized random.sample(items, k=randint(0, max_k)) joined with '|' ("None" if empty).
+
+    Each row draws k and a random permutation prefix; rows are encoded as integers and
+    only the distinct codes are formatted, so no Python work is done per row.
+    """
+    size = len(items)
+    order = np.argsort(rng.random((n, size)), axis=1)[:, :max_k]
+    k = rng.integers(0, max_k + 1, n)
+    order = np.where(np.arange(max_k) < k[:, None], order, 0)
+    codes = k * size ** max_k + order @ (size ** np.arange(max_k - 1, -1, -1))
+
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    labels = np.empty(len(unique_codes), dtype=object)
+    for position, code in enumerate(unique_codes.tolist()):
+        count, rest = divmod(code, size ** max_k)
+        picks = [(rest // size ** (max_k - 1 - p)) % size for p in range(count)]
+        labels[position] = "|".join(items[i] for i in picks) if picks else "None"
+    return labels[inverse]
+
+
+# ---- Collision-free identifiers ----
+def _mix32(values):
+    """MurmurHash3 finalizer: a bijection on uint32, so distinct inputs stay distinct"""
+    x = np.asarray(values, dtype=np.uint64) & np.uint64(0xFFFFFFFF)
+    x ^= x >> np.uint64(16)
+    x = (x * np.uint64(0x85EBCA6B)) & np.uint64(0xFFFFFFFF)
+    x ^= x >> np.uint64(13)
+    x = (x * np.uint64(0xC2B2AE35)) & np.uint64(0xFFFFFFFF)
+    x ^= x >> np.uint64(16)
+    return x
+
+
+def patient_numbers(start, count, seed):
+    """
+    32-bit patient numbers for global rows [start, start + count).
+
+    The row index is offset by a seed-derived key and scrambled with a bijection, so IDs
+    look random but can never collide for up to 2**32 patients.
+    """
+    key = int(np.random.SeedSequence(seed).generate_state(1)[0])
+    rows = np.arange(start, start + count, dtype=np.uint64) + np.uint64(key)
+    return _mix32(rows)
+
+
+def resource_numbers(start, fanout, max_fanout):
+    """
+    Resource numbers for a chunk whose first patient is global row `start`.
+
+    Every patient row owns a block of max_fanout numbers, so chunks generated by
+    different workers draw from disjoint ranges.
+    """
+    owners = np.repeat(np.arange(len(fanout)), fanout)
+    slot = np.arange(len(owners)) - np.repeat(np.cumsum(fanout) - fanout, fanout)
+    return (start + owners) * max_fanout + slot
+
+
+def resource_id_width(num_patients, max_fanout):
+    """Digits needed for every resource number; at least 7 so IDs never match the API's RS + 5 hex"""
+    return max(7, len(str(max(num_patients * max_fanout - 1, 0))))
+
+
+# ---- Unique identities ----
+def _years_before(day, years):
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:  # Feb 29 in a non-leap year
+        return day.replace(year=day.year - years, day=28)
+
+
+def dob_window(reference_date):
+    """Earliest and latest date of birth for ages MIN_AGE..MAX_AGE on the reference date"""
+    today = date.fromisoformat(reference_date)
+    earliest = _years_before(today, MAX_AGE + 1) + timedelta(days=1)
+    latest = _years_before(today, MIN_AGE)
+    return np.datetime64(earliest, "D"), np.datetime64(latest, "D")
+
+
+def ages_on(dob, reference_date):
+    """Completed years between each date of birth and the reference date"""
+    today = np.datetime64(reference_date, "D")
+    years = today.astype("datetime64[Y]").astype(np.int64) - dob.astype("datetime64[Y]").astype(np.int64)
+    birthday = dob.astype("datetime64[Y]")
+    this_year = (dob.astype("datetime64[M]") - birthday.astype("datetime64[M]")
+                 + today.astype("datetime64[Y]").astype("datetime64[M]"))
+    month_day = dob - dob.astype("datetime64[M]").astype("datetime64[D]")
+    not_yet = this_year.astype("datetime64[D]") + month_day > today
+    return years - not_yet
+
+
+def identity_rng(seed, chunk_index):
+    """Random stream for a chunk's names and dates of birth, separate from its other columns"""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index, 1)))
+
+
+def draw_identities(seed, chunk_index, count, reference_date, distributions):
+    """First name index, last name index and date of birth for one chunk"""
+    rng = identity_rng(seed, chunk_index)
+    first_weights, last_weights = name_weights(distributions["name_skew"])
+    first_idx = sample_ranks(rng, first_weights, count)
+    last_idx = sample_ranks(rng, last_weights, count)
+
+    # Age from the profile, then a uniformly random day within that year of age
+    ages, weights = age_weights(distributions["age_profile"], MIN_AGE, MAX_AGE)
+    age = ages[sample_ranks(rng, weights, count)]
+    earliest, latest = dob_window(reference_date)
+    days_back = np.floor((age - MIN_AGE + rng.random(count)) * 365.2425).astype(np.int64)
+    dob = np.maximum(latest - days_back, earliest)
+    return first_idx, last_idx, dob
+
+
+class IdentityRegistry:
+    """
+    Every (first, last, date of birth) triple claimed so far, as a sorted int64 array.
+
+    Chunks are claimed in order by the parent process. A triple that is already taken
+    (by an earlier chunk or earlier in the same chunk) has its date of birth moved
+    forward one day at a time, wrapping inside the allowed window, until it is free.
+    Costs 8 bytes per patient.
+
+    Heavily skewed names can exhaust a name pair's dates of birth; claim() raises
+    rather than probing forever.
+    """
+
+    def __init__(self, reference_date):
+        self.earliest, latest = dob_window(reference_date)
+        self.span = int((latest - self.earliest).astype(np.int64)) + 1
+        self.keys = np.empty(0, dtype=np.int64)
+
+    @property
+    def capacity(self):
+        return len(FIRST_NAMES) * len(LAST_NAMES) * self.span
+
+    def claim(self, first_idx, last_idx, dob):
+        """Reserve the chunk's triples and return the (possibly adjusted) dates of birth"""
+        pair = first_idx.astype(np.int64) * len(LAST_NAMES) + last_idx
+        offset = (dob - self.earliest).astype(np.int64)
+        for _ in range(self.span):
+            keys = pair * self.span + offset
+            position = np.searchsorted(self.keys, keys)
+            taken = self.keys[np.minimum(position, len(self.keys) - 1)] == keys if len(self.keys) else \
+                np.zeros(len(keys), dtype=bool)
+            repeated = np.ones(len(keys), dtype=bool)
+            repeated[np.unique(keys, return_index=True)[1]] = False
+            clash = taken | repeated
+            if not clash.any():
+                break
+            offset[clash] = (offset[clash] + 1) % self.span
+        else:
+            raise ValueError("Ran out of dates of birth for a (first, last) name pair; "
+                             "lower the name skew or generate fewer patients")
+
+        keys.sort()
+        self.keys = np.insert(self.keys, np.searchsorted(self.keys, keys), keys)
+        return self.earliest + offset
+
+
+# ---- Chunk generation ----
+@functools.lru_cache(maxsize=1)
+def _name_pair_labels():
+    """full_name and email for every (first, last) pair, indexed by first * len(LAST_NAMES) + last"""
+    full_names = np.asarray([f"{f} {l}" for f in FIRST_NAMES for l in LAST_NAMES], dtype=object)
+    emails = np.asarray([f"{f.lower()}.{l.lower()}@example.com" for f in FIRST_NAMES for l in LAST_NAMES],
+                        dtype=object)
+    return full_names, emails
+
+
+def chunk_rng(seed, chunk_index):
+    """Independent, reproducible random stream for one chunk"""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index, 0)))
+
+
+def generate_chunk(task):
+    """Generate all five tables for one chunk of patients as DataFrames"""
+    rng = chunk_rng(task["seed"], task["chunk_index"])
+    today = np.datetime64(task["reference_date"], "D")
+    start = task["start"]
+    n = task["count"]
+
+    patient_ids = _join(n, b"PT", _hex(patient_numbers(start, n, task["seed"]), 8))
+
+    # ---- Demographics ----
+    first_idx, last_idx, dob = task["first_idx"], task["last_idx"], task["dob"]
+    first_names = np.asarray(FIRST_NAMES, dtype=object)[first_idx]
+    last_names = np.asarray(LAST_NAMES, dtype=object)[last_idx]
+    full_names, emails = _name_pair_labels()
+    pair = first_idx * len(LAST_NAMES) + last_idx
+
+    street = pd.Series(rng.integers(100, 10000, n)).astype(str)
+    zip_code = pd.Series(rng.integers(10000, 100000, n)).astype(str)
+
+    demographics = pd.DataFrame({
+        "patient_id": patient_ids,
+        "first_name": first_names,
+        "last_name": last_names,
+        "full_name": full_names[pair],
+        "gender": _pick(rng, GENDERS, n),
+        "age": ages_on(dob, task["reference_date"]),
+        "date_of_birth": _iso_dates(dob),
+        "blood_type": _pick(rng, BLOOD_TYPES, n),
+        "ethnicity": _pick(rng, ETHNICITIES, n),
+        "marital_status": _pick(rng, MARITAL_STATUSES, n),
+        "ssn": _join(n, _digits(rng.integers(100, 1000, n), 3), b"-",
+                     _digits(rng.integers(10, 100, n), 2), b"-", _digits(rng.integers(1000, 10000, n), 4)),
+        "email": emails[pair],
+        "phone": _join(n, _digits(rng.integers(100, 1000, n), 3), b"-",
+                       _digits(rng.integers(100, 1000, n), 3), b"-", _digits(rng.integers(1000, 10000, n), 4)),
+        "address": (street + " Main St, Anytown, ST " + zip_code).to_numpy(dtype=object),
+        "insurance_provider": _pick(rng, INSURANCE_PROVIDERS, n),
+        "policy_number": rng.integers(100000, 1000000, n),
+        "group_number": rng.integers(1000, 10000, n),
+    })
+
+    # ---- Medical ----
+    medical = pd.DataFrame({
+        "patient_id": patient_ids,
+        "allergies": _joined_samples(rng, ALLERGIES, n, 3),
+        "conditions": _joined_samples(rng, CONDITIONS, n, 2),
+        "medications": _joined_samples(rng, MEDICATIONS, n, 3),
+    })
+
+    # ---- Engagement (start dates in the reference year, as in data_gen.py) ----
+    year = today.astype("datetime64[Y]")
+    start_date = (year.astype("datetime64[M]") + rng.integers(0, 10, n)).astype("datetime64[D]") \
+        + rng.integers(0, 28, n)
+    end = start_date + rng.integers(10, 91, n)
+    past_year_end = end.astype("datetime64[Y]") > year
+    december = (year.astype("datetime64[M]") + 11).astype("datetime64[D]") + rng.integers(0, 28, n)
+    end = np.where(past_year_end, december, end)
+    engagement = pd.DataFrame({
+        "patient_id": patient_ids,
+        "start_date": _iso_dates(start_date),
+        "end_date": _iso_dates(end),
+        "last_visit": _iso_dates(today - rng.integers(1, 366, n)),
+    })
+
+    # ---- HRA status ----
+    status_idx = rng.integers(0, len(HRA_STATUS_OPTIONS), n)
+    completed = status_idx == HRA_STATUS_OPTIONS.index("Completed")
+    completion = np.where(completed, _iso_dates(today - rng.integers(1, 181, n)), "")
+    hra_status = pd.DataFrame({
+        "patient_id": patient_ids,
+        "status": np.asarray(HRA_STATUS_OPTIONS, dtype=object)[status_idx],
+        "completion_date": completion,
+        "risk_score": pd.array(np.where(completed, rng.integers(0, 101, n), 0), dtype="Int64"),
+        "risk_level": pd.array(np.asarray(RISK_LEVELS)[rng.integers(0, len(RISK_LEVELS), n)], dtype="Int64"),
+        "next_assessment_due": _iso_dates(today + rng.integers(30, 366, n)),
+    })
+    hra_status.loc[~completed, ["risk_score", "risk_level"]] = pd.NA
+
+    # ---- SDOH resources ----
+    max_resources = task["distributions"]["max_resources"]
+    fanout = sample_fanout(rng, task["distributions"]["sdoh_fanout"], n, max_resources)
+    owners = np.repeat(np.arange(n), fanout)
+    m = len(owners)
+    type_idx = rng.integers(0, len(RESOURCE_TYPES), m)
+    region_idx = rng.integers(0, len(PROVIDER_REGIONS), m)
+    providers = np.asarray([f"{t} Services of {r}" for t in RESOURCE_TYPES for r in PROVIDER_REGIONS], dtype=object)
+    notes = np.asarray([f"Patient referred for {t.lower()} assistance" for t in RESOURCE_TYPES], dtype=object)
+    sdoh_resources = pd.DataFrame({
+        "resource_id": _join(m, b"RS", _digits(resource_numbers(start, fanout, max_resources),
+                                               task["resource_id_width"])),
+        "patient_id": patient_ids[owners],
+        "resource_type": np.asarray(RESOURCE_TYPES, dtype=object)[type_idx],
+        "provider": providers[type_idx * len(PROVIDER_REGIONS) + region_idx],
+        "referral_date": _iso_dates(today - rng.integers(1, 91, m)),
+        "status": _pick(rng, SDOH_STATUS_OPTIONS, m),
+        "notes": np.where(rng.random(m) > 0.5, notes[type_idx], ""),
+    })
+
+    return {
+        "demographics": demographics,
+        "medical": medical,
+        "engagement": engagement,
+        "hra_status": hra_status,
+        "sdoh_resources": sdoh_resources,
+    }
+
+
+def _encode_chunk(task):
+    """Worker entry point: generate a chunk and serialize it for the parent to write"""
+    tables = generate_chunk(task)
+    if task["fmt"] == "csv":
+        return {name: df.to_csv(index=False, header=False).encode() for name, df in tables.items()}
+    import pyarrow as pa
+    return {name: pa.Table.from_pandas(df, preserve_index=False) for name, df in tables.items()}
+
+
+# ---- Output writers ----
+class CsvSink:
+    """Appends pre-encoded CSV chunks to one file per table"""
+
+    def __init__(self, output_dir):
+        self.files = {}
+        for name, columns in TABLE_COLUMNS.items():
+            f = open(os.path.join(output_dir, f"{name}.csv"), "wb")
+            f.write((",".join(columns) + "\n").encode())
+            self.files[name] = f
+
+    def write(self, chunk):
+        for name, payload in chunk.items():
+            self.files[name].write(payload)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+class ParquetSink:
+    """Appends Arrow tables as row groups to one Parquet file per table"""
+
+    def __init__(self, output_dir):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow (pip install pyarrow)")
+        self.pq = pq
+        self.output_dir = output_dir
+        self.writers = {}
+
+    def write(self, chunk):
+        for name, table in chunk.items():
+            if name not in self.writers:
+                path = os.path.join(self.output_dir, f"{name}.parquet")
+                self.writers[name] = self.pq.ParquetWriter(path, table.schema)
+            self.writers[name].write_table(table.cast(self.writers[name].schema))
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+def chunk_tasks(num_patients, chunk_size, seed, reference_date, fmt, distributions, unique_identities=True):
+    """
+    Split the population into fixed-size chunks; chunk boundaries define the output.
+
+    Identities are drawn here, in the parent, so the registry sees chunks in order and
+    the result does not depend on which worker generates which chunk.
+    """
+    registry = IdentityRegistry(reference_date) if unique_identities else None
+    if registry is not None and num_patients > registry.capacity:
+        raise ValueError(f"Cannot generate {num_patients} unique identities; "
+                         f"the name pools and age range allow {registry.capacity}")
+
+    width = resource_id_width(num_patients, distributions["max_resources"])
+    for chunk_index, start in enumerate(range(0, num_patients, chunk_size)):
+        count = min(chunk_size, num_patients - start)
+        first_idx, last_idx, dob = draw_identities(seed, chunk_index, count, reference_date, distributions)
+        if registry is not None:
+            dob = registry.claim(first_idx, last_idx, dob)
+        yield {
+            "chunk_index": chunk_index,
+            "start": start,
+            "count": count,
+            "seed": seed,
+            "reference_date": reference_date,
+            "fmt": fmt,
+            "distributions": distributions,
+            "first_idx": first_idx,
+            "last_idx": last_idx,
+            "dob": dob,
+            "resource_id_width": width,
+        }
+
+
+def write_dataset(output_dir, num_patients, seed=0, chunk_size=DEFAULT_CHUNK_SIZE, workers=None,
+                  fmt="csv", reference_date=None, unique_identities=True, distributions=None):
+    """
+    Generate num_patients patients into output_dir, streaming chunk by chunk.
+
+    At most 2 * workers chunks are generated but not yet written at any time.
+    `distributions` overrides entries of DEFAULT_DISTRIBUTIONS.
+    """
+    if num_patients > PATIENT_ID_SPACE:
+        raise ValueError(f"At most {PATIENT_ID_SPACE} patients can have unique IDs")
+    distributions = dict(DEFAULT_DISTRIBUTIONS, **(distributions or {}))
+    parse_fanout(distributions["sdoh_fanout"])
+    if distributions["age_profile"] not in AGE_PROFILES:
+        raise ValueError(f"Unknown age profile {distributions['age_profile']!r}")
+    create_directory_if_not_exists(output_dir)
+    reference_date = reference_date or date.today().isoformat()
+    workers = workers or os.cpu_count() or 1
+    sink = CsvSink(output_dir) if fmt == "csv" else ParquetSink(output_dir)
+    tasks = chunk_tasks(num_patients, chunk_size, seed, reference_date, fmt, distributions, unique_identities)
+
+    try:
+        if workers == 1:
+            for task in tasks:
+                sink.write(_encode_chunk(task))
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque()
+            for task in tasks:
+                in_flight.append(pool.submit(_encode_chunk, task))
+                if len(in_flight) >= 2 * workers:
+                    sink.write(in_flight.popleft().result())
+            while in_flight:
+                sink.write(in_flight.popleft().result())
+    finally:
+        sink.close()
+
+
+def _read_table(output_dir, name, columns):
+    csv_path = os.path.join(output_dir, f"{name}.csv")
+    if os.path.exists(csv_path):
+        return pd.read_csv(csv_path, usecols=columns, dtype=str, keep_default_na=False)
+    return pd.read_parquet(os.path.join(output_dir, f"{name}.parquet"), columns=columns)
+
+
+def verify_dataset(output_dir):
+    """
+    Check key uniqueness and referential integrity of a generated dataset.
+
+    Returns a dict of problem counts; every value is 0 for a valid dataset.
+    """
+    demographics = _read_table(output_dir, "demographics", ["patient_id", "first_name", "last_name", "date_of_birth"])
+    patient_ids = set(demographics["patient_id"])
+    identity = (demographics["first_name"].str.lower() + "|" + demographics["last_name"].str.lower()
+                + "|" + demographics["date_of_birth"])
+    problems = {
+        "duplicate_patient_ids": int(demographics["patient_id"].duplicated().sum()),
+        "duplicate_identities": int(identity.duplicated().sum()),
+    }
+    del demographics, identity
+
+    for name in ["medical", "engagement", "hra_status"]:
+        ids = _read_table(output_dir, name, ["patient_id"])["patient_id"]
+        problems[f"{name}_duplicate_patient_ids"] = int(ids.duplicated().sum())
+        problems[f"{name}_unknown_patient_ids"] = int((~ids.isin(patient_ids)).sum())
+        problems[f"{name}_missing_patients"] = len(patient_ids) - ids.nunique()
+
+    sdoh = _read_table(output_dir, "sdoh_resources", ["resource_id", "patient_id"])
+    problems["duplicate_resource_ids"] = int(sdoh["resource_id"].duplicated().sum())
+    problems["sdoh_unknown_patient_ids"] = int((~sdoh["patient_id"].isin(patient_ids)).sum())
+    return problems
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate large synthetic patient datasets")
+    parser.add_argument("--patients", type=int, default=1000000, help="Number of patients to generate")
+    parser.add_argument("--seed", type=int, default=0, help="Seed; same seed and chunk size give the same data")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Patients per chunk")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Output format")
+    parser.add_argument("--reference-date", help="Date treated as 'today' (YYYY-MM-DD); defaults to today")
+    parser.add_argument("--name-skew", type=float, default=DEFAULT_DISTRIBUTIONS["name_skew"],
+                        help="Zipf exponent for first/last name frequency; 0 draws names uniformly")
+    parser.add_argument("--age-profile", choices=sorted(AGE_PROFILES), default=DEFAULT_DISTRIBUTIONS["age_profile"],
+                        help="Age distribution of the population")
+    parser.add_argument("--sdoh-fanout", default=DEFAULT_DISTRIBUTIONS["sdoh_fanout"],
+                        help="SDOH resources per patient: uniform, poisson:<mean> or zipf:<exponent>")
+    parser.add_argument("--max-resources", type=int, default=DEFAULT_DISTRIBUTIONS["max_resources"],
+                        help="Cap on SDOH resources per patient")
+    parser.add_argument("--allow-duplicate-identities", action="store_true",
+                        help="Skip the (first, last, dob) uniqueness registry (saves 8 bytes per patient)")
+    parser.add_argument("--verify", action="store_true", help="Check IDs and referential integrity afterwards")
+    parser.add_argument("--output-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "csv_data"),
+                        help="Directory to write the tables to")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    started = time.perf_counter()
+    write_dataset(args.output_dir, args.patients, seed=args.seed, chunk_size=args.chunk_size,
+                  workers=args.workers, fmt=args.format, reference_date=args.reference_date,
+                  unique_identities=not args.allow_duplicate_identities,
+                  distributions={"name_skew": args.name_skew, "age_profile": args.age_profile,
+                                 "sdoh_fanout": args.sdoh_fanout, "max_resources": args.max_resources})
+    print(f"Generated {args.patients} patients in {args.output_dir} "
+          f"({time.perf_counter() - started:.1f}s)", file=sys.stderr)
+
+    if args.verify:
+        problems = verify_dataset(args.output_dir)
+        for check, count in problems.items():
+            print(f"{check}: {count}", file=sys.stderr)
+        sys.exit(1 if any(problems.values()) else 0)
@@ -4,6 +4,12 @@ import random
 from datetime import datetime, timedelta
 from patients import generate_patient_data
 
+HRA_STATUS_OPTIONS = ["Completed", "Pending", "Not Started", "Expired"]
+RISK_LEVELS = [1, 2, 3, 4, 5]  # Risk levels from 1 (low) to 5 (high)
+RESOURCE_TYPES = ["Housing", "Food", "Transportation", "Education", "Employment", "Financial", "Healthcare Access", "Social Support"]
+SDOH_STATUS_OPTIONS = ["Referred", "Engaged", "Completed", "Declined", "Not Eligible"]
+PROVIDER_REGIONS = ['Metro Area', 'County', 'State', 'Federal']
+
 def create_directory_if_not_exists(directory_path):
     """Create directory if it doesn't exist"""
     if not os.path.exists(directory_path):
@@ -13,11 +19,9 @@ def create_directory_if_not_exists(directory_path):
 def generate_hra_status(patients):
     """Generate Health Risk Assessment status data for patients"""
     hra_data = []
-    status_options = ["Completed", "Pending", "Not Started", "Expired"]
-    risk_levels = [1, 2, 3, 4, 5]  # Risk levels from 1 (low) to 5 (high)
 
     for patient in patients:
-        status = random.choice(status_options)
+        status = random.choice(HRA_STATUS_OPTIONS)
         completion_date = None
         risk_score = None
         risk_level = None
@@ -25,14 +29,14 @@ def generate_hra_status(patients):
         if status == "Completed":
             completion_date = (datetime.now() - timedelta(days=random.randint(1, 180))).strftime("%Y-%m-%d")
             risk_score = random.randint(0, 100)
-            risk_level = random.choice(risk_levels)
+            risk_level = random.choice(RISK_LEVELS)
         
         hra_data.append({
             "patient_id": patient["patient_id"],
             "status": status,
             "completion_date": completion_date if completion_date else "",
             "risk_score": risk_score if risk_score else "",
-            "risk_level": risk_level if risk_levels else "",
+            "risk_level": risk_level if RISK_LEVELS else "",
             "next_assessment_due": (datetime.now() + timedelta(days=random.randint(30, 365))).strftime("%Y-%m-%d")
         })
     
@@ -41,22 +45,20 @@ def generate_hra_status(patients):
 def generate_sdoh_resources(patients):
     """Generate Social Determinants of Health resources data for patients"""
     sdoh_data = []
-    resource_types = ["Housing", "Food", "Transportation", "Education", "Employment", "Financial", "Healthcare Access", "Social Support"]
-    status_options = ["Referred", "Engaged", "Completed", "Declined", "Not Eligible"]
     
     # Each patient might have multiple resources
     for patient in patients:
         # Generate 0-3 resources per patient
         num_resources = random.randint(0, 3)
         for i in range(num_resources):
-            resource_type = random.choice(resource_types)
+            resource_type = random.choice(RESOURCE_TYPES)
             sdoh_data.append({
                 "resource_id": f"RS{str(random.randint(10000, 99999))}",
                 "patient_id": patient["patient_id"],
                 "resource_type": resource_type,
-                "provider": f"{resource_type} Services of {random.choice(['Metro Area', 'County', 'State', 'Federal'])}",
+                "provider": f"{resource_type} Services of {random.choice(PROVIDER_REGIONS)}",
                 "referral_date": (datetime.now() - timedelta(days=random.randint(1, 90))).strftime("%Y-%m-%d"),
-                "status": random.choice(status_options),
+                "status": random.choice(SDOH_STATUS_OPTIONS),
                 "notes": f"Patient referred for {resource_type.lower()} assistance" if random.random() > 0.5 else ""
             })
     
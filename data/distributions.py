@@ -0,0 +1,144 @@
+"""
+Value distributions for the bulk generator.
+
+Name pools are ordered by approximate US frequency (SSA first names, Census surnames)
+and sampled with Zipf-Mandelbrot weights, age follows an age-band profile, and SDOH
+fan-out per patient follows a configurable distribution. This keeps hot keys and
+identity collisions in load-test data close to a real member population.
+"""
+import numpy as np
+
+FIRST_NAMES = [
+    "James", "Mary", "Michael", "Robert", "John", "Jennifer", "David", "Patricia", "William", "Linda",
+    "Richard", "Elizabeth", "Joseph", "Barbara", "Thomas", "Susan", "Christopher", "Jessica", "Charles", "Sarah",
+    "Daniel", "Karen", "Matthew", "Lisa", "Anthony", "Nancy", "Mark", "Betty", "Donald", "Sandra",
+    "Steven", "Margaret", "Andrew", "Ashley", "Paul", "Kimberly", "Joshua", "Emily", "Kenneth", "Donna",
+    "Kevin", "Michelle", "Brian", "Carol", "George", "Amanda", "Timothy", "Melissa", "Ronald", "Deborah",
+    "Jason", "Stephanie", "Edward", "Dorothy", "Jeffrey", "Rebecca", "Ryan", "Sharon", "Jacob", "Laura",
+    "Gary", "Cynthia", "Nicholas", "Amy", "Eric", "Kathleen", "Jonathan", "Angela", "Stephen", "Shirley",
+    "Larry", "Brenda", "Justin", "Emma", "Scott", "Anna", "Brandon", "Pamela", "Benjamin", "Nicole",
+    "Samuel", "Samantha", "Gregory", "Katherine", "Alexander", "Christine", "Patrick", "Debra", "Frank", "Rachel",
+    "Raymond", "Carolyn", "Jack", "Janet", "Dennis", "Maria", "Jerry", "Olivia", "Tyler", "Heather",
+    "Aaron", "Helen", "Jose", "Catherine", "Adam", "Diane", "Nathan", "Julie", "Henry", "Victoria",
+    "Zachary", "Joyce", "Douglas", "Lauren", "Peter", "Kelly", "Kyle", "Christina", "Noah", "Ruth",
+    "Ethan", "Joan", "Jeremy", "Virginia", "Walter", "Judith", "Christian", "Evelyn", "Keith", "Hannah",
+    "Roger", "Andrea", "Terry", "Megan", "Austin", "Cheryl", "Sean", "Jacqueline", "Gerald", "Madison",
+    "Carl", "Teresa", "Harold", "Abigail", "Dylan", "Sophia", "Arthur", "Martha", "Lawrence", "Sara",
+    "Jordan", "Gloria", "Jesse", "Janice", "Bryan", "Kathryn", "Billy", "Ann", "Bruce", "Isabella",
+    "Gabriel", "Judy", "Joe", "Charlotte", "Logan", "Julia", "Alan", "Grace", "Juan", "Amber",
+    "Albert", "Alice", "Willie", "Jean", "Elijah", "Denise", "Wayne", "Frances", "Randy", "Danielle",
+    "Vincent", "Marilyn", "Mason", "Natalie", "Roy", "Beverly", "Ralph", "Diana", "Bobby", "Brittany",
+    "Russell", "Theresa", "Bradley", "Kayla", "Philip", "Alexis", "Eugene", "Doris", "Luis", "Lori",
+]
+
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson",
+    "Walker", "Young", "Allen", "King", "Wright", "Scott", "Torres", "Nguyen", "Hill", "Flores",
+    "Green", "Adams", "Nelson", "Baker", "Hall", "Rivera", "Campbell", "Mitchell", "Carter", "Roberts",
+    "Gomez", "Phillips", "Evans", "Turner", "Diaz", "Parker", "Cruz", "Edwards", "Collins", "Reyes",
+    "Stewart", "Morris", "Morales", "Murphy", "Cook", "Rogers", "Gutierrez", "Ortiz", "Morgan", "Cooper",
+    "Peterson", "Bailey", "Reed", "Kelly", "Howard", "Ramos", "Kim", "Cox", "Ward", "Richardson",
+    "Watson", "Brooks", "Chavez", "Wood", "James", "Bennett", "Gray", "Mendoza", "Ruiz", "Hughes",
+    "Price", "Alvarez", "Castillo", "Sanders", "Patel", "Myers", "Long", "Ross", "Foster", "Jimenez",
+    "Powell", "Jenkins", "Perry", "Russell", "Sullivan", "Bell", "Coleman", "Butler", "Henderson", "Barnes",
+    "Gonzales", "Fisher", "Vasquez", "Simmons", "Romero", "Jordan", "Patterson", "Alexander", "Hamilton", "Graham",
+    "Reynolds", "Griffin", "Wallace", "Moreno", "West", "Cole", "Hayes", "Bryant", "Herrera", "Gibson",
+    "Ellis", "Tran", "Medina", "Aguilar", "Stevens", "Murray", "Ford", "Castro", "Marshall", "Owens",
+    "Harrison", "Fernandez", "McDonald", "Woods", "Washington", "Kennedy", "Wells", "Vargas", "Henry", "Chen",
+    "Freeman", "Webb", "Tucker", "Guzman", "Burns", "Crawford", "Olson", "Simpson", "Porter", "Hunter",
+    "Gordon", "Mendez", "Silva", "Shaw", "Snyder", "Mason", "Dixon", "Munoz", "Hunt", "Hicks",
+    "Holmes", "Palmer", "Wagner", "Black", "Robertson", "Boyd", "Rose", "Stone", "Salazar", "Fox",
+    "Warren", "Mills", "Meyer", "Rice", "Schmidt", "Garza", "Daniels", "Ferguson", "Nichols", "Stephens",
+    "Soto", "Weaver", "Ryan", "Gardner", "Payne", "Grant", "Dunn", "Kelley", "Spencer", "Hawkins",
+    "Arnold", "Pierce", "Vazquez", "Hansen", "Peters", "Santos", "Hart", "Bradley", "Knight", "Elliott",
+    "Cunningham", "Duncan", "Armstrong", "Hudson", "Carroll", "Lane", "Riley", "Andrews", "Alvarado", "Ray",
+    "Delgado", "Berry", "Perkins", "Hoffman", "Johnston", "Matthews", "Pena", "Richards", "Contreras", "Willis",
+    "Carpenter", "Lawrence", "Sandoval", "Guerrero", "George", "Chapman", "Rios", "Estrada", "Ortega", "Watkins",
+    "Greene", "Nunez", "Wheeler", "Valdez", "Harper", "Burke", "Larson", "Santiago", "Maldonado", "Morrison",
+    "Franklin", "Carlson", "Austin", "Dominguez", "Carr", "Lawson", "Jacobs", "Obrien", "Lynch", "Singh",
+    "Vega", "Bishop", "Montgomery", "Oliver", "Jensen", "Harvey", "Williamson", "Gilbert", "Dean", "Sims",
+    "Espinoza", "Howell", "Li", "Wong", "Reid", "Hanson", "Le", "McCoy", "Garrett", "Burton",
+    "Fuller", "Wang", "Weber", "Welch", "Rojas", "Lucas", "Marquez", "Fields", "Park", "Yang",
+]
+
+# Share of the adult population in each age band (lower, upper, share); US Census-style
+# shapes. "medicare" skews older, as in a Medicare Advantage member population.
+AGE_PROFILES = {
+    "uniform": [(18, 90, 1.0)],
+    "us_adult": [(18, 24, 0.118), (25, 34, 0.176), (35, 44, 0.167), (45, 54, 0.158),
+                 (55, 64, 0.165), (65, 74, 0.128), (75, 84, 0.065), (85, 90, 0.023)],
+    "medicare": [(18, 44, 0.04), (45, 64, 0.09), (65, 69, 0.24), (70, 74, 0.23),
+                 (75, 79, 0.18), (80, 84, 0.12), (85, 90, 0.10)],
+}
+
+# Zipf-Mandelbrot offset: flattens the head so the top name is a few percent of the
+# population, as in real name data, instead of 1/H(n) of it
+NAME_RANK_OFFSET = {"first": 10.0, "last": 30.0}
+
+
+def zipf_weights(size, exponent, offset=0.0):
+    """Probability of each rank 1..size proportional to 1 / (rank + offset) ** exponent"""
+    weights = 1.0 / (np.arange(1, size + 1) + offset) ** exponent
+    return weights / weights.sum()
+
+
+def sample_ranks(rng, weights, n):
+    """Vectorized draw of n indices with the given probabilities"""
+    cumulative = np.cumsum(weights)
+    cumulative[-1] = 1.0
+    return np.searchsorted(cumulative, rng.random(n), side="right")
+
+
+def name_weights(exponent):
+    """(first, last) name weights for a skew exponent; 0 means uniform"""
+    return (zipf_weights(len(FIRST_NAMES), exponent, NAME_RANK_OFFSET["first"]),
+            zipf_weights(len(LAST_NAMES), exponent, NAME_RANK_OFFSET["last"]))
+
+
+def age_weights(profile, min_age, max_age):
+    """Per-year weights for ages min_age..max_age, spreading each band evenly over its years"""
+    if profile not in AGE_PROFILES:
+        raise ValueError(f"Unknown age profile {profile!r}; choose from {sorted(AGE_PROFILES)}")
+    ages = np.arange(min_age, max_age + 1)
+    weights = np.zeros(len(ages))
+    for lower, upper, share in AGE_PROFILES[profile]:
+        in_band = (ages >= lower) & (ages <= upper)
+        if in_band.any():
+            weights[in_band] = share / in_band.sum()
+    return ages, weights / weights.sum()
+
+
+def parse_fanout(spec):
+    """
+    Parse an SDOH fan-out spec into (kind, parameter).
+
+    "uniform"      0..max resources with equal probability (data_gen.py behaviour)
+    "poisson:1.2"  Poisson with the given mean
+    "zipf:2.0"     heavy-tailed: most patients have none, a few have many
+    Every draw is capped at the generator's maximum resources per patient.
+    """
+    kind, _, parameter = spec.partition(":")
+    if kind == "uniform" and not parameter:
+        return kind, None
+    if kind in ("poisson", "zipf"):
+        try:
+            value = float(parameter)
+        except ValueError:
+            raise ValueError(f"Fan-out spec {spec!r} needs a numeric parameter, e.g. {kind}:1.5")
+        if value <= 0 or (kind == "zipf" and value <= 1):
+            raise ValueError(f"Fan-out parameter out of range in {spec!r}")
+        return kind, value
+    raise ValueError(f"Unknown fan-out spec {spec!r}; use uniform, poisson:<mean> or zipf:<exponent>")
+
+
+def sample_fanout(rng, spec, n, max_resources):
+    """Number of SDOH resources for each of n patients"""
+    kind, parameter = parse_fanout(spec)
+    if kind == "uniform":
+        return rng.integers(0, max_resources + 1, n)
+    if kind == "poisson":
+        return np.minimum(rng.poisson(parameter, n), max_resources)
+    # Zipf starts at 1; shift so zero resources is the most common count
+    return np.minimum(rng.zipf(parameter, n) - 1, max_resources)
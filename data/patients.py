@@ -4,22 +4,25 @@ import uuid
 from datetime import datetime, timedelta
 import os
 
+# Lists for generating realistic mock data
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael",
+               "Linda", "David", "Elizabeth", "William", "Susan", "Richard", "Jessica"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Jones", "Brown", "Davis", "Miller",
+              "Wilson", "Moore", "Taylor", "Anderson", "Thomas", "Jackson", "White"]
+GENDERS = ["Male", "Female", "Non-binary", "Other", "Prefer not to say"]
+BLOOD_TYPES = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+ETHNICITIES = ["Caucasian", "African American", "Hispanic", "Asian", "Pacific Islander",
+               "Native American", "Mixed", "Other"]
+MARITAL_STATUSES = ["Single", "Married", "Divorced", "Widowed", "Separated"]
+INSURANCE_PROVIDERS = ["Aetna", "Blue Cross", "Cigna", "UnitedHealth", "Humana",
+                       "Kaiser", "Medicare", "Medicaid"]
+ALLERGIES = ["Penicillin", "Peanuts", "Latex", "Shellfish", "None", "Pollen", "Dust"]
+CONDITIONS = ["Hypertension", "Diabetes", "Asthma", "Depression", "Arthritis", "None"]
+MEDICATIONS = ["Lisinopril", "Metformin", "Atorvastatin", "Levothyroxine", "None"]
+
 def generate_patient_data(num_patients=10):
     """Generate mock patient demographics data"""
     
-    # Lists for generating realistic mock data
-    first_names = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", 
-                  "Linda", "David", "Elizabeth", "William", "Susan", "Richard", "Jessica"]
-    last_names = ["Smith", "Johnson", "Williams", "Jones", "Brown", "Davis", "Miller", 
-                 "Wilson", "Moore", "Taylor", "Anderson", "Thomas", "Jackson", "White"]
-    genders = ["Male", "Female", "Non-binary", "Other", "Prefer not to say"]
-    blood_types = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
-    ethnicities = ["Caucasian", "African American", "Hispanic", "Asian", "Pacific Islander", 
-                  "Native American", "Mixed", "Other"]
-    marital_statuses = ["Single", "Married", "Divorced", "Widowed", "Separated"]
-    insurance_providers = ["Aetna", "Blue Cross", "Cigna", "UnitedHealth", "Humana", 
-                          "Kaiser", "Medicare", "Medicaid"]
-    
     patients = []
     
     for i in range(num_patients):
@@ -27,9 +30,9 @@ def generate_patient_data(num_patients=10):
         patient_id = f"PT{str(uuid.uuid4())[:8].upper()}"
         
         # Generate basic demographics
-        first_name = random.choice(first_names)
-        last_name = random.choice(last_names)
-        gender = random.choice(genders)
+        first_name = random.choice(FIRST_NAMES)
+        last_name = random.choice(LAST_NAMES)
+        gender = random.choice(GENDERS)
         age = random.randint(18, 90)
         
         # Generate date of birth based on age
@@ -59,9 +62,9 @@ def generate_patient_data(num_patients=10):
                 "gender": gender,
                 "age": age,
                 "date_of_birth": dob.strftime("%Y-%m-%d"),
-                "blood_type": random.choice(blood_types),
-                "ethnicity": random.choice(ethnicities),
-                "marital_status": random.choice(marital_statuses),
+                "blood_type": random.choice(BLOOD_TYPES),
+                "ethnicity": random.choice(ETHNICITIES),
+                "marital_status": random.choice(MARITAL_STATUSES),
                 "ssn": f"{random.randint(100, 999)}-{random.randint(10, 99)}-{random.randint(1000, 9999)}",
                 "contact": {
                     "email": f"{first_name.lower()}.{last_name.lower()}@example.com",
@@ -69,18 +72,15 @@ def generate_patient_data(num_patients=10):
                     "address": f"{random.randint(100, 9999)} Main St, Anytown, ST {random.randint(10000, 99999)}"
                 },
                 "insurance": {
-                    "provider": random.choice(insurance_providers),
+                    "provider": random.choice(INSURANCE_PROVIDERS),
                     "policy_number": f"{random.randint(100000, 999999)}",
                     "group_number": f"{random.randint(1000, 9999)}"
                 }
             },
             "medical": {
-                "allergies": random.sample(["Penicillin", "Peanuts", "Latex", "Shellfish", "None", "Pollen", "Dust"], 
-                                          k=random.randint(0, 3)),
-                "conditions": random.sample(["Hypertension", "Diabetes", "Asthma", "Depression", "Arthritis", "None"], 
-                                           k=random.randint(0, 2)),
-                "medications": random.sample(["Lisinopril", "Metformin", "Atorvastatin", "Levothyroxine", "None"], 
-                                           k=random.randint(0, 3))
+                "allergies": random.sample(ALLERGIES, k=random.randint(0, 3)),
+                "conditions": random.sample(CONDITIONS, k=random.randint(0, 2)),
+                "medications": random.sample(MEDICATIONS, k=random.randint(0, 3))
             },
             "engagement": {
                 # Format dates as strings
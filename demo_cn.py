@@ -14,6 +14,12 @@ from langgraph.prebuilt import create_react_agent
 
 from azure.identity import DefaultAzureCredential, get_bearer_token_provider
 
+import tracing
+from agent_tracing import LLMSpanHandler, trace_tools, traced_http_client
+
+# Export spans when TRACE_DIR is set
+tracing.configure("demo_cn")
+
 # Get Azure token
 default_credential = DefaultAzureCredential()
 access_token = default_credential.get_token("https://cognitiveservices.azure.com/.default")
@@ -23,6 +29,8 @@ os.environ['OPENAI_API_KEY'] = access_token.token
 os.environ['AZURE_OPENAI_ENDPOINT'] = 'https://api.uhg.com/api/cloud/api-management/ai-gateway/1.0'
 # Define the MCP server URL
 MCP_SERVER_URL = "http://127.0.0.1:8001/mcp"
+# Patient API, used directly for type-ahead
+API_BASE_URL = os.environ.get("API_BASE_URL", "http://127.0.0.1:5000/api")
 
 # Initialize model with Azure-specific parameters
 model = AzureChatOpenAI(
@@ -151,16 +159,18 @@ def get_community_services(resource_type, zipcode):
 # Helper function to send query to the MCP server
 async def query_mcp(query):
     """Main function to process queries using the MCP client."""
-    client = MultiServerMCPClient({
-        "mcpstore": {
-            "url": "http://127.0.0.1:8001/mcp",  # Replace with the remote server's URL
-            "transport": "streamable_http"
-        }
-    })
-    tools = await client.get_tools()
-    agent = create_react_agent(model, tools)
-    response = await agent.ainvoke({"messages": query})
-    return response
+    with tracing.span("agent query", query=query):
+        client = MultiServerMCPClient({
+            "mcpstore": {
+                "url": "http://127.0.0.1:8001/mcp",  # Replace with the remote server's URL
+                "transport": "streamable_http",
+                "httpx_client_factory": traced_http_client
+            }
+        })
+        tools = trace_tools(await client.get_tools())
+        agent = create_react_agent(model, tools)
+        response = await agent.ainvoke({"messages": query}, config={"callbacks": [LLMSpanHandler()]})
+        return response
 
 def get_ai_message(response):
     """Parse AI message and convert to structured data"""
@@ -292,17 +302,110 @@ def get_ai_message(response):
         structured_data['sdoh_resources'] = sdoh_resources
     
     return structured_data
+# Type-ahead patient lookup straight from the API (no LLM round trip)
+def autocomplete_patients(query, limit=10):
+    try:
+        response = requests.get(f"{API_BASE_URL}/patients/autocomplete",
+                                params={"q": query, "limit": limit}, timeout=2)
+        response.raise_for_status()
+        return response.json().get("matches", [])
+    except requests.exceptions.RequestException:
+        return []
+
+# Population analytics view straight from the API (materialized, so instant)
+def fetch_analytics(view):
+    try:
+        response = requests.get(f"{API_BASE_URL}/analytics/{view}", timeout=5)
+        response.raise_for_status()
+        return response.json().get("data", {})
+    except requests.exceptions.RequestException:
+        return None
+
+# HRA worklist pages straight from the API
+def fetch_hra_worklist(status, min_risk, due_before, cursor, limit=50):
+    params = {"status": status, "min_risk": min_risk, "limit": limit}
+    if due_before:
+        params["due_before"] = due_before
+    if cursor:
+        params["cursor"] = cursor
+    try:
+        response = requests.get(f"{API_BASE_URL}/hra_status/worklist", params=params, timeout=5)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        return {"error": f"API request error: {str(e)}"}
+
+# HRA worklist: work through the reminder and scheduling queues a page at a time
+def render_hra_worklist():
+    st.markdown('<h2 class="section-header">HRA Worklist</h2>', unsafe_allow_html=True)
+    queues = {"Send HRA Reminder": "Pending", "Schedule HRA": "Not Started,Expired"}
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        action = st.radio("Queue", list(queues))
+    with col2:
+        min_risk = st.slider("Minimum Risk Level", 0, 5, 0)
+    with col3:
+        overdue_only = st.checkbox("Overdue only")
+    due_before = datetime.now().strftime("%Y-%m-%d") if overdue_only else ""
+    
+    # Start again from the top whenever the queue or its filters change
+    queue_key = (action, min_risk, overdue_only)
+    if st.session_state.get("hra_queue") != queue_key:
+        st.session_state.hra_queue = queue_key
+        st.session_state.hra_cursor = None
+    
+    if st.session_state.get("hra_done"):
+        st.success(st.session_state.pop("hra_done"))
+    
+    page = fetch_hra_worklist(queues[action], min_risk, due_before, st.session_state.hra_cursor)
+    if "error" in page:
+        st.error(page["error"])
+        return
+    st.write(f"**{page['total']}** patients in this queue")
+    if not page["patients"]:
+        st.info("Nothing left in this queue")
+        return
+    st.dataframe(pd.DataFrame(page["patients"])[
+        ["last_name", "first_name", "date_of_birth", "status", "risk_level", "next_assessment_due", "days_until_due"]])
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button(f"{action} for these {len(page['patients'])} patients"):
+            # Like the per-patient buttons, this simulates the outreach; then move on to the next page
+            st.session_state.hra_cursor = page["next_cursor"]
+            st.session_state.hra_done = f"{action}: done for {len(page['patients'])} patients"
+            if page["next_cursor"] is None:
+                st.session_state.hra_queue = None
+            st.rerun()
+    with col2:
+        if page["next_cursor"] and st.button("Skip to next page"):
+            st.session_state.hra_cursor = page["next_cursor"]
+            st.rerun()
+
 # Display header
 st.markdown('<h1 class="main-header">Care Navigator Dashboard</h1>', unsafe_allow_html=True)
 
 # Create sidebar for patient search
 st.sidebar.markdown('<h2 class="section-header">Patient Search</h2>', unsafe_allow_html=True)
 
+# Quick find: pick a patient from name prefixes to fill in the form below
+selected_patient = None
+quick_find = st.sidebar.text_input("Quick Find", placeholder="e.g. smith pat 1979")
+if quick_find.strip():
+    matches = autocomplete_patients(quick_find)
+    if matches:
+        labels = [f"{m['last_name']}, {m['first_name']} ({m['date_of_birth']})" for m in matches]
+        selected_patient = matches[st.sidebar.selectbox("Matches", range(len(matches)), format_func=labels.__getitem__)]
+    else:
+        st.sidebar.caption("No matching patients")
+
 # Patient search form
 with st.sidebar.form("patient_search_form"):
-    first_name = st.text_input("First Name")
-    last_name = st.text_input("Last Name")
-    dob = st.date_input("Date of Birth", min_value=datetime(1900, 1, 1))
+    first_name = st.text_input("First Name", value=selected_patient["first_name"] if selected_patient else "")
+    last_name = st.text_input("Last Name", value=selected_patient["last_name"] if selected_patient else "")
+    dob = st.date_input("Date of Birth", min_value=datetime(1900, 1, 1),
+                        value=datetime.strptime(selected_patient["date_of_birth"], "%Y-%m-%d")
+                        if selected_patient else datetime.now())
     
     # Format the date as YYYY-MM-DD
     dob_str = dob.strftime("%Y-%m-%d")
@@ -329,12 +432,17 @@ if search_submitted and first_name and last_name and dob_str:
 
 # Sidebar navigation
 st.sidebar.markdown('<h2 class="section-header">Navigation</h2>', unsafe_allow_html=True)
-tab_options = ["Dashboard", "Demographics", "Medical", "Engagement", "HRA Status", "SDOH Resources", "Free-text Query"]
+tab_options = ["Dashboard", "Demographics", "Medical", "Engagement", "HRA Status", "SDOH Resources", "Free-text Query",
+               "HRA Worklist"]
 active_tab = st.sidebar.radio("Select Section", tab_options)
 st.session_state.active_tab = active_tab
 
+# The worklist spans all patients; the other sections need a patient
+if st.session_state.active_tab == "HRA Worklist":
+    render_hra_worklist()
+
 # Check if patient data is available
-if st.session_state.patient_data:
+elif st.session_state.patient_data:
     # Display patient banner
     col1, col2 = st.columns([3, 1])
     with col1:
@@ -828,6 +936,17 @@ else:
     **Get started by searching for a patient.**
     """)
 
+    # Population summary tiles
+    population = fetch_analytics("summary")
+    if population:
+        st.markdown("## Population Overview")
+        tiles = st.columns(5)
+        tiles[0].metric("Patients", f"{population['patients']:,}")
+        tiles[1].metric("High Risk (4-5)", f"{population['high_risk_patients']:,}")
+        tiles[2].metric("HRA Overdue", f"{population['hra_overdue']:,}")
+        tiles[3].metric("Open SDOH Referrals", f"{population['open_sdoh_referrals']:,}")
+        tiles[4].metric("Patients with Open Referrals", f"{population['patients_with_open_referrals']:,}")
+
     # Display a sample patient card
     st.markdown("""
     ## Sample Patient
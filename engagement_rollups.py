@@ -0,0 +1,110 @@
+"""
+Windowed engagement metrics (last 30, 90 or 365 days up to today).
+
+The engagement table has one row per patient: program enrollment (start_date,
+end_date) and last_visit. For each window and every patient, the rollups hold
+- enrolled_days: days of the window the patient was enrolled in the program
+- enrollment_coverage: enrolled_days as a fraction of the window
+- visited_in_period: whether the last visit falls in the window
+- engagement_status: Active (enrolled and visited), Enrolled (no visit),
+  Visited (not enrolled) or Inactive
+
+plus days_since_last_visit, and a population summary per window. They are
+computed for the whole table in one vectorized pass per window and reused until
+the file changes or the date rolls over, so a patient lookup is an index read
+and a population summary is free.
+"""
+import numpy as np
+
+from compact import as_datetime64
+
+# Supported time_period values -> window length in days
+WINDOWS = {"30days": 30, "90days": 90, "365days": 365}
+
+
+def parse_time_period(value):
+    """Canonical window name for "30days", "30d", "30 days" or "30", or None if unsupported"""
+    text = str(value).strip().lower().replace(" ", "")
+    for suffix in ("days", "day", "d"):
+        if text.endswith(suffix):
+            text = text[:-len(suffix)]
+            break
+    name = f"{text}days"
+    return name if name in WINDOWS else None
+
+
+class EngagementRollups:
+    def __init__(self, engagement_df, today):
+        self.today = today
+        as_of = np.datetime64(today, "D")
+        start = as_datetime64(engagement_df["start_date"])
+        # An enrollment without an end date is still running
+        end = as_datetime64(engagement_df["end_date"])
+        end = np.where(np.isnat(end), as_of, end)
+        last_visit = as_datetime64(engagement_df["last_visit"])
+
+        has_visit = ~np.isnat(last_visit)
+        self.days_since_last_visit = np.where(has_visit, (as_of - last_visit).astype("int64"), 0)
+        self.has_visit = has_visit
+
+        self.windows = {}
+        self.summaries = {}
+        for name, days in WINDOWS.items():
+            window_start = as_of - np.timedelta64(days - 1, "D")
+            overlap = (np.minimum(end, as_of) - np.maximum(start, window_start)).astype("int64") + 1
+            enrolled_days = np.where(np.isnat(start), 0, np.clip(overlap, 0, days))
+            visited = has_visit & (last_visit >= window_start) & (last_visit <= as_of)
+            enrolled = enrolled_days > 0
+            status = np.select([enrolled & visited, enrolled, visited], ["Active", "Enrolled", "Visited"], "Inactive")
+            self.windows[name] = {
+                "enrolled_days": enrolled_days,
+                "enrollment_coverage": enrolled_days / days,
+                "visited_in_period": visited,
+                "engagement_status": status,
+            }
+            statuses, counts = np.unique(status, return_counts=True)
+            self.summaries[name] = {
+                "time_period": name,
+                "window_days": days,
+                "as_of": str(as_of),
+                "patients": int(len(status)),
+                "enrolled_patients": int(enrolled.sum()),
+                "visited_patients": int(visited.sum()),
+                "mean_enrollment_coverage": round(float(enrolled_days.mean() / days), 4) if len(status) else None,
+                "engagement_status_counts": {str(s): int(n) for s, n in zip(statuses, counts)},
+            }
+
+    def metrics(self, positions, time_period):
+        """Columns of window metrics for the given row positions"""
+        window = self.windows[time_period]
+        days_since = self.days_since_last_visit[positions]
+        has_visit = self.has_visit[positions]
+        return {
+            "time_period": time_period,
+            "enrolled_days": window["enrolled_days"][positions].tolist(),
+            "enrollment_coverage": np.round(window["enrollment_coverage"][positions], 4).tolist(),
+            "visited_in_period": window["visited_in_period"][positions].tolist(),
+            "engagement_status": window["engagement_status"][positions].tolist(),
+            "days_since_last_visit": [int(d) if seen else None for d, seen in zip(days_since, has_visit)],
+        }
+
+    def summary(self, time_period):
+        return self.summaries[time_period]
+
+
+def merge_summaries(summaries):
+    """One window's summary from its summaries over disjoint sets of patients (e.g. shards)"""
+    merged = dict(summaries[0])
+    for key in ("patients", "enrolled_patients", "visited_patients"):
+        merged[key] = sum(summary[key] for summary in summaries)
+    # Each part's mean is rounded, so the combined mean is exact only to that rounding
+    covered = [(summary["mean_enrollment_coverage"], summary["patients"]) for summary in summaries
+               if summary["mean_enrollment_coverage"] is not None]
+    merged["mean_enrollment_coverage"] = (round(sum(mean * n for mean, n in covered) / merged["patients"], 4)
+                                          if merged["patients"] else None)
+    counts = {}
+    for summary in summaries:
+        for status, n in summary["engagement_status_counts"].items():
+            counts[status] = counts.get(status, 0) + n
+    merged["engagement_status_counts"] = dict(sorted(counts.items()))
+    return merged
@@ -0,0 +1,115 @@
+"""
+HRA worklist: patients ordered by next assessment due date (earliest, i.e. most
+overdue, first), then by risk level (highest first), then patient_id.
+
+The HRA table is sorted once per file version. Every (status, risk_level)
+partition keeps the sorted ranks of its rows, so a page is a binary search per
+selected partition plus a merge of at most `limit` rows from each. Nothing is
+re-sorted or scanned per request, however long the queue.
+
+Pages are keyset-paginated: the cursor names the last row returned ("due|risk|
+patient_id"), so paging continues in the right place even if the table is
+reloaded between pages.
+"""
+import numpy as np
+import pandas as pd
+
+from compact import as_datetime64, day_number
+
+# Sorts after every real date: rows without a due date come last
+_NO_DUE_DATE = np.datetime64("9999-12-31", "D")
+
+
+class CursorError(ValueError):
+    """A malformed worklist cursor"""
+
+
+class HraWorklist:
+    def __init__(self, hra_df):
+        self.df = hra_df
+        due = as_datetime64(hra_df["next_assessment_due"])
+        due = np.where(np.isnat(due), _NO_DUE_DATE, due)
+        risk = pd.to_numeric(hra_df["risk_level"], errors="coerce").fillna(0).astype(np.int64).to_numpy()
+        patient_ids = hra_df["patient_id"].astype(str).to_numpy(dtype=object)
+        self.order = np.lexsort((patient_ids, -risk, due))
+        self.due = due[self.order]
+        self.neg_risk = -risk[self.order]
+        self.patient_ids = patient_ids[self.order]
+        # (status, risk_level) -> ascending ranks (positions in self.order) of its rows
+        statuses = hra_df["status"].astype(object).fillna("").astype(str).to_numpy(dtype=object)[self.order]
+        keys = pd.DataFrame({"status": statuses, "risk": -self.neg_risk})
+        self.partitions = {key: np.asarray(ranks) for key, ranks in keys.groupby(["status", "risk"]).indices.items()}
+
+    def _rank_after(self, cursor):
+        """Number of rows sorting at or before the cursor's (due, risk, patient_id)"""
+        try:
+            due_text, risk_text, patient_id = cursor.split("|", 2)
+            due = np.datetime64(due_text, "D") if due_text else _NO_DUE_DATE
+            neg_risk = -int(risk_text)
+        except ValueError:
+            raise CursorError("Invalid cursor")
+        # Narrow to equal due dates, then equal risk, then position by patient_id
+        lo = np.searchsorted(self.due, due, side="left")
+        hi = np.searchsorted(self.due, due, side="right")
+        risks = self.neg_risk[lo:hi]
+        lo, hi = lo + np.searchsorted(risks, neg_risk, side="left"), lo + np.searchsorted(risks, neg_risk, side="right")
+        return lo + np.searchsorted(self.patient_ids[lo:hi], patient_id, side="right")
+
+    def _cursor(self, rank):
+        due = self.due[rank]
+        due_text = "" if due == _NO_DUE_DATE else str(due)
+        return f"{due_text}|{-self.neg_risk[rank]}|{self.patient_ids[rank]}"
+
+    def page(self, statuses=None, min_risk=0, due_before=None, limit=20, cursor=None):
+        """
+        One page of the worklist.
+
+        statuses: HRA statuses to include (None for all); min_risk: lowest risk
+        level included; due_before: only rows due strictly before this YYYY-MM-DD.
+        Returns (rows of the cached table in worklist order, total matching rows,
+        cursor for the next page or None at the end).
+        """
+        start = self._rank_after(cursor) if cursor else 0
+        end = len(self.order)
+        if due_before:
+            end = np.searchsorted(self.due, np.datetime64(due_before, "D"), side="left")
+        selected = [ranks for (status, risk), ranks in self.partitions.items()
+                    if (statuses is None or status in statuses) and risk >= min_risk]
+        total = 0
+        candidates = []
+        for ranks in selected:
+            total += int(np.searchsorted(ranks, end, side="left"))
+            lo = np.searchsorted(ranks, start, side="left")
+            hi = np.searchsorted(ranks, end, side="left")
+            candidates.append(ranks[lo:min(hi, lo + limit + 1)])
+        ranks = np.sort(np.concatenate(candidates)) if candidates else np.array([], dtype=np.int64)
+        next_cursor = self._cursor(ranks[limit - 1]) if len(ranks) > limit else None
+        ranks = ranks[:limit]
+        return self.df.iloc[self.order[ranks]], total, next_cursor
+
+
+def _row_key(row):
+    """Worklist sort key of an API row: (due date text, negated risk level, patient_id)"""
+    due = row.get("next_assessment_due")
+    due = due if isinstance(due, str) and day_number(due) is not None else str(_NO_DUE_DATE)
+    try:
+        risk = int(float(row.get("risk_level")))
+    except (TypeError, ValueError):
+        risk = 0
+    return due, -risk, str(row["patient_id"])
+
+
+def merge_pages(pages, limit):
+    """
+    One worklist page from the same page request over disjoint sets of patients
+    (e.g. shards). pages: (rows as the API returns them, total, next_cursor) each.
+    Keyset cursors name a position, not an offset, so one cursor pages every part.
+    """
+    rows = sorted((row for part_rows, _, _ in pages for row in part_rows), key=_row_key)
+    more = len(rows) > limit or any(next_cursor for _, _, next_cursor in pages)
+    rows = rows[:limit]
+    next_cursor = None
+    if more and rows:
+        due, neg_risk, patient_id = _row_key(rows[-1])
+        next_cursor = f"{'' if due == str(_NO_DUE_DATE) else due}|{-neg_risk}|{patient_id}"
+    return rows, sum(total for _, total, _ in pages), next_cursor
@@ -0,0 +1,346 @@
+"""
+Fuzzy patient search over demographics: tolerant of misspelled names and of a
+mistyped date of birth, ranked in one call.
+
+Candidates come from blocking indexes, never from a scan of all patients:
+- date of birth -> patients (plus the day/month-swapped date)
+- last name and first name -> patients, where the names to look up are found by
+  Soundex code and by trigram overlap in an index of the *distinct* names (far
+  fewer than patients)
+
+Only the candidates are scored: trigram similarity of each name (a Soundex match
+counts as a near-miss) and agreement of the date of birth.
+
+PrefixIndex serves type-ahead: name prefixes resolve by binary search over the
+patients sorted by name.
+"""
+import functools
+import itertools
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from compact import as_datetime64, day_number, decode, is_day_column
+
+# Distinct names considered per name field, best trigram overlap first
+MAX_NAME_CANDIDATES = 50
+
+# Candidate patients scored per query
+MAX_ROW_CANDIDATES = 2000
+
+# Weights of the scored fields
+WEIGHTS = {"last": 0.4, "first": 0.3, "dob": 0.3}
+
+# Below this score a candidate is not returned
+MIN_SCORE = 0.5
+
+_SOUNDEX_CODES = {c: str(d) for d, letters in enumerate(["aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"])
+                  for c in letters}
+
+
+@functools.lru_cache(maxsize=200_000)
+def soundex(name):
+    """American Soundex code ("Robert" -> "R163"), "" for a name without letters"""
+    letters = [c for c in name.lower() if c.isalpha() and c in _SOUNDEX_CODES]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES[letters[0]]
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES[c]
+        if digit != "0" and digit != previous:
+            code += digit
+        # h and w do not separate letters with the same code; vowels do
+        if c not in "hw":
+            previous = digit
+        if len(code) == 4:
+            break
+    return code.ljust(4, "0")
+
+
+@functools.lru_cache(maxsize=200_000)
+def trigrams(name):
+    padded = f"  {name.lower()} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def name_similarity(a, b):
+    """1.0 for the same name, trigram Dice coefficient otherwise (at least 0.8 if they sound alike)"""
+    a, b = a.lower(), b.lower()
+    if a == b:
+        return 1.0
+    ta, tb = trigrams(a), trigrams(b)
+    dice = 2 * len(ta & tb) / (len(ta) + len(tb)) if ta and tb else 0.0
+    if soundex(a) and soundex(a) == soundex(b):
+        dice = max(dice, 0.8)
+    return dice
+
+
+def dob_similarity(query, dob):
+    """1.0 for the same date, partial credit for a swapped day/month or a one-character typo"""
+    if query == dob:
+        return 1.0
+    if len(query) != 10 or len(dob) != 10:
+        return 0.0
+    if _swap_day_month(query) == dob:
+        return 0.8
+    differences = [i for i in range(10) if query[i] != dob[i]]
+    if len(differences) == 1:
+        return 0.6
+    # Two neighbouring digits typed the wrong way round
+    if (len(differences) == 2 and differences[1] == differences[0] + 1
+            and query[differences[0]] == dob[differences[1]] and query[differences[1]] == dob[differences[0]]):
+        return 0.6
+    return 0.0
+
+
+def _swap_day_month(dob):
+    """YYYY-MM-DD -> YYYY-DD-MM, when the day could be a month"""
+    if len(dob) == 10 and dob[8:10] <= "12":
+        return f"{dob[:4]}-{dob[8:10]}-{dob[5:7]}"
+    return None
+
+
+class NameIndex:
+    """Distinct values of one name column -> row positions, findable by Soundex and trigrams"""
+
+    def __init__(self, names):
+        lowered = names.str.lower()
+        self.rows = lowered.groupby(lowered, sort=False).indices
+        self.by_soundex = defaultdict(list)
+        self.by_trigram = defaultdict(list)
+        for name in self.rows:
+            self.by_soundex[soundex(name)].append(name)
+            for gram in trigrams(name):
+                self.by_trigram[gram].append(name)
+
+    def similar(self, query, limit=MAX_NAME_CANDIDATES):
+        """Distinct names that sound like or share trigrams with query, best overlap first"""
+        query = query.lower()
+        overlap = Counter()
+        for gram in trigrams(query):
+            overlap.update(self.by_trigram.get(gram, ()))
+        names = [name for name, _ in overlap.most_common(limit)]
+        names.extend(self.by_soundex.get(soundex(query), ())[:limit])
+        if query in self.rows:
+            names.append(query)
+        return list(dict.fromkeys(names))
+
+    def positions(self, names):
+        arrays = [self.rows[name] for name in names if name in self.rows]
+        return np.concatenate(arrays) if arrays else np.array([], dtype=np.int64)
+
+
+class PatientSearchIndex:
+    """Blocking indexes over a demographics DataFrame"""
+
+    def __init__(self, demographics_df):
+        self.df = demographics_df
+        self.first_names = NameIndex(demographics_df["first_name"].astype(str))
+        self.last_names = NameIndex(demographics_df["last_name"].astype(str))
+        self.by_dob = demographics_df.groupby("date_of_birth", sort=False).indices
+        self._dob_key = day_number if is_day_column(demographics_df["date_of_birth"]) else str
+
+    def _candidates(self, first_name, last_name, dob):
+        """
+        Row positions to score, most promising blocks first. Past MAX_ROW_CANDIDATES,
+        the rows matching the names and the date of birth are kept before those
+        matching the date alone and then the names alone, so a common name cannot
+        crowd out the patient with the exact date of birth.
+        """
+        blocks = []
+        last_rows = self.last_names.positions(self.last_names.similar(last_name)) if last_name else None
+        first_rows = self.first_names.positions(self.first_names.similar(first_name)) if first_name else None
+        name_rows = None
+        if last_rows is not None and first_rows is not None:
+            name_rows = np.intersect1d(last_rows, first_rows)
+            blocks.append(name_rows)
+        dob_blocks = []
+        if dob:
+            for date in (dob, _swap_day_month(dob)):
+                key = self._dob_key(date) if date else None
+                if key in self.by_dob:
+                    dob_blocks.append(self.by_dob[key])
+            blocks.extend(dob_blocks)
+        if not dob or last_rows is None or first_rows is None:
+            # Without a date of birth to block on, one name alone has to find the patient
+            blocks.extend(rows for rows in (last_rows, first_rows) if rows is not None)
+        if not blocks:
+            return np.array([], dtype=np.int64)
+        candidates = pd.unique(np.concatenate(blocks))
+        if len(candidates) > MAX_ROW_CANDIDATES and dob_blocks:
+            dob_rows = np.concatenate(dob_blocks)
+            preferred = [np.intersect1d(name_rows, dob_rows)] if name_rows is not None else []
+            kept = pd.unique(np.concatenate([*preferred, dob_rows, candidates]))[:MAX_ROW_CANDIDATES]
+            # In the usual block order, which decides the order of equal scores
+            return candidates[np.isin(candidates, kept)]
+        return candidates[:MAX_ROW_CANDIDATES]
+
+    def search(self, first_name="", last_name="", dob="", limit=10):
+        """Best matching patients as dicts with patient_id, names, date_of_birth and score (0-1)"""
+        first_name, last_name, dob = (first_name or "").strip(), (last_name or "").strip(), (dob or "").strip()
+        positions = self._candidates(first_name, last_name, dob)
+        if not len(positions):
+            return []
+        rows = decode(self.df.iloc[positions])
+        weights = {field: weight for field, weight in WEIGHTS.items()
+                   if {"first": first_name, "last": last_name, "dob": dob}[field]}
+        total_weight = sum(weights.values())
+        # Each distinct value is scored once
+        scores = np.zeros(len(rows))
+        for field, column, query, similarity in (("first", "first_name", first_name, name_similarity),
+                                                 ("last", "last_name", last_name, name_similarity),
+                                                 ("dob", "date_of_birth", dob, dob_similarity)):
+            if field not in weights:
+                continue
+            values = rows[column].astype(str)
+            unique = pd.unique(values)
+            score_of = {value: similarity(query, value) for value in unique}
+            scores += weights[field] * values.map(score_of).to_numpy()
+        scores /= total_weight
+        order = np.argsort(-scores, kind="stable")
+        results = []
+        for i in order[:limit]:
+            if scores[i] < MIN_SCORE:
+                break
+            row = rows.iloc[i]
+            results.append({
+                "patient_id": row["patient_id"],
+                "first_name": row["first_name"],
+                "last_name": row["last_name"],
+                "date_of_birth": row["date_of_birth"],
+                "score": round(float(scores[i]), 3),
+            })
+        return results
+
+
+def normalize_name(names):
+    """Lower-cased, trimmed names for prefix matching"""
+    return names.astype(str).str.strip().str.lower()
+
+
+def dob_range(part):
+    """[start, end) datetime64 days for "YYYY", "YYYY-MM" or "YYYY-MM-DD", or None"""
+    unit = {4: "Y", 7: "M", 10: "D"}.get(len(part))
+    if unit is None:
+        return None
+    try:
+        start = np.datetime64(part, unit)
+    except ValueError:
+        return None
+    return start.astype("datetime64[D]"), (start + 1).astype("datetime64[D]")
+
+
+class PrefixIndex:
+    """
+    Type-ahead over patient names: the rows sorted by (last, first) and by
+    (first, last), so the patients whose name starts with a prefix are one
+    contiguous range found by binary search, and within one name the other name
+    narrows it down the same way.
+    """
+
+    def __init__(self, demographics_df):
+        self.df = demographics_df
+        first = normalize_name(demographics_df["first_name"]).to_numpy(dtype=object)
+        last = normalize_name(demographics_df["last_name"]).to_numpy(dtype=object)
+        self.dobs = as_datetime64(demographics_df["date_of_birth"])
+        # primary -> (sorted primary names, secondary names in the same order, row positions,
+        #             start of each run of equal primary names)
+        self._orders = {}
+        # Sorting the (few) distinct names once and then integer codes is far faster than sorting strings
+        last_codes, first_codes = pd.factorize(last, sort=True)[0], pd.factorize(first, sort=True)[0]
+        for primary, names, codes, others, other_codes in (("last", last, last_codes, first, first_codes),
+                                                           ("first", first, first_codes, last, last_codes)):
+            order = np.lexsort((other_codes, codes))
+            sorted_codes = codes[order]
+            runs = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+            self._orders[primary] = (names[order], others[order], order, runs)
+
+    def _ranges(self, primary, prefix, other_prefix):
+        """Ranges of sorted positions whose primary name starts with prefix (and other name with other_prefix)"""
+        names, others, _, runs = self._orders[primary]
+        lo = np.searchsorted(names, prefix, side="left")
+        hi = np.searchsorted(names, prefix + "\U0010ffff", side="left")
+        if not other_prefix:
+            yield lo, hi
+            return
+        # One binary search per distinct primary name in the range
+        first_run = np.searchsorted(runs, lo, side="left")
+        for start in runs[first_run:]:
+            if start >= hi:
+                break
+            end = runs[np.searchsorted(runs, start, side="right")] if start < runs[-1] else len(names)
+            group = others[start:end]
+            yield (start + np.searchsorted(group, other_prefix, side="left"),
+                   start + np.searchsorted(group, other_prefix + "\U0010ffff", side="left"))
+
+    def _matches(self, primary, prefix, other_prefix, dob_ranges, limit):
+        """Row positions matching, in name order"""
+        order = self._orders[primary][2]
+        found = []
+        for lo, hi in self._ranges(primary, prefix, other_prefix):
+            # In chunks, stopping as soon as enough rows pass the date of birth filter
+            for start in range(lo, hi, 4096):
+                positions = order[start:min(start + 4096, hi)]
+                for dob_start, dob_end in dob_ranges:
+                    dobs = self.dobs[positions]
+                    positions = positions[(dobs >= dob_start) & (dobs < dob_end)]
+                found.extend(positions[:limit - len(found)])
+                if len(found) >= limit:
+                    return found
+        return found
+
+    def complete(self, query, limit=10):
+        """
+        Patients matching a partial name: "smi", "smith pat", "smith, p" (last name
+        first) or "pat smi" (first name first). A year, year-month or full date
+        narrows by date of birth ("smith 1979", "pat smi 1979-10"). Matches on the
+        last name and on the first name alternate, each sorted by name.
+        """
+        words = query.replace(",", " ").lower().split()
+        dob_parts = [word for word in words if any(c.isdigit() for c in word)]
+        names = [word for word in words if word not in dob_parts]
+        dob_ranges = [dob_range(part) for part in dob_parts]
+        if not names or None in dob_ranges:
+            return []
+        first_word, other_word = names[0], (names[1] if len(names) > 1 else "")
+        by_last = self._matches("last", first_word, other_word, dob_ranges, limit)
+        by_first = self._matches("first", first_word, other_word, dob_ranges, limit)
+        interleaved = [p for pair in itertools.zip_longest(by_last, by_first) for p in pair if p is not None]
+        positions = list(dict.fromkeys(interleaved))[:limit]
+        rows = decode(self.df.iloc[positions])
+        return [
+            {"patient_id": row["patient_id"], "first_name": row["first_name"], "last_name": row["last_name"],
+             "date_of_birth": row["date_of_birth"]}
+            for row in rows.to_dict(orient="records")
+        ]
+
+
+def merge_completions(query, parts, limit=10):
+    """
+    PrefixIndex.complete() results for one query over disjoint sets of patients
+    (e.g. shards) combined in complete()'s order. Each part needs up to 2 * limit
+    matches to be sure to hold its first `limit` on each name. Patients with the
+    same name come in part order rather than table order, so which of them make
+    the cut can differ.
+    """
+    words = query.replace(",", " ").lower().split()
+    names = [word for word in words if not any(c.isdigit() for c in word)]
+    if not names:
+        return []
+    first_word, other_word = names[0], (names[1] if len(names) > 1 else "")
+    matches = [match for part in parts for match in part]
+    normalized = lambda value: str(value).strip().lower()
+
+    def by(primary, other):
+        found = [match for match in matches if normalized(match[primary]).startswith(first_word)
+                 and normalized(match[other]).startswith(other_word)]
+        return sorted(found, key=lambda match: (normalized(match[primary]), normalized(match[other])))[:limit]
+
+    unique = {}
+    for pair in itertools.zip_longest(by("last_name", "first_name"), by("first_name", "last_name")):
+        for match in pair:
+            if match is not None:
+                unique.setdefault(match["patient_id"], match)
+    return list(unique.values())[:limit]
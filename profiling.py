@@ -0,0 +1,209 @@
+"""
+Opt-in request instrumentation for the Flask API.
+
+Enable with API_PROFILING=1 (or init_app(app, enabled=True)). When enabled:
+- handlers mark work with `with phase("load"):` etc.; each request gets a
+  Server-Timing header with the exclusive time spent in every phase plus "total"
+- per-endpoint, per-phase latency histograms are served at /metrics in the
+  Prometheus text format
+- a request sent with the header "X-Profile: 1" (or the value of API_PROFILE_TOKEN
+  when that is set) is sampled by a background thread; the response carries an
+  X-Profile-Id header and the folded stacks are served at /profiles/<id>, ready
+  for flamegraph.pl or speedscope
+
+When disabled, phase() is a cheap no-op and no routes or hooks are registered.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import Response, current_app, g, has_request_context, request
+
+import tracing
+from metrics import MetricsRegistry
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Seconds between stack samples of a profiled request
+SAMPLE_INTERVAL = 0.001
+
+# Profiles kept in memory for /profiles/<id>
+MAX_PROFILES = 32
+
+registry = MetricsRegistry()
+REQUEST_SECONDS = registry.histogram(
+    "api_request_duration_seconds", "Wall time of API requests", ["endpoint", "method", "status"])
+PHASE_SECONDS = registry.histogram(
+    "api_request_phase_seconds", "Exclusive time per request phase", ["endpoint", "phase"])
+RESPONSE_BYTES = registry.histogram(
+    "api_response_size_bytes", "Response body size", ["endpoint"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864))
+
+_profiles = collections.OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+@contextmanager
+def phase(name):
+    """
+    Attribute the enclosed work to a request phase.
+
+    Phases nest; time spent in an inner phase is not counted for the outer one, so
+    the phases of a request add up to (at most) its total time. When tracing is on,
+    each phase is also a span under the request's span.
+    """
+    with tracing.span(f"phase {name}"):
+        stack = g.get("_phase_stack") if has_request_context() else None
+        if stack is None:
+            yield
+        else:
+            with _timed(name, stack):
+                yield
+
+
+@contextmanager
+def _timed(name, stack):
+    timings = g._phase_timings
+    now = time.perf_counter()
+    if stack:
+        parent = stack[-1]
+        timings[parent[0]] = timings.get(parent[0], 0.0) + now - parent[1]
+    frame = [name, now]
+    stack.append(frame)
+    try:
+        yield
+    finally:
+        now = time.perf_counter()
+        stack.pop()
+        timings[name] = timings.get(name, 0.0) + now - frame[1]
+        if stack:
+            stack[-1][1] = now
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into folded-stack counts"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True, name="request-profiler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def folded(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+def _profile_requested():
+    value = request.headers.get(PROFILE_HEADER)
+    if not value:
+        return False
+    token = current_app.config.get("PROFILE_TOKEN")
+    return value == token if token else value == "1"
+
+
+def _store_profile(profile_id, text):
+    with _profiles_lock:
+        _profiles[profile_id] = text
+        while len(_profiles) > MAX_PROFILES:
+            _profiles.popitem(last=False)
+
+
+def _before_request():
+    g._phase_stack = []
+    g._phase_timings = {}
+    g._request_started = time.perf_counter()
+    if _profile_requested():
+        g._sampler = StackSampler(threading.get_ident())
+        g._sampler.start()
+
+
+def _after_request(response):
+    started = g.get("_request_started")
+    if started is None:
+        return response
+    total = time.perf_counter() - started
+    endpoint = request.endpoint or "unknown"
+    timings = g._phase_timings
+
+    sampler = g.pop("_sampler", None)
+    if sampler is not None:
+        sampler.stop()
+        profile_id = uuid.uuid4().hex[:12]
+        _store_profile(profile_id, sampler.folded())
+        response.headers[PROFILE_ID_HEADER] = profile_id
+
+    entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.3f}")
+    response.headers["Server-Timing"] = ", ".join(entries)
+
+    for name, seconds in timings.items():
+        PHASE_SECONDS.observe(seconds, endpoint=endpoint, phase=name)
+    PHASE_SECONDS.observe(max(total - sum(timings.values()), 0.0), endpoint=endpoint, phase="other")
+    REQUEST_SECONDS.observe(total, endpoint=endpoint, method=request.method, status=response.status_code)
+    if not response.is_streamed:
+        RESPONSE_BYTES.observe(response.calculate_content_length() or 0, endpoint=endpoint)
+    return response
+
+
+def metrics_endpoint():
+    """Prometheus text exposition of the API's request and phase histograms"""
+    return Response(registry.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+def profile_endpoint(profile_id):
+    """Folded stacks captured for one profiled request"""
+    with _profiles_lock:
+        text = _profiles.get(profile_id)
+    if text is None:
+        return Response(f"Profile {profile_id} not found\n", status=404, mimetype="text/plain")
+    return Response(text, mimetype="text/plain")
+
+
+def _instrumented_json_provider(base):
+    """JSON provider whose encoding time is attributed to the serialize phase"""
+
+    class InstrumentedJSONProvider(base):
+        def dumps(self, obj, **kwargs):
+            with phase("serialize"):
+                return super().dumps(obj, **kwargs)
+
+    return InstrumentedJSONProvider
+
+
+def init_app(app, enabled=None):
+    """Install the instrumentation on a Flask app if enabled (default: API_PROFILING env var)"""
+    if enabled is None:
+        enabled = os.environ.get("API_PROFILING", "0") == "1"
+    app.config["PROFILING"] = enabled
+    app.config.setdefault("PROFILE_TOKEN", os.environ.get("API_PROFILE_TOKEN"))
+    if not enabled:
+        return
+
+    app.json_provider_class = _instrumented_json_provider(app.json_provider_class)
+    app.json = app.json_provider_class(app)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint)
+    app.add_url_rule("/profiles/<profile_id>", "profile", profile_endpoint)
@@ -1,10 +1,290 @@
-from fastmcp import FastMCP
+"""
+Patient records as MCP resources, addressed by patient_id and backed by the API's
+indexed /api/patients/<patient_id>/<table> endpoint:
 
-mcp = FastMCP("CARE_NAVIGATOR")
+    demographics://patient/{patient_id}
+    engagement://metrics/{patient_id}
+    hra://status/{patient_id}
+    medical://conditions/{patient_id}
+    sdoh://resources/{patient_id}
 
+Reads are cached. The cache learns about changes from /api/versions (one small
+request per poll interval, whichever comes first of a read or the watcher) and
+revalidates stale entries with If-None-Match, so unchanged records cost a 304.
+For SDOH the API's change feed names the patients that changed, so only their
+entries go stale rather than the whole table.
 
-@mcp.resource("engagement://metrics/{patient_id}")
-def get_engagement_resource(patient_id: str) -> dict:
-    """Get engagement data as a resource"""
-    # Call your existing API endpoint here
-    return {"app_logins": 12, "message_count": 5, "appointment_adherence": 0.9}
\ No newline at end of file
+Clients may subscribe to any of these URIs; while anyone is subscribed, a watcher
+polls for table changes and sends notifications/resources/updated only for
+subscribed records whose content actually changed. Write tools call
+notify_changed() to push their own changes immediately.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from mcp.server.lowlevel.server import request_ctx
+
+# Table (API name) -> resource URI prefix; the patient_id follows the prefix
+RESOURCE_PREFIXES = {
+    "demographics": "demographics://patient/",
+    "engagement": "engagement://metrics/",
+    "hra_status": "hra://status/",
+    "medical_conditions": "medical://conditions/",
+    "sdoh_resources": "sdoh://resources/",
+}
+
+# Seconds between version checks (and watcher polls)
+POLL_INTERVAL = float(os.environ.get("RESOURCE_POLL_INTERVAL", 2.0))
+
+# Patient records kept in the cache
+MAX_ENTRIES = int(os.environ.get("RESOURCE_CACHE_ENTRIES", 10000))
+
+
+def resource_uri(table, patient_id):
+    return f"{RESOURCE_PREFIXES[table]}{patient_id}"
+
+
+def parse_resource_uri(uri):
+    """(table, patient_id) for one of the patient resource URIs, or None"""
+    for table, prefix in RESOURCE_PREFIXES.items():
+        if uri.startswith(prefix) and len(uri) > len(prefix):
+            return table, uri[len(prefix):]
+    return None
+
+
+class PatientRecordCache:
+    """ETag-revalidated cache of /api/patients/<patient_id>/<table> responses"""
+
+    def __init__(self, api_base_url, http, poll_interval=POLL_INTERVAL, max_entries=MAX_ENTRIES):
+        self.api_base_url = api_base_url
+        self.http = http
+        self.poll_interval = poll_interval
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._versions_checked = 0.0
+        self._sdoh_seq = None
+        self._lock = threading.Lock()
+
+    def _sdoh_changed_patients(self):
+        """Patients with SDOH changes since the last call, or None when the feed cannot tell"""
+        known_position = self._sdoh_seq is not None
+        patients = set()
+        while True:
+            params = {"since": self._sdoh_seq} if self._sdoh_seq is not None else {}
+            try:
+                response = self.http.get(f"{self.api_base_url}/sdoh_resources/changes", params=params)
+                response.raise_for_status()
+            except requests.exceptions.RequestException:
+                self._sdoh_seq = None
+                return None
+            body = response.json()
+            self._sdoh_seq = body["last_seq"]
+            if body["reset"] or not known_position:
+                return None
+            patients.update(change["patient_id"] for change in body["changes"])
+            if not body["changes"] or body["changes"][-1]["seq"] >= body["last_seq"]:
+                return patients
+
+    def check_versions(self, force=False):
+        """
+        Refresh table versions if due and mark changed entries stale.
+
+        Returns {table: patient_ids that changed, or None for "any of them"}.
+        """
+        if not force and time.monotonic() - self._versions_checked < self.poll_interval:
+            return {}
+        response = self.http.get(f"{self.api_base_url}/versions")
+        response.raise_for_status()
+        versions = response.json()["tables"]
+        changed = {table: None for table, version in versions.items() if self._versions.get(table) != version}
+        if "sdoh_resources" in changed:
+            # A file change with no feed entries was made outside the API: treat as unknown
+            changed["sdoh_resources"] = self._sdoh_changed_patients() or None
+        with self._lock:
+            self._versions_checked = time.monotonic()
+            self._versions = versions
+            for (table, patient_id), entry in self._entries.items():
+                if table in changed and (changed[table] is None or patient_id in changed[table]):
+                    entry["stale"] = True
+        return changed
+
+    def invalidate(self, table, patient_id):
+        with self._lock:
+            entry = self._entries.get((table, patient_id))
+            if entry is not None:
+                entry["stale"] = True
+
+    def _fetch(self, table, patient_id):
+        """Read or revalidate one record; returns (data, changed)"""
+        key = (table, patient_id)
+        with self._lock:
+            entry = self._entries.get(key)
+        headers = {"If-None-Match": entry["etag"]} if entry and entry["etag"] else {}
+        response = self.http.get(f"{self.api_base_url}/patients/{patient_id}/{table}", headers=headers)
+        if response.status_code == 304 and entry is not None:
+            with self._lock:
+                entry["stale"] = False
+                # Evicted while the request was out: the revalidated entry goes back in
+                self._store(key, self._entries.get(key, entry))
+            return entry["data"], False
+        if response.status_code == 404:
+            with self._lock:
+                self._entries.pop(key, None)
+            raise ValueError(response.json().get("error", f"No {table} record for patient {patient_id}"))
+        response.raise_for_status()
+        data = response.json()
+        with self._lock:
+            self._store(key, {"etag": response.headers.get("ETag"), "data": data, "stale": False})
+        return data, entry is None or entry["data"] != data
+
+    def _store(self, key, entry):
+        """Put an entry at the recent end, evicting the oldest past max_entries; hold the lock"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def read(self, table, patient_id):
+        """Rows of one table for a patient, from the cache when still current"""
+        self.check_versions()
+        with self._lock:
+            entry = self._entries.get((table, patient_id))
+            if entry is not None and not entry["stale"]:
+                self._entries.move_to_end((table, patient_id))
+                return entry["data"]
+        return self._fetch(table, patient_id)[0]
+
+    def refresh(self, table, patient_id):
+        """Revalidate a record now; True if its content changed"""
+        try:
+            return self._fetch(table, patient_id)[1]
+        except ValueError:
+            # The patient (or table) is gone: that is a change too
+            return True
+
+
+def _as_resource(table, rows):
+    """Shape a record like the matching cn_server tool result"""
+    if table == "sdoh_resources":
+        return {"resources": rows, "count": len(rows)}
+    return rows[0] if rows else {}
+
+
+class PatientResources:
+    """Registers the patient resources on a FastMCP server and drives change notifications"""
+
+    def __init__(self, api_base_url, http, poll_interval=POLL_INTERVAL):
+        self.cache = PatientRecordCache(api_base_url, http, poll_interval)
+        self.poll_interval = poll_interval
+        # uri -> set of sessions subscribed to it
+        self._subscribers = {}
+        self._watcher = None
+
+    def read(self, table, patient_id):
+        return json.dumps(_as_resource(table, self.cache.read(table, patient_id)), default=str)
+
+    def register(self, mcp):
+        def make_reader(table):
+            def read_patient_record(patient_id: str) -> str:
+                return self.read(table, patient_id)
+            read_patient_record.__name__ = f"read_{table}"
+            return read_patient_record
+
+        descriptions = {
+            "demographics": "Demographics: age, contact details, address and insurance",
+            "engagement": "Engagement: program start/end dates and last visit",
+            "hra_status": "Health Risk Assessment status, risk level and next due date",
+            "medical_conditions": "Medical conditions, allergies and medications",
+            "sdoh_resources": "Social Determinants of Health resource referrals",
+        }
+        for table, prefix in RESOURCE_PREFIXES.items():
+            mcp.resource(prefix + "{patient_id}", name=f"patient_{table}", description=descriptions[table],
+                         mime_type="application/json")(make_reader(table))
+
+        server = mcp._mcp_server
+
+        @server.subscribe_resource()
+        async def subscribe(uri):
+            await self.subscribe(str(uri), request_ctx.get().session)
+
+        @server.unsubscribe_resource()
+        async def unsubscribe(uri):
+            self.unsubscribe(str(uri), request_ctx.get().session)
+
+        # The low-level server always advertises subscribe=False; we do support it
+        get_capabilities = server.get_capabilities
+
+        def get_capabilities_with_subscribe(*args, **kwargs):
+            capabilities = get_capabilities(*args, **kwargs)
+            if capabilities.resources is not None:
+                capabilities.resources.subscribe = True
+            return capabilities
+
+        server.get_capabilities = get_capabilities_with_subscribe
+
+    # ---- Subscriptions ----
+    async def subscribe(self, uri, session):
+        parsed = parse_resource_uri(uri)
+        if parsed is None:
+            raise ValueError(f"Not a subscribable patient resource: {uri}")
+        # Cache the current content first, so only later changes are notified
+        await asyncio.to_thread(self.cache.refresh, *parsed)
+        self._subscribers.setdefault(uri, set()).add(session)
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.get_running_loop().create_task(self._watch())
+
+    def unsubscribe(self, uri, session):
+        sessions = self._subscribers.get(uri)
+        if sessions is not None:
+            sessions.discard(session)
+            if not sessions:
+                del self._subscribers[uri]
+
+    async def _notify(self, uri):
+        for session in list(self._subscribers.get(uri, ())):
+            try:
+                await session.send_resource_updated(uri)
+            except Exception:
+                # The client has gone away
+                self.unsubscribe(uri, session)
+
+    async def _refresh_and_notify(self, uris):
+        for uri in uris:
+            table, patient_id = parse_resource_uri(uri)
+            if await asyncio.to_thread(self.cache.refresh, table, patient_id):
+                await self._notify(uri)
+
+    async def _watch(self):
+        """Poll for table changes while anyone is subscribed"""
+        while self._subscribers:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                changed = await asyncio.to_thread(self.cache.check_versions, True)
+            except Exception:
+                # API unavailable; try again next interval
+                continue
+            uris = []
+            for uri in list(self._subscribers):
+                table, patient_id = parse_resource_uri(uri)
+                if table in changed and (changed[table] is None or patient_id in changed[table]):
+                    uris.append(uri)
+            await self._refresh_and_notify(uris)
+
+    def notify_changed(self, table, patient_id):
+        """Called after this server changed a record: drop it from the cache and tell subscribers now"""
+        self.cache.invalidate(table, patient_id)
+        uri = resource_uri(table, patient_id)
+        if uri not in self._subscribers:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Not on the server's event loop; the watcher will pick the change up
+            return
+        loop.create_task(self._refresh_and_notify([uri]))
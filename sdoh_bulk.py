@@ -0,0 +1,122 @@
+"""
+Bulk mutations of the SDOH resources table: delete by patient list, status
+transitions by filter and provider reassignment.
+
+A request is a list of operations applied in order to one copy of the table.
+Each operation is a vectorized mask plus a column assignment (or a row drop), so
+a batch costs one pass per operation, and the caller writes the result once:
+
+    {"op": "delete", "patient_ids": ["PT...", ...]}
+    {"op": "set_status", "where": {...}, "status": "Expired"}
+    {"op": "reassign_provider", "where": {...}, "provider": "New Provider"}
+
+"where" filters (all given criteria must match):
+- patient_ids / resource_ids: lists of ids
+- resource_type / provider / status: a value or a list of values
+- referred_before: YYYY-MM-DD, referral_date strictly earlier
+- older_than_days: referral_date more than this many days before today
+"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+OPERATIONS = ("delete", "set_status", "reassign_provider")
+
+FILTER_KEYS = ("patient_ids", "resource_ids", "resource_type", "provider", "status",
+               "referred_before", "older_than_days")
+
+
+class BulkOperationError(ValueError):
+    """An operation is malformed; nothing is applied"""
+
+
+def _as_list(value, key):
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    if isinstance(value, str):
+        return [value]
+    raise BulkOperationError(f"'{key}' must be a string or a list of strings")
+
+
+def _parse_date(value, key):
+    date = pd.to_datetime(value, format="%Y-%m-%d", errors="coerce")
+    if pd.isna(date):
+        raise BulkOperationError(f"'{key}' must be a date in YYYY-MM-DD format")
+    return date
+
+
+def filter_mask(df, where, today, referral_dates):
+    """Boolean array of rows matching a "where" filter"""
+    if not isinstance(where, dict) or not where:
+        raise BulkOperationError("'where' must name at least one filter")
+    unknown = sorted(set(where) - set(FILTER_KEYS))
+    if unknown:
+        raise BulkOperationError(f"Unknown filter(s): {', '.join(unknown)}")
+    mask = np.ones(len(df), dtype=bool)
+    for key, column in (("patient_ids", "patient_id"), ("resource_ids", "resource_id"),
+                        ("resource_type", "resource_type"), ("provider", "provider"), ("status", "status")):
+        if key in where:
+            mask &= df[column].isin(_as_list(where[key], key)).to_numpy()
+    cutoff = None
+    if "referred_before" in where:
+        cutoff = _parse_date(where["referred_before"], "referred_before")
+    if "older_than_days" in where:
+        try:
+            days = int(where["older_than_days"])
+        except (TypeError, ValueError):
+            raise BulkOperationError("'older_than_days' must be a whole number")
+        age_cutoff = pd.Timestamp(today) - timedelta(days=days)
+        cutoff = age_cutoff if cutoff is None else min(cutoff, age_cutoff)
+    if cutoff is not None:
+        # Rows without a parsable referral date never match a date filter
+        mask &= (referral_dates < cutoff).to_numpy()
+    return mask
+
+
+def _required_string(operation, key):
+    value = operation.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise BulkOperationError(f"'{operation['op']}' needs a non-empty '{key}'")
+    return value.strip()
+
+
+def apply_operations(sdoh_df, operations, today):
+    """
+    Apply operations to a copy of the table.
+
+    Returns (new DataFrame, per-operation results, changed rows, deleted rows);
+    raises BulkOperationError if any operation is invalid (sdoh_df is never modified).
+    """
+    if not isinstance(operations, list) or not operations:
+        raise BulkOperationError("'operations' must be a non-empty list")
+    for position, operation in enumerate(operations, 1):
+        if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS:
+            raise BulkOperationError(f"Operation {position}: 'op' must be one of {', '.join(OPERATIONS)}")
+
+    df = sdoh_df.copy()
+    # Parsed once and filtered alongside the rows
+    referral_dates = pd.to_datetime(df["referral_date"], format="%Y-%m-%d", errors="coerce")
+    modified = np.zeros(len(df), dtype=bool)
+    results = []
+    for operation in operations:
+        op = operation["op"]
+        if op == "delete":
+            patient_ids = operation.get("patient_ids")
+            if not patient_ids:
+                raise BulkOperationError("'delete' needs a non-empty 'patient_ids' list")
+            mask = df["patient_id"].isin(_as_list(patient_ids, "patient_ids")).to_numpy()
+            keep = ~mask
+            df, referral_dates, modified = df[keep], referral_dates[keep], modified[keep]
+        else:
+            column = "status" if op == "set_status" else "provider"
+            value = _required_string(operation, column)
+            mask = filter_mask(df, operation.get("where"), today, referral_dates)
+            mask &= (df[column] != value).to_numpy()
+            df.loc[df.index[mask], column] = value
+            modified |= mask
+        results.append({"op": op, "matched": int(mask.sum())})
+
+    deleted = sdoh_df.loc[sdoh_df.index.difference(df.index)]
+    changed = df[modified]
+    return df.reset_index(drop=True), results, changed, deleted
@@ -0,0 +1,202 @@
+"""
+Bulk import of SDOH resource referrals (CSV or NDJSON) for the API.
+
+Validation, matching and merging are column-wise pandas operations, so a batch
+of tens of thousands of rows costs a handful of vectorized passes instead of a
+boolean mask (or a pd.concat) per row:
+- rows whose (resource_id, patient_id) already exists update the non-empty fields
+  they carry
+- rows without a resource_id, or with one the table has never seen, are inserted
+- every problem is reported against its upload row number (1 = first data row)
+"""
+import io
+import secrets
+
+import numpy as np
+import pandas as pd
+
+SDOH_COLUMNS = ["resource_id", "patient_id", "resource_type", "provider", "referral_date", "status", "notes"]
+
+# Fields a new resource must carry
+REQUIRED_FOR_NEW = ["resource_type", "provider", "status"]
+
+# Row errors returned in full; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFormatError(ValueError):
+    """The upload could not be parsed at all"""
+
+
+def request_upload(request):
+    """
+    (bytes, format) of an import request: the body or a multipart "file" field, in
+    the format given by ?format=csv|ndjson, else by the Content-Type or the uploaded
+    file's extension
+    """
+    upload = request.files.get('file')
+    data = upload.read() if upload is not None else request.get_data()
+    file_name = (upload.filename or '') if upload is not None else ''
+    fmt = request.args.get('format')
+    if fmt is None:
+        content_type = (upload.mimetype if upload is not None else request.mimetype) or ''
+        if 'ndjson' in content_type or 'jsonl' in content_type or file_name.endswith(('.ndjson', '.jsonl')):
+            fmt = 'ndjson'
+        else:
+            fmt = 'csv'
+    return data, fmt
+
+
+def parse_upload(data, fmt):
+    """Upload bytes -> DataFrame of strings (missing values as NA)"""
+    try:
+        if fmt == "csv":
+            df = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+        elif fmt == "ndjson":
+            df = pd.read_json(io.BytesIO(data), lines=True, dtype=False, convert_dates=False)
+        else:
+            raise ImportFormatError(f"Unsupported format {fmt!r}; use csv or ndjson")
+    except (ValueError, pd.errors.ParserError) as e:
+        if isinstance(e, ImportFormatError):
+            raise
+        raise ImportFormatError(f"Could not parse {fmt} upload: {e}")
+    except (TypeError, AttributeError):
+        # pandas fails this way on a line that is valid JSON but not an object, e.g. [1, 2]
+        raise ImportFormatError(f"Could not parse {fmt} upload: every line must be a JSON object")
+    if "patient_id" not in df.columns:
+        raise ImportFormatError("The upload needs a patient_id column")
+    df = df.reindex(columns=[c for c in SDOH_COLUMNS if c in df.columns])
+    df = df.astype(object).where(df.notna(), None)
+    for column in df.columns:
+        values = df[column].map(lambda v: v if v is None else str(v).strip())
+        df[column] = values.where(values != "", None)
+    return df.reset_index(drop=True)
+
+
+class RowErrors:
+    """Collects per-row messages from boolean masks"""
+
+    def __init__(self, n):
+        self.n = n
+        self.bad = np.zeros(n, dtype=bool)
+        self._messages = []
+
+    def flag(self, mask, message):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            self.bad |= mask
+            self._messages.append((mask, message))
+
+    def report(self, upload):
+        rows = {}
+        for mask, message in self._messages:
+            for position in np.flatnonzero(mask):
+                rows.setdefault(int(position), []).append(message)
+        report = []
+        for position in sorted(rows)[:MAX_REPORTED_ERRORS]:
+            report.append({"row": position + 1, "resource_id": upload["resource_id"].iat[position]
+                           if "resource_id" in upload else None, "errors": rows[position]})
+        return report
+
+
+def new_resource_ids(n, taken, namespace=""):
+    """n fresh, unique resource ids that are not in taken: RS<namespace><8 hex digits>"""
+    ids = np.array([f"RS{namespace}{secrets.token_hex(4).upper()}" for _ in range(n)], dtype=object)
+    while True:
+        clash = pd.Index(ids).duplicated() | pd.Index(ids).isin(taken)
+        if not clash.any():
+            return ids
+        ids[clash] = [f"RS{namespace}{secrets.token_hex(4).upper()}" for _ in range(int(clash.sum()))]
+
+
+def plan_import(upload, sdoh_df, known_patients, today, id_namespace=""):
+    """
+    Validate an upload against the current table and build the merged table
+    (new resource ids get id_namespace, see new_resource_ids).
+
+    Returns (merged DataFrame, summary dict, list of changed rows for the change
+    feed, row error report). Rows with errors are left out of the merge; the
+    caller decides whether any error aborts the whole import.
+    """
+    n = len(upload)
+    if "resource_id" not in upload:
+        upload["resource_id"] = None
+    errors = RowErrors(n)
+
+    errors.flag(upload["patient_id"].isna(), "patient_id is required")
+    errors.flag(upload["patient_id"].notna() & ~upload["patient_id"].isin(known_patients), "unknown patient_id")
+
+    has_id = upload["resource_id"].notna()
+    errors.flag(has_id & upload["resource_id"].duplicated(keep=False), "resource_id appears more than once in the upload")
+
+    if "referral_date" in upload:
+        dates = pd.to_datetime(upload["referral_date"], format="%Y-%m-%d", errors="coerce")
+        errors.flag(upload["referral_date"].notna() & dates.isna(), "referral_date must be YYYY-MM-DD")
+
+    existing_keys = pd.MultiIndex.from_frame(sdoh_df[["resource_id", "patient_id"]].astype(object))
+    upload_keys = pd.MultiIndex.from_frame(upload[["resource_id", "patient_id"]])
+    id_exists = upload["resource_id"].isin(sdoh_df["resource_id"])
+    is_update = upload_keys.isin(existing_keys)
+    errors.flag(id_exists & ~is_update, "resource_id belongs to another patient")
+
+    is_insert = ~id_exists
+    for field in REQUIRED_FOR_NEW:
+        missing = upload[field].isna() if field in upload else pd.Series(True, index=upload.index)
+        errors.flag(is_insert & missing, f"{field} is required for a new resource")
+
+    ok = ~errors.bad
+    updates = upload[ok & is_update]
+    inserts = upload[ok & is_insert].copy()
+
+    merged = sdoh_df.copy()
+    changed_positions = np.array([], dtype=np.int64)
+    if len(updates):
+        # Positions in `updates` of every table row they touch (-1 for untouched rows)
+        hit = pd.MultiIndex.from_frame(updates[["resource_id", "patient_id"]]).get_indexer(existing_keys)
+        touched = hit >= 0
+        changed_positions = np.flatnonzero(touched)
+        for field in SDOH_COLUMNS[2:]:
+            if field not in updates:
+                continue
+            values = updates[field].to_numpy(dtype=object)[hit[touched]]
+            provided = pd.notna(values)
+            merged.loc[merged.index[changed_positions[provided]], field] = values[provided]
+
+    if len(inserts):
+        missing_id = inserts["resource_id"].isna().to_numpy()
+        if missing_id.any():
+            inserts.loc[missing_id, "resource_id"] = new_resource_ids(
+                int(missing_id.sum()), pd.concat([sdoh_df["resource_id"], upload["resource_id"].dropna()]),
+                id_namespace)
+        inserts = inserts.reindex(columns=SDOH_COLUMNS)
+        inserts["referral_date"] = inserts["referral_date"].fillna(today)
+        inserts["notes"] = inserts["notes"].fillna("")
+        merged = pd.concat([merged, inserts], ignore_index=True)
+
+    changed = pd.concat([merged.iloc[changed_positions], merged.iloc[len(sdoh_df):]])
+    summary = {
+        "rows": n,
+        "updated": int(len(updates)),
+        "inserted": int(len(inserts)),
+        "rejected": int(errors.bad.sum()),
+        "inserted_resource_ids": {int(row) + 1: rid for row, rid in zip(inserts.index, inserts["resource_id"])},
+    }
+    return merged, summary, changed, errors.report(upload)
+
+
+def combine_results(results):
+    """
+    One import result from the results of importing parts of an upload separately
+    (e.g. per shard). results: (result, upload row numbers of the part's rows) pairs;
+    row numbers in errors and inserted_resource_ids are mapped back to the upload's.
+    """
+    combined = {"rows": 0, "updated": 0, "inserted": 0, "rejected": 0, "inserted_resource_ids": {}, "errors": []}
+    for result, rows in results:
+        for key in ("rows", "updated", "inserted", "rejected"):
+            combined[key] += result[key]
+        combined["inserted_resource_ids"].update(
+            {rows[int(row) - 1]: rid for row, rid in result["inserted_resource_ids"].items()})
+        combined["errors"].extend({**error, "row": rows[error["row"] - 1]} for error in result["errors"])
+    combined["inserted_resource_ids"] = dict(sorted(combined["inserted_resource_ids"].items()))
+    combined["errors"] = sorted(combined["errors"], key=lambda error: error["row"])[:MAX_REPORTED_ERRORS]
+    return combined
@@ -1,30 +1,143 @@
 from fastmcp import FastMCP
+import atexit
+import os
+
+from mcp.server.lowlevel.server import request_ctx
+
+from cart_store import CartFullError, ShardedCartStore
+from tool_metrics import ToolMetrics
 
 mcp = FastMCP("MCP_STORE")
 
-# Cart to store items
-mcp_cart = {}
+tool_metrics = ToolMetrics("MCP_STORE")
+tool_metrics.register(mcp)
+
+# Clients pick their cart with this header; without it the MCP session id is used,
+# and over stdio (one client per process) everyone shares the default cart
+CART_SESSION_HEADER = "x-cart-session"
+DEFAULT_SESSION = "default"
+
+# Carts, one per shopper session
+cart_store = ShardedCartStore(
+    num_shards=int(os.environ.get("CART_SHARDS", 64)),
+    max_sessions=int(os.environ.get("CART_MAX_SESSIONS", 100_000)),
+    idle_ttl=float(os.environ.get("CART_IDLE_TTL", 1800)),
+    max_items=int(os.environ.get("CART_MAX_ITEMS", 1000)),
+)
+
+
+def current_session_id():
+    """Cart session of the tool call being handled"""
+    try:
+        request = request_ctx.get().request
+    except LookupError:
+        return DEFAULT_SESSION
+    if request is None:
+        return DEFAULT_SESSION
+    return request.headers.get(CART_SESSION_HEADER) or request.headers.get("mcp-session-id") or DEFAULT_SESSION
+
 
 @mcp.tool()
+@tool_metrics.instrument
 def add_item(key: str, quantity: int) -> str:
     """Add an item to the cart with specified quantity"""
-    mcp_cart[key] = quantity
-    return f"Added {key} with quantity: {quantity}"
+    try:
+        version = cart_store.set_item(current_session_id(), key, quantity)
+    except CartFullError as e:
+        return f"Could not add {key}: {e}"
+    return f"Added {key} with quantity: {quantity} (cart version {version})"
 
 @mcp.tool()
-def get_items() -> dict:
-    """Get all items from the cart"""
-    return {"items": mcp_cart}
+@tool_metrics.instrument
+def get_items(since_version: int | None = None) -> dict:
+    """
+    Get the items in the cart and the cart's version.
+    Pass the version from an earlier call or mutation as since_version to get only
+    what changed after it ("changed" items and "removed" keys); if that version is
+    too old the full cart is returned under "items".
+    """
+    return cart_store.get_items(current_session_id(), since_version)
 
 @mcp.tool()
+@tool_metrics.instrument
 def remove_item(key: str) -> str:
     """Remove an item from the cart"""
-    if key in mcp_cart:
-        value = mcp_cart.pop(key)
-        return f"Removed {key}: {value}"
-    return f"Key {key} not found"
+    value, version = cart_store.remove_item(current_session_id(), key)
+    if value is not None:
+        return f"Removed {key}: {value} (cart version {version})"
+    return f"Key {key} not found (cart version {version})"
+
+
+# ---- Bulk tools: one call applies a whole list of changes, all or nothing ----
+def _bulk_result(change):
+    try:
+        result = cart_store.transact(current_session_id(), change)
+    except ValueError as e:
+        return {"error": str(e), "applied": False}
+    return {"applied": True, **result}
+
+@mcp.tool()
+@tool_metrics.instrument
+def add_items(items: dict[str, int]) -> dict:
+    """
+    Add several items to the cart in one call, e.g. {"apple": 3, "pear": 1}.
+    Existing items are set to the given quantity. Either every item is added or,
+    if any quantity is invalid, none are. Returns the cart diff and new version.
+    """
+    def change(cart):
+        invalid = sorted(key for key, quantity in items.items() if quantity < 1)
+        if invalid:
+            raise ValueError(f"Quantities must be at least 1: {', '.join(invalid)}")
+        cart.update(items)
+    return _bulk_result(change)
+
+@mcp.tool()
+@tool_metrics.instrument
+def remove_items(keys: list[str]) -> dict:
+    """
+    Remove several items from the cart in one call. Keys that are not in the cart
+    are listed under "not_found" and do not stop the others being removed.
+    Returns the cart diff and new version.
+    """
+    not_found = []
+
+    def change(cart):
+        for key in keys:
+            if cart.pop(key, None) is None:
+                not_found.append(key)
+    result = _bulk_result(change)
+    result["not_found"] = not_found
+    return result
+
+@mcp.tool()
+@tool_metrics.instrument
+def update_quantities(quantities: dict[str, int]) -> dict:
+    """
+    Change the quantities of items already in the cart in one call, e.g. {"apple": 5}.
+    A quantity of 0 removes the item. If any key is not in the cart or any quantity
+    is negative, nothing changes. Returns the cart diff and new version.
+    """
+    def change(cart):
+        missing = sorted(key for key in quantities if key not in cart)
+        if missing:
+            raise ValueError(f"Not in the cart: {', '.join(missing)}")
+        negative = sorted(key for key, quantity in quantities.items() if quantity < 0)
+        if negative:
+            raise ValueError(f"Quantities cannot be negative: {', '.join(negative)}")
+        for key, quantity in quantities.items():
+            if quantity == 0:
+                del cart[key]
+            else:
+                cart[key] = quantity
+    return _bulk_result(change)
 
 
 
 if __name__ == "__main__":
-    mcp.run(transport="streamable-http", host="127.0.0.1", port=8001)
\ No newline at end of file
+    # Optional persistence: restore carts on start, snapshot periodically and on exit
+    snapshot_path = os.environ.get("CART_SNAPSHOT_PATH")
+    if snapshot_path:
+        cart_store.load_snapshot(snapshot_path)
+        cart_store.start_snapshots(snapshot_path, float(os.environ.get("CART_SNAPSHOT_INTERVAL", 30)))
+        atexit.register(cart_store.stop_snapshots)
+    mcp.run(transport="streamable-http", host="127.0.0.1", port=8001)
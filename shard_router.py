@@ -0,0 +1,400 @@
+"""
+Routing layer in front of a patient store sharded by patient_id (see sharding.py).
+
+Every shard is an ordinary api_server process over its partition of the tables;
+this server answers the same /api/* endpoints by forwarding to them:
+- requests about one patient go to the shard that owns it, found from the
+  patient_id, or for a first name / last name / date of birth through the
+  global identity index (identity.csv, written by `sharding.py split`)
+- requests over many patients (whole tables, search, type-ahead, the HRA
+  worklist, engagement summaries, analytics views, SDOH bulk changes and
+  imports) go to every shard at once and their answers are combined
+- the SDOH change feed is per shard, so it is not served here (501);
+  resources.PatientRecordCache then falls back to /api/versions
+
+Resource ids stay unique across shards: each shard generates ids in its own
+namespace (see sharding.py), and before importing, the router checks the ids an
+upload names against every shard (imports run one at a time for this), as a
+single shard can only check its own.
+
+A write spanning shards (bulk changes, imports) is first run as a dry run on
+every shard, so a request that any shard rejects changes nothing; a shard
+failing between the dry run and its commit is not rolled back on the others,
+and the answer (502) lists which shards committed and which failed.
+
+Environment: SHARDS_DIR (the split's output directory), SHARD_URLS
+(comma-separated base URLs of the shards, in shard order, e.g.
+http://10.0.0.5:5000), SHARD_TIMEOUT (seconds, default 60), API_HOST, API_PORT.
+"""
+from flask import Flask, Response, jsonify, request
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import numpy as np
+import pandas as pd
+import requests
+
+import sdoh_import
+import sharding
+import tracing
+from analytics import merge_results as merge_view_results
+from engagement_rollups import merge_summaries
+from hra_worklist import merge_pages
+from patient_search import merge_completions
+from table_store import TableStore
+
+app = Flask(__name__)
+
+# Trace every request (and the shard requests it makes) when TRACE_DIR is set
+tracing.instrument_flask(app, "shard_router")
+
+SHARDS_DIR = os.environ.get(
+    "SHARDS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "shards")
+)
+SHARD_URLS = [url.strip().rstrip("/") for url in os.environ.get("SHARD_URLS", "").split(",") if url.strip()]
+SHARD_TIMEOUT = float(os.environ.get("SHARD_TIMEOUT", 60))
+
+if len(SHARD_URLS) != sharding.read_layout(SHARDS_DIR)["shards"]:
+    raise RuntimeError(f"SHARD_URLS names {len(SHARD_URLS)} shards, but {SHARDS_DIR} was split into "
+                       f"{sharding.read_layout(SHARDS_DIR)['shards']}")
+
+# The global identity index: identity.csv, reloaded when it changes
+identities = TableStore(SHARDS_DIR)
+
+# Pooled connections to the shards, and threads to call them all at once
+http = requests.Session()
+http.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=64))
+http.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=64))
+fanout = ThreadPoolExecutor(max_workers=8 * len(SHARD_URLS))
+
+# Held from an import's resource id check to its commit, so two imports cannot both claim an id
+import_lock = threading.Lock()
+
+
+def owner(patient_id):
+    """Index of the shard holding a patient's rows"""
+    return sharding.shard_of(patient_id, len(SHARD_URLS))
+
+def find_patient_id(first_name, last_name, dob):
+    identity = identities.get(sharding.IDENTITY_FILE)
+    return identity.find_identity(first_name, last_name, dob) if identity is not None else None
+
+def shard_headers(*names):
+    """The named headers of the current request, plus its trace context"""
+    return tracing.inject({name: request.headers[name] for name in names if name in request.headers})
+
+def forward(shard):
+    """The current request sent unchanged to one shard"""
+    return http.request(request.method, f"{SHARD_URLS[shard]}{request.full_path}", data=request.get_data(),
+                        headers=shard_headers("Content-Type", "If-None-Match"), timeout=SHARD_TIMEOUT)
+
+def scatter(method="GET", params=None, json=None, capture_errors=False, path=None):
+    """
+    The current request's path (or path) sent to every shard at once (by default
+    with its query string); with capture_errors, a shard that cannot be reached
+    gives its exception in place of a response instead of raising
+    """
+    params = request.args.to_dict(flat=False) if params is None else params
+    headers = shard_headers()
+    path = path or request.path
+
+    def send(url):
+        try:
+            return http.request(method, f"{url}{path}", params=params, json=json, headers=headers,
+                                timeout=SHARD_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            if not capture_errors:
+                raise
+            return e
+    return list(fanout.map(send, SHARD_URLS))
+
+def relay(response):
+    """A shard's response passed on as it is"""
+    headers = {name: response.headers[name] for name in ("Content-Type", "ETag") if name in response.headers}
+    return Response(response.content, response.status_code, headers)
+
+def shard_failure(response):
+    """The answer for a shard that failed a request: its own response, or 502 if it could not be reached"""
+    if isinstance(response, Exception):
+        return jsonify({"error": f"Shard request failed: {response}"}), 502
+    return relay(response)
+
+def partial_write(shards, responses):
+    """
+    The answer for a write that some shards committed (status 200) and others
+    failed: nothing is rolled back, so it says which shards have the change
+    """
+    failed = {shard: str(response) if isinstance(response, Exception)
+              else f"{response.status_code}: {response.text[:200]}"
+              for shard, response in zip(shards, responses)
+              if isinstance(response, Exception) or response.status_code != 200}
+    return jsonify({
+        "success": False,
+        "error": "The change was saved on some shards only; it is not rolled back",
+        "committed_shards": sorted(shard for shard in shards if shard not in failed),
+        "failed_shards": failed,
+    }), 502
+
+def is_partial(responses):
+    committed = [not isinstance(response, Exception) and response.status_code == 200 for response in responses]
+    return any(committed) and not all(committed)
+
+def gather(responses):
+    """(JSON bodies in shard order, None), or (None, the first failed response to relay)"""
+    for response in responses:
+        if response.status_code != 200:
+            return None, relay(response)
+    return [response.json() for response in responses], None
+
+@app.errorhandler(requests.exceptions.RequestException)
+def shard_unavailable(e):
+    return jsonify({"error": f"Shard request failed: {e}"}), 502
+
+@app.route('/api/<any(find_patient, complete, demographics, engagement, hra_status, medical_conditions, '
+           'sdoh_resources):endpoint>', methods=['GET'])
+def route_patient_query(endpoint):
+    """
+    Lookups by first_name, last_name and dob go to the patient's shard; without
+    all three the table endpoints return the records of every shard
+    """
+    identity = [request.args.get(key) for key in ("first_name", "last_name", "dob")]
+    if all(identity):
+        patient_id = find_patient_id(*identity)
+        # For an unknown patient any shard answers "not found" just as the API does
+        return relay(forward(owner(patient_id) if patient_id else 0))
+    if endpoint in ("find_patient", "complete"):
+        return relay(forward(0))
+    bodies, failure = gather(scatter())
+    if failure:
+        return failure
+    return jsonify([record for body in bodies for record in body])
+
+@app.route('/api/patients/<patient_id>/<table>', methods=['GET'])
+def route_patient_table(patient_id, table):
+    return relay(forward(owner(patient_id)))
+
+@app.route('/api/patients/search', methods=['GET'])
+def route_search_patients():
+    """Every shard's best candidates, best first"""
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    bodies, failure = gather(scatter())
+    if failure:
+        return failure
+    candidates = sorted((candidate for body in bodies for candidate in body["candidates"]),
+                        key=lambda candidate: -candidate["score"])[:limit]
+    return jsonify({"candidates": candidates, "count": len(candidates)})
+
+@app.route('/api/patients/autocomplete', methods=['GET'])
+def route_autocomplete_patients():
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    bodies, failure = gather(scatter(params={**request.args.to_dict(), "limit": 2 * limit}))
+    if failure:
+        return failure
+    matches = merge_completions(request.args.get('q', ''), [body["matches"] for body in bodies], limit)
+    return jsonify({"matches": matches, "count": len(matches)})
+
+@app.route('/api/engagement/summary', methods=['GET'])
+def route_engagement_summary():
+    bodies, failure = gather(scatter())
+    if failure:
+        return failure
+    return jsonify(merge_summaries(bodies))
+
+@app.route('/api/hra_status/worklist', methods=['GET'])
+def route_hra_worklist():
+    """Each shard's page for the same cursor, merged in worklist order"""
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    bodies, failure = gather(scatter())
+    if failure:
+        return failure
+    patients, total, next_cursor = merge_pages(
+        [(body["patients"], body["total"], body["next_cursor"]) for body in bodies], limit)
+    return jsonify({"patients": patients, "total": total, "next_cursor": next_cursor})
+
+@app.route('/api/analytics', methods=['GET'])
+def route_list_analytics_views():
+    return relay(forward(0))
+
+@app.route('/api/analytics/<view_name>', methods=['GET'])
+def route_analytics_view(view_name):
+    """Every shard's view combined (see analytics.merge_results), with an ETag for revalidation"""
+    bodies, failure = gather(scatter())
+    if failure:
+        return failure
+    response = jsonify(merge_view_results(view_name, bodies))
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/api/sdoh_resources/update', methods=['POST'])
+def route_update_sdoh_resources():
+    data = request.get_json(silent=True)
+    patient_id = data.get("patient_id") if isinstance(data, dict) else None
+    # Invalid requests get the API's own answer from any shard
+    return relay(forward(owner(patient_id) if patient_id is not None else 0))
+
+@app.route('/api/sdoh_resources/delete/<patient_id>', methods=['DELETE'])
+def route_delete_patient_sdoh_resources(patient_id):
+    return relay(forward(owner(patient_id)))
+
+@app.route('/api/sdoh_resources/bulk', methods=['POST'])
+def route_bulk_update_sdoh_resources():
+    """The operations applied on every shard, after a dry run on each validated them"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or "operations" not in data:
+        return relay(forward(0))
+    if not data.get("dry_run", False):
+        _, failure = gather(scatter("POST", params={}, json={**data, "dry_run": True}))
+        if failure:
+            return failure
+    responses = scatter("POST", params={}, json=data, capture_errors=True)
+    if is_partial(responses):
+        return partial_write(list(range(len(SHARD_URLS))), responses)
+    for response in responses:
+        if isinstance(response, Exception) or response.status_code != 200:
+            return shard_failure(response)
+    bodies = [response.json() for response in responses]
+    return jsonify({
+        "success": True,
+        "dry_run": bool(data.get("dry_run", False)),
+        "operations": [{**operations[0], "matched": sum(operation["matched"] for operation in operations)}
+                       for operations in zip(*(body["operations"] for body in bodies))],
+        "resources_updated": sum(body["resources_updated"] for body in bodies),
+        "resources_deleted": sum(body["resources_deleted"] for body in bodies),
+        "patients_affected": sorted(set().union(*(body["patients_affected"] for body in bodies))),
+    })
+
+def resource_id_conflicts(rows, row_shards):
+    """
+    ({upload position: error} for the resource ids no single shard can vet, None),
+    or (None, a failed shard's answer): ids another shard has (so another
+    patient's), ids in another shard's namespace, and ids repeated in the upload
+    for patients on different shards
+    """
+    if "resource_id" not in rows:
+        return {}, None
+    ids = rows["resource_id"]
+    shards = pd.Series(row_shards, index=rows.index)
+    named = ids.notna()
+    conflicts = {}
+    spread = shards[named].groupby(ids[named]).nunique()
+    for position in np.flatnonzero(named & ids.isin(spread.index[spread > 1])).tolist():
+        conflicts[position] = "resource_id appears more than once in the upload"
+    for position in np.flatnonzero(named).tolist():
+        namespace = sharding.resource_id_shard(ids.iloc[position])
+        if namespace is not None and namespace != row_shards[position]:
+            conflicts.setdefault(position, "resource_id belongs to another patient")
+    unique_ids = sorted(set(ids[named].astype(str)))
+    if not unique_ids:
+        return conflicts, None
+    responses = scatter("POST", params={}, json={"resource_ids": unique_ids}, path="/api/sdoh_resources/owners")
+    bodies, failure = gather(responses)
+    if failure:
+        return None, failure
+    holders = {}
+    for shard, body in enumerate(bodies):
+        for resource_id in body["owners"]:
+            holders.setdefault(resource_id, set()).add(shard)
+    for position in np.flatnonzero(named).tolist():
+        if holders.get(str(ids.iloc[position]), set()) - {row_shards[position]}:
+            conflicts.setdefault(position, "resource_id belongs to another patient")
+    return conflicts, None
+
+@app.route('/api/sdoh_resources/import', methods=['POST'])
+def route_import_sdoh_resources():
+    """
+    The upload's rows sent to their patients' shards as NDJSON, after the
+    resource ids they name are checked against every shard; with on_error=abort,
+    a dry run on every shard first so a rejected row anywhere imports nothing
+    """
+    data, fmt = sdoh_import.request_upload(request)
+    on_error = request.args.get('on_error', 'abort')
+    dry_run = request.args.get('dry_run', 'false').lower() in ('1', 'true')
+    if on_error not in ('abort', 'skip'):
+        return jsonify({"error": "on_error must be 'abort' or 'skip'"}), 400
+    if not data.strip():
+        return jsonify({"error": "Empty upload"}), 400
+    try:
+        rows = sdoh_import.parse_upload(data, fmt)
+    except sdoh_import.ImportFormatError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with import_lock:
+        return import_rows(rows, on_error, dry_run)
+
+def import_rows(rows, on_error, dry_run):
+    """The parsed upload's rows imported on their shards (see route_import_sdoh_resources)"""
+    # Rows without a patient_id are rejected by any shard
+    row_shards = [owner(patient_id) if patient_id is not None else 0 for patient_id in rows["patient_id"]]
+    conflicts, failure = resource_id_conflicts(rows, row_shards)
+    if failure:
+        return failure
+    # shard -> positions of its rows in the upload, leaving out those rejected here
+    parts = {}
+    for position, shard in enumerate(row_shards):
+        if position not in conflicts:
+            parts.setdefault(shard, []).append(position)
+    rejected = sorted(conflicts)
+    rejected_here = {
+        "rows": len(rejected), "updated": 0, "inserted": 0, "rejected": len(rejected), "inserted_resource_ids": {},
+        "errors": [{"row": i + 1, "resource_id": rows["resource_id"].iloc[position], "errors": [conflicts[position]]}
+                   for i, position in enumerate(rejected)],
+    }
+    headers = shard_headers()
+    path = request.path
+
+    def run(dry):
+        """The shards' responses (or exceptions) to importing their rows"""
+        def send(shard):
+            try:
+                return http.post(f"{SHARD_URLS[shard]}{path}", data=rows.iloc[parts[shard]].to_json(
+                    orient="records", lines=True).encode(), headers={**headers, "Content-Type": "application/x-ndjson"},
+                    params={"format": "ndjson", "on_error": on_error, "dry_run": str(dry).lower()},
+                    timeout=SHARD_TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                return e
+        return list(fanout.map(send, parts))
+
+    def answer(responses):
+        """The shards' import results as one, or the first failure when a shard did not import"""
+        for response in responses:
+            if isinstance(response, Exception) or response.status_code not in (200, 422):
+                return shard_failure(response)
+        result = {**sdoh_import.combine_results(
+            [(response.json(), [position + 1 for position in parts[shard]]) for shard, response in zip(parts, responses)]
+            + [(rejected_here, [position + 1 for position in rejected])]),
+            "dry_run": dry_run}
+        if any(response.status_code == 422 for response in responses) or (rejected and on_error == 'abort'):
+            result.update({"success": False, "updated": 0, "inserted": 0, "inserted_resource_ids": {}})
+            return jsonify(result), 422
+        return jsonify({"success": True, **result}), 200
+
+    if on_error == 'abort' and not dry_run:
+        checked = run(True)
+        if rejected or any(isinstance(response, Exception) or response.status_code != 200 for response in checked):
+            return answer(checked)
+    responses = run(dry_run)
+    if not dry_run and is_partial(responses):
+        return partial_write(list(parts), responses)
+    return answer(responses)
+
+@app.route('/api/sdoh_resources/changes', methods=['GET'])
+@app.route('/api/sdoh_resources/changes/stream', methods=['GET'])
+def route_sdoh_changes():
+    return jsonify({"error": "The SDOH change feed is per shard; poll /api/versions for changes"}), 501
+
+@app.route('/api/versions', methods=['GET'])
+def route_table_versions():
+    """A version per table that changes whenever any shard's file does"""
+    bodies, failure = gather(scatter())
+    if failure:
+        return failure
+    return jsonify({"tables": {
+        table: None if all(body["tables"][table] is None for body in bodies)
+        else ",".join(str(body["tables"][table]) for body in bodies)
+        for table in bodies[0]["tables"]
+    }})
+
+
+if __name__ == '__main__':
+    app.run(debug=os.environ.get("API_DEBUG", "1") == "1", host=os.environ.get("API_HOST", "127.0.0.1"),
+            port=int(os.environ.get("API_PORT", 5000)))
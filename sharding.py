@@ -0,0 +1,166 @@
+"""
+Hash partitioning of the patient tables across shards (see shard_router.py).
+
+A patient belongs to shard crc32(patient_id) % N, and every row of every table
+about that patient lives in that shard's directory, so each shard is an ordinary
+api_server data directory and a per-patient request needs one shard only.
+
+    python sharding.py split DATA_DIR SHARDS_DIR --shards N
+        writes SHARDS_DIR/shard-<i>/ (each CSV file's rows for shard i's patients;
+        files without a patient_id column are copied to every shard),
+        SHARDS_DIR/identity.csv (patient_id, names and date of birth of every
+        patient: the router's global identity index) and SHARDS_DIR/shards.json
+
+    python sharding.py serve SHARDS_DIR [--port 5000] [--workers 1]
+        runs one api_server process per shard (ports 5001, 5002, ...) and the
+        router on the given port, all on this machine; across machines, start
+        each shard's api_server where its directory is, with API_SHARD=<i>, and
+        point the router's SHARD_URLS at them
+
+A shard generates ids for new SDOH resources in its own namespace, RS<i>-...,
+which no other shard and no id from before the split uses, so generated ids are
+unique across shards without asking the others.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import zlib
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IDENTITY_FILE = "identity.csv"
+IDENTITY_COLUMNS = ["patient_id", "first_name", "last_name", "date_of_birth"]
+LAYOUT_FILE = "shards.json"
+
+NAMESPACED_RESOURCE_ID = re.compile(r"RS(\d+)-")
+
+
+def shard_of(patient_id, shards):
+    """Shard of a patient: the same in every process and on every machine (unlike hash())"""
+    return zlib.crc32(str(patient_id).encode()) % shards
+
+
+def resource_id_namespace(shard):
+    """Infix of the resource ids a shard generates (see sdoh_import.new_resource_ids)"""
+    return f"{shard}-"
+
+
+def resource_id_shard(resource_id):
+    """The shard whose namespace a resource id is in, or None for an id no shard generated"""
+    match = NAMESPACED_RESOURCE_ID.match(str(resource_id))
+    return int(match.group(1)) if match else None
+
+
+def shard_dir(shards_dir, shard):
+    return os.path.join(shards_dir, f"shard-{shard}")
+
+
+def read_layout(shards_dir):
+    """The shards.json written by split: {"shards": N, "files": [...]}"""
+    with open(os.path.join(shards_dir, LAYOUT_FILE)) as f:
+        return json.load(f)
+
+
+def _split_file(path, shards_dir, shards):
+    """Route each row of a CSV file to its patient's shard; False if the file has no patient_id column"""
+    file_name = os.path.basename(path)
+    with open(path, newline='') as src:
+        reader = csv.reader(src)
+        header = next(reader, None)
+        if header is None or "patient_id" not in header:
+            return False
+        key = header.index("patient_id")
+        outputs = [open(os.path.join(shard_dir(shards_dir, shard), file_name), 'w', newline='')
+                   for shard in range(shards)]
+        try:
+            writers = [csv.writer(f, lineterminator="\n") for f in outputs]
+            for writer in writers:
+                writer.writerow(header)
+            for row in reader:
+                writers[shard_of(row[key], shards)].writerow(row)
+        finally:
+            for f in outputs:
+                f.close()
+    return True
+
+
+def _write_identity(data_dir, shards_dir):
+    with open(os.path.join(data_dir, "demographics.csv"), newline='') as src, \
+            open(os.path.join(shards_dir, IDENTITY_FILE), 'w', newline='') as dst:
+        reader = csv.DictReader(src)
+        writer = csv.DictWriter(dst, IDENTITY_COLUMNS, extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(reader)
+
+
+def split(data_dir, shards_dir, shards):
+    """Partition every CSV file of data_dir into shards_dir (see the module docstring)"""
+    for shard in range(shards):
+        os.makedirs(shard_dir(shards_dir, shard), exist_ok=True)
+    files = sorted(name for name in os.listdir(data_dir) if name.endswith(".csv"))
+    for file_name in files:
+        path = os.path.join(data_dir, file_name)
+        if not _split_file(path, shards_dir, shards):
+            for shard in range(shards):
+                shutil.copy(path, shard_dir(shards_dir, shard))
+    _write_identity(data_dir, shards_dir)
+    with open(os.path.join(shards_dir, LAYOUT_FILE), "w") as f:
+        json.dump({"shards": shards, "files": files}, f)
+
+
+def serve(shards_dir, port, workers):
+    """Run every shard and the router as local processes until interrupted"""
+    shards = read_layout(shards_dir)["shards"]
+    processes = []
+    shard_urls = []
+    try:
+        for shard in range(shards):
+            shard_port = port + 1 + shard
+            env = dict(os.environ, API_DATA_DIR=shard_dir(shards_dir, shard), API_PORT=str(shard_port),
+                       API_WORKERS=str(workers), API_DEBUG="0", API_SHARD=str(shard))
+            if os.environ.get("API_SHARED_TABLES"):
+                # Shards' files share names, so each publishes its tables under its own directory
+                env["API_SHARED_TABLES"] = shard_dir(os.environ["API_SHARED_TABLES"], shard)
+            processes.append(subprocess.Popen([sys.executable, os.path.join(ROOT_DIR, "api_server.py")], env=env))
+            shard_urls.append(f"http://127.0.0.1:{shard_port}")
+        env = dict(os.environ, SHARD_URLS=",".join(shard_urls), SHARDS_DIR=shards_dir, API_PORT=str(port),
+                   API_DEBUG="0")
+        router = subprocess.Popen([sys.executable, os.path.join(ROOT_DIR, "shard_router.py")], env=env)
+        processes.append(router)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        router.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    split_parser = commands.add_parser("split", help="Partition a data directory into shard directories")
+    split_parser.add_argument("data_dir")
+    split_parser.add_argument("shards_dir")
+    split_parser.add_argument("--shards", type=int, required=True)
+    serve_parser = commands.add_parser("serve", help="Run the shards and the router on this machine")
+    serve_parser.add_argument("shards_dir")
+    serve_parser.add_argument("--port", type=int, default=5000, help="Router port; shards use the next ones")
+    serve_parser.add_argument("--workers", type=int, default=1, help="API_WORKERS of each shard")
+    args = parser.parse_args(argv)
+    if args.command == "split":
+        split(args.data_dir, args.shards_dir, args.shards)
+    else:
+        serve(args.shards_dir, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Parsed tables shared by every API worker process through memory-mapped files.
+
+The first worker that needs a version of a CSV file has it parsed (read_table)
+and published as one generation directory of columnar files:
+- numeric and date (int32 day) columns and categorical codes: .npy arrays
+- other text (patient_id, resource_id, names that stayed text, contact
+  details, ...): UTF-8 bytes plus per-row offsets, exposed to pandas as a
+  read-only MappedTextArray
+- categorical and date columns that stayed text, which code runs .str methods
+  on: pickled object arrays, the only per-worker copies besides categories
+
+Every worker maps the files read-only, so the pages live once in the OS page
+cache whatever the number of workers, and a new worker attaches in a fraction
+of the parse time. Parsing runs in a child process (python shared_tables.py
+<csv file> <generation dir>, also usable to publish ahead of starting the
+server), so no worker keeps the parser's garbage in its heap.
+
+A generation is written under a temporary name and renamed into place, so it
+appears complete or not at all; a changed CSV file gets a new generation (named
+after its stamp) and workers swap to it on their next access. Publishing is
+serialized across processes by a lock file, and old generations are pruned
+(mapped pages stay valid until unmapped).
+"""
+import contextlib
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import ExtensionArray, ExtensionDtype, no_default, take
+from pandas.api.indexers import check_array_indexer
+
+from compact import CATEGORICAL_COLUMNS, DATE_COLUMNS, read_table
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent publishers race, and the losing rename is discarded
+    fcntl = None
+
+# Generations kept per table, newest first
+GENERATIONS_KEPT = 2
+
+# Columns never mapped as text: code runs .str methods on them when they are not encoded
+COMPUTED_COLUMNS = CATEGORICAL_COLUMNS | DATE_COLUMNS
+
+
+class MappedTextDtype(ExtensionDtype):
+    name = "mapped_text"
+    type = str
+    kind = "O"
+    na_value = np.nan
+
+    @classmethod
+    def construct_array_type(cls):
+        return MappedTextArray
+
+
+class MappedTextArray(ExtensionArray):
+    """
+    Read-only text column over a UTF-8 buffer: row i is data[starts[i]:ends[i]],
+    missing where starts[i] is -1. Taking rows copies only the offsets.
+    """
+
+    def __init__(self, data, starts, ends):
+        self._data = data
+        self._starts = starts
+        self._ends = ends
+
+    @classmethod
+    def from_values(cls, values):
+        """From an object array of strings (NaN / None for missing)"""
+        missing = pd.isna(values)
+        encoded = [b"" if gap else str(value).encode() for value, gap in zip(values, missing)]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        starts[missing] = -1
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), starts, ends)
+
+    @classmethod
+    def _from_sequence(cls, scalars, *, dtype=None, copy=False):
+        return cls.from_values(np.asarray(scalars, dtype=object))
+
+    @classmethod
+    def _from_factorized(cls, values, original):
+        return cls.from_values(values)
+
+    @classmethod
+    def _concat_same_type(cls, to_concat):
+        return cls.from_values(np.concatenate([array.to_numpy() for array in to_concat]))
+
+    @property
+    def dtype(self):
+        return MappedTextDtype()
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes + self._starts.nbytes + self._ends.nbytes
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            start = self._starts[item]
+            return np.nan if start < 0 else str(memoryview(self._data)[start:self._ends[item]], "utf-8")
+        if not isinstance(item, slice):
+            item = check_array_indexer(self, item)
+        return type(self)(self._data, self._starts[item], self._ends[item])
+
+    def isna(self):
+        return np.asarray(self._starts < 0)
+
+    def take(self, indices, *, allow_fill=False, fill_value=None):
+        indices = np.asarray(indices, dtype=np.intp)
+        return type(self)(self._data,
+                          take(self._starts, indices, allow_fill=allow_fill, fill_value=-1),
+                          take(self._ends, indices, allow_fill=allow_fill, fill_value=0))
+
+    def copy(self):
+        # The text buffer is read-only, so copies can share it
+        return type(self)(self._data, self._starts.copy(), self._ends.copy())
+
+    def to_numpy(self, dtype=None, copy=False, na_value=no_default):
+        na_value = np.nan if na_value is no_default else na_value
+        data = memoryview(self._data)
+        values = np.array([na_value if start < 0 else str(data[start:end], "utf-8")
+                           for start, end in zip(self._starts.tolist(), self._ends.tolist())], dtype=object)
+        return values if dtype is None or np.dtype(dtype) == object else values.astype(dtype)
+
+    def to_bytes(self):
+        """The UTF-8 text as a fixed-width numpy bytes array, b"" where missing, without a str per row"""
+        lengths = np.where(self._starts < 0, 0, self._ends - self._starts)
+        width = max(int(lengths.max(initial=0)), 1)
+        out = np.zeros((len(self), width), dtype=np.uint8)
+        rows = np.repeat(np.arange(len(self)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        out[rows, offsets] = self._data[np.repeat(self._starts, lengths) + offsets]
+        return out.view(f"S{width}").ravel()
+
+    def __array__(self, dtype=None, copy=None):
+        return self.to_numpy(dtype=dtype)
+
+    def astype(self, dtype, copy=True):
+        if isinstance(dtype, MappedTextDtype):
+            return self.copy() if copy else self
+        return super().astype(dtype, copy=copy)
+
+    def __eq__(self, other):
+        return self.to_numpy() == other
+
+    def _values_for_factorize(self):
+        return self.to_numpy(), np.nan
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Exclusive lock held across processes (only within the process where fcntl is unavailable)"""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _map(path):
+    """A saved array, memory-mapped read-only (mmap cannot map an empty file)"""
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        return np.load(path)
+
+
+def _dump(obj, path):
+    with open(path, "wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def publish(df, generation_dir):
+    """Write df as a generation directory, atomically; False if another process got there first"""
+    tmp_dir = f"{generation_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    columns = []
+    for i, name in enumerate(df.columns):
+        values = df[name]
+        base = os.path.join(tmp_dir, str(i))
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            kind = "categorical"
+            np.save(f"{base}.codes.npy", values.cat.codes.to_numpy())
+            _dump(values.cat.categories, f"{base}.categories.pkl")
+        elif values.dtype != object:
+            kind = "array"
+            np.save(f"{base}.npy", values.to_numpy())
+        elif name in COMPUTED_COLUMNS or not values.dropna().map(type).eq(str).all():
+            kind = "objects"
+            _dump(values.to_numpy(), f"{base}.pkl")
+        else:
+            kind = "text"
+            text = MappedTextArray.from_values(values.to_numpy())
+            for part in ("data", "starts", "ends"):
+                np.save(f"{base}.{part}.npy", getattr(text, f"_{part}"))
+        columns.append({"name": name, "kind": kind})
+    # Written last: a directory with meta.json is complete
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({"rows": len(df), "columns": columns}, f)
+    try:
+        os.rename(tmp_dir, generation_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+    return True
+
+
+def attach(generation_dir):
+    """The DataFrame of a published generation, backed by read-only mappings of its files"""
+    with open(os.path.join(generation_dir, "meta.json")) as f:
+        meta = json.load(f)
+    data = {}
+    for i, column in enumerate(meta["columns"]):
+        base = os.path.join(generation_dir, str(i))
+        name, kind = column["name"], column["kind"]
+        if kind == "categorical":
+            categories = _load(f"{base}.categories.pkl")
+            data[name] = pd.Categorical.from_codes(_map(f"{base}.codes.npy"), dtype=pd.CategoricalDtype(categories))
+        elif kind == "array":
+            data[name] = _map(f"{base}.npy")
+        elif kind == "objects":
+            data[name] = _load(f"{base}.pkl")
+        else:
+            data[name] = MappedTextArray(*(_map(f"{base}.{part}.npy") for part in ("data", "starts", "ends")))
+    # copy=False keeps every column on its mapping instead of consolidating into new blocks
+    return pd.DataFrame(data, index=pd.RangeIndex(meta["rows"]), copy=False)
+
+
+class SharedTables:
+    """Published generations of each table under one directory: <root>/<file name>/<stamp>/"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _prune(self, table_dir, current):
+        generations = [entry for entry in os.scandir(table_dir)
+                       if entry.is_dir() and ".tmp-" not in entry.name and entry.name != current]
+        generations.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+        for entry in generations[GENERATIONS_KEPT - 1:]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    def load(self, file_name, stamp, path):
+        """
+        The table for a version of the CSV file at path: attached if already
+        published, otherwise published first (by one process at a time).
+        """
+        table_dir = os.path.join(self.root, file_name)
+        generation_dir = os.path.join(table_dir, stamp)
+        if not os.path.exists(os.path.join(generation_dir, "meta.json")):
+            os.makedirs(table_dir, exist_ok=True)
+            with file_lock(os.path.join(table_dir, ".lock")):
+                if not os.path.exists(os.path.join(generation_dir, "meta.json")):
+                    subprocess.run([sys.executable, os.path.abspath(__file__), path, generation_dir], check=True)
+                    self._prune(table_dir, stamp)
+        try:
+            return attach(generation_dir)
+        except FileNotFoundError:
+            # Pruned meanwhile: this version is at least two behind, so keep a private copy until the next access
+            return read_table(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python shared_tables.py <csv file> <generation dir>")
+    publish(read_table(sys.argv[1]), sys.argv[2])
@@ -0,0 +1,101 @@
+"""
+Single-flight coalescing of identical concurrent work.
+
+While a computation for a key is in flight, further callers with the same key
+wait for it and share its result (or exception) instead of repeating it. Nothing
+is cached: once the computation finishes, the next caller starts a new one. This
+flattens thundering herds, e.g. many users opening the same patient right after
+its table changed.
+
+- SingleFlight: for threads (the Flask API)
+- AsyncSingleFlight: for asyncio (the MCP servers); `coalesce_tool` turns a
+  blocking tool function into an async one that runs in a worker thread and is
+  shared by identical concurrent calls
+"""
+import asyncio
+import copy
+import functools
+import json
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-safe single-flight group"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {"calls": 0, "shared": 0}
+
+    def do(self, key, fn):
+        """Run fn() unless a call for key is in flight; returns (result, shared)"""
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.stats["shared"] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+def call_key(name, args, kwargs):
+    """Hashable key for a function call with JSON-like arguments"""
+    return name, json.dumps([args, kwargs], sort_keys=True, default=str)
+
+
+class AsyncSingleFlight:
+    """Single-flight group for coroutines on one event loop"""
+
+    def __init__(self):
+        self._calls = {}
+        self.stats = {"calls": 0, "shared": 0}
+
+    async def do(self, key, make_awaitable):
+        """Await make_awaitable() unless a call for key is in flight; returns (result, shared)"""
+        self.stats["calls"] += 1
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.stats["shared"] += 1
+        else:
+            task = self._calls[key] = asyncio.ensure_future(make_awaitable())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # A caller that gives up (is cancelled) must not cancel the others' call
+        return await asyncio.shield(task), shared
+
+    def coalesce_tool(self, fn):
+        """
+        Decorator for a blocking, read-only tool: runs it in a worker thread and
+        shares the result between identical concurrent calls (each sharer gets a copy).
+        """
+        @functools.wraps(fn)
+        async def coalesced(*args, **kwargs):
+            result, shared = await self.do(call_key(fn.__name__, args, kwargs),
+                                           lambda: asyncio.to_thread(fn, *args, **kwargs))
+            return copy.deepcopy(result) if shared else result
+        return coalesced
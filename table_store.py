@@ -0,0 +1,287 @@
+"""
+In-memory, indexed cache of the API's CSV tables.
+
+Each table is parsed once and kept until its file changes (checked by modification
+time and size on every access, which costs one stat call). Lookups by patient_id
+use a per-table index of row positions, and patient identity (first name, last
+name, date of birth) resolves through a sorted index on demographics, so a
+per-patient request no longer parses or scans whole files. Both indexes are
+numpy arrays (binary searched) rather than dicts, a few bytes per row instead of
+a Python object per patient. Demographics also get a fuzzy search index for
+misspelled names and a prefix index for type-ahead; the HRA table a due date /
+risk ordering for the worklist, and engagement windowed rollups.
+
+Tables are held compactly (see compact.py): low-cardinality text columns as
+categoricals and dates as int32 day numbers. Use compact.to_records or
+compact.decode for the original text before serializing or mutating.
+
+With a shared directory, parsed tables are published there once as
+memory-mapped columnar files that every worker process attaches to read-only
+(see shared_tables.py), instead of each worker parsing its own copy.
+
+Every Table is an immutable version (snapshot) of its file: a request keeps
+the one it got however the file changes meanwhile. A writer builds the next
+version under a temporary file name and installs it with replace(), which loads
+it before renaming it into place, so readers never see a partial file and never
+wait for a parse; while a changed file is being loaded, other requests are
+served the previous version instead of blocking. A new version is loaded with
+the indexes its predecessor had built, plus the HRA worklist ordering, which is
+always built up front.
+
+Cached DataFrames are shared between requests: callers must copy before mutating.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from compact import day_number, is_day_column, read_table
+from engagement_rollups import EngagementRollups
+from hra_worklist import HraWorklist
+from patient_search import PatientSearchIndex, PrefixIndex
+from shared_tables import MappedTextArray, SharedTables
+
+# Built with every version of these tables rather than on the first request after a change
+EAGER_INDEXES = {"hra_status.csv": ("hra_worklist",)}
+
+
+class PatientIndex:
+    """patient_id -> row positions: sorted UTF-8 ids, and each id's rows as a slice of one position array"""
+
+    def __init__(self, patient_ids):
+        present = patient_ids.notna().to_numpy()
+        if isinstance(patient_ids.array, MappedTextArray):
+            keys = patient_ids.array.to_bytes()[present]
+        else:
+            keys = np.char.encode(patient_ids.to_numpy()[present].astype(str), "utf-8")
+        self._keys, ranks = np.unique(keys, return_inverse=True)
+        # Stable, so each patient's positions stay in table order
+        self._positions = np.flatnonzero(present)[np.argsort(ranks, kind="stable")]
+        self._starts = np.append(0, np.cumsum(np.bincount(ranks, minlength=len(self._keys))))
+
+    def get(self, patient_id, default=None):
+        key = str(patient_id).encode()
+        i = np.searchsorted(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            return default
+        return self._positions[self._starts[i]:self._starts[i + 1]]
+
+    def __getitem__(self, patient_id):
+        positions = self.get(patient_id)
+        if positions is None:
+            raise KeyError(patient_id)
+        return positions
+
+    def __contains__(self, patient_id):
+        return self.get(patient_id) is not None
+
+
+class IdentityIndex:
+    """
+    (first name, last name, date of birth) -> first matching patient_id, names
+    compared lower-cased. Rows are sorted by the three as integer codes and
+    searched one key at a time, like the HRA worklist's cursor.
+    """
+
+    def __init__(self, df):
+        self._patient_ids = df['patient_id']
+        first, self._first_codes = self._codes(df['first_name'].str.lower())
+        last, self._last_codes = self._codes(df['last_name'].str.lower())
+        if is_day_column(df['date_of_birth']):
+            dob, self._dob_codes = df['date_of_birth'].to_numpy().astype(np.int64), None
+        else:
+            dob, self._dob_codes = self._codes(df['date_of_birth'])
+        # Stable, so the first of equal keys is the first matching row
+        self._order = np.lexsort((dob, last, first))
+        self._keys = [keys[self._order] for keys in (first, last, dob)]
+
+    @staticmethod
+    def _codes(values):
+        """Integer codes (-1 where missing) and value -> code"""
+        codes, uniques = pd.factorize(values)
+        return codes.astype(np.int64), {value: code for code, value in enumerate(uniques)}
+
+    def get(self, first_name, last_name, dob):
+        """patient_id, or None; dob is a day number when the column is encoded"""
+        query = (self._first_codes.get(first_name.lower()), self._last_codes.get(last_name.lower()),
+                 dob if self._dob_codes is None else self._dob_codes.get(dob))
+        if any(value is None for value in query):
+            return None
+        lo, hi = 0, len(self._order)
+        for keys, value in zip(self._keys, query):
+            lo, hi = (lo + np.searchsorted(keys[lo:hi], value, side="left"),
+                      lo + np.searchsorted(keys[lo:hi], value, side="right"))
+        return self._patient_ids.iloc[self._order[lo]] if lo < hi else None
+
+
+class Table:
+    """One parsed CSV file plus lazily built indexes"""
+
+    def __init__(self, name, df, stamp):
+        self.name = name
+        self.df = df
+        self.stamp = stamp
+        self._lock = threading.Lock()
+        self._patient_index = None
+        self._identity_index = None
+        self._search_index = None
+        self._prefix_index = None
+        self._hra_worklist = None
+        self._engagement_rollups = None
+
+    @property
+    def patient_index(self):
+        """patient_id -> array of row positions (see PatientIndex)"""
+        if self._patient_index is None:
+            with self._lock:
+                if self._patient_index is None:
+                    self._patient_index = PatientIndex(self.df['patient_id'])
+        return self._patient_index
+
+    @property
+    def identity_index(self):
+        """First name, last name and date of birth -> patient_id (see IdentityIndex)"""
+        if self._identity_index is None:
+            with self._lock:
+                if self._identity_index is None:
+                    self._identity_index = IdentityIndex(self.df)
+        return self._identity_index
+
+    def find_identity(self, first_name, last_name, dob):
+        """patient_id for a first name, last name and YYYY-MM-DD date of birth, or None"""
+        if is_day_column(self.df['date_of_birth']):
+            dob = day_number(dob)
+            if dob is None:
+                return None
+        return self.identity_index.get(first_name, last_name, dob)
+
+    @property
+    def search_index(self):
+        """Fuzzy name / date of birth search over demographics (see patient_search.py)"""
+        if self._search_index is None:
+            with self._lock:
+                if self._search_index is None:
+                    self._search_index = PatientSearchIndex(self.df)
+        return self._search_index
+
+    @property
+    def prefix_index(self):
+        """Name type-ahead over demographics (see patient_search.py)"""
+        if self._prefix_index is None:
+            with self._lock:
+                if self._prefix_index is None:
+                    self._prefix_index = PrefixIndex(self.df)
+        return self._prefix_index
+
+    @property
+    def hra_worklist(self):
+        """HRA rows in due date / risk order (see hra_worklist.py)"""
+        if self._hra_worklist is None:
+            with self._lock:
+                if self._hra_worklist is None:
+                    self._hra_worklist = HraWorklist(self.df)
+        return self._hra_worklist
+
+    def engagement_rollups(self, today):
+        """Windowed engagement metrics as of today (see engagement_rollups.py), rebuilt when the date changes"""
+        rollups = self._engagement_rollups
+        if rollups is None or rollups.today != today:
+            with self._lock:
+                rollups = self._engagement_rollups
+                if rollups is None or rollups.today != today:
+                    rollups = self._engagement_rollups = EngagementRollups(self.df, today)
+        return rollups
+
+    def warm(self, previous=None):
+        """
+        Build the indexes an earlier version of the table had, and those its file
+        always needs (EAGER_INDEXES), so requests on this one do not wait for them.
+        """
+        for name in ("patient_index", "identity_index", "search_index", "prefix_index", "hra_worklist"):
+            if name in EAGER_INDEXES.get(self.name, ()) or getattr(previous, f"_{name}", None) is not None:
+                getattr(self, name)
+
+    def rows(self, patient_id):
+        """The patient's rows (an empty frame with the table's columns if none)"""
+        positions = self.patient_index.get(patient_id)
+        if positions is None:
+            return self.df.iloc[0:0]
+        return self.df.iloc[positions]
+
+    def has_patient(self, patient_id):
+        return patient_id in self.patient_index
+
+
+class TableStore:
+    """CSV file name -> Table, reloaded when the file changes"""
+
+    def __init__(self, data_dir, shared_dir=None):
+        self.data_dir = data_dir
+        self.shared = SharedTables(shared_dir) if shared_dir else None
+        self._tables = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def path(self, file_name):
+        return os.path.join(self.data_dir, file_name)
+
+    @staticmethod
+    def _stamp(path):
+        """Version of a file ("<mtime_ns>-<size>" in hex), or None if it is missing"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    def stamp(self, file_name):
+        """Version of a table's file on disk, or None if it is missing"""
+        return self._stamp(self.path(file_name))
+
+    def _read(self, file_name, stamp, path):
+        if self.shared is None:
+            return read_table(path)
+        return self.shared.load(file_name, stamp, path)
+
+    def _file_lock(self, file_name):
+        with self._lock:
+            return self._locks.setdefault(file_name, threading.Lock())
+
+    def get(self, file_name):
+        """The current Table for a file, or None if the file does not exist"""
+        stamp = self.stamp(file_name)
+        if stamp is None:
+            self._tables.pop(file_name, None)
+            return None
+        table = self._tables.get(file_name)
+        if table is not None and table.stamp == stamp:
+            return table
+        # One reload per change; meanwhile other requests keep the previous version rather than wait
+        lock = self._file_lock(file_name)
+        if not lock.acquire(blocking=table is None):
+            return table
+        try:
+            previous = self._tables.get(file_name)
+            table = previous
+            if table is None or table.stamp != stamp:
+                table = Table(file_name, self._read(file_name, stamp, self.path(file_name)), stamp)
+                table.warm(previous)
+                self._tables[file_name] = table
+        finally:
+            lock.release()
+        return table
+
+    def replace(self, file_name, new_path):
+        """
+        Make the complete file at new_path the table's next version: it is loaded,
+        then renamed over the table's file and served from then on. Readers get the
+        previous version until the rename and the new one after, without waiting.
+        """
+        # A rename keeps the modification time and size, so the stamp carries over
+        stamp = self._stamp(new_path)
+        with self._file_lock(file_name):
+            table = Table(file_name, self._read(file_name, stamp, new_path), stamp)
+            table.warm(self._tables.get(file_name))
+            os.replace(new_path, self.path(file_name))
+            self._tables[file_name] = table
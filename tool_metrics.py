@@ -0,0 +1,232 @@
+"""
+Per-tool instrumentation for the FastMCP servers.
+
+Stack `@tool_metrics.instrument` under `@mcp.tool()` to record, per tool:
+- call counts by outcome ("ok", "error" for an {"error": ...} result, "exception")
+- error counts by class (the exception type, or the upstream exception/HTTP status
+  behind an {"error": ...} result)
+- wall-time latency and the part of it spent in upstream HTTP requests
+- argument and result payload sizes (JSON-encoded bytes)
+
+Upstream HTTP is measured by sending requests through `tool_metrics.http`, a
+requests.Session that attributes each request to the tool call it runs in.
+
+When tracing is configured (tracing.py), each tool call is also a server span that
+continues the caller's traceparent header, and each upstream request a client span
+that forwards it.
+
+`tool_metrics.register(mcp)` exposes the numbers as the MCP resource
+metrics://tools (JSON summary) and, on HTTP transports, as Prometheus text at
+GET /metrics.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import time
+
+import requests
+from mcp.server.lowlevel.server import request_ctx
+from starlette.responses import PlainTextResponse
+
+import tracing
+from metrics import DEFAULT_SIZE_BUCKETS, MetricsRegistry
+
+# The tool call currently running in this context, if any
+_current_call = contextvars.ContextVar("current_tool_call", default=None)
+
+
+def _payload_size(value):
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(str(value))
+
+
+def _incoming_trace_context():
+    """Trace context sent by the MCP client with the HTTP request behind this tool call"""
+    try:
+        request = request_ctx.get().request
+    except LookupError:
+        return None
+    return tracing.extract(request.headers) if request is not None else None
+
+
+class _CallStats:
+    __slots__ = ("upstream_seconds", "upstream_error", "span", "span_token")
+
+    def __init__(self):
+        self.upstream_seconds = 0.0
+        self.upstream_error = None
+        self.span = None
+        self.span_token = None
+
+
+class InstrumentedSession(requests.Session):
+    """requests.Session that reports each request to the tool call it runs in"""
+
+    def __init__(self, tool_metrics):
+        super().__init__()
+        self._tool_metrics = tool_metrics
+
+    def request(self, method, url, *args, **kwargs):
+        call = _current_call.get()
+        with tracing.span(f"HTTP {method.upper()}", tracing.KIND_CLIENT, **{"http.url": url}) as span:
+            kwargs["headers"] = tracing.inject(dict(kwargs.get("headers") or {}))
+            started = time.perf_counter()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except requests.exceptions.RequestException as e:
+                elapsed = time.perf_counter() - started
+                self._tool_metrics.record_upstream(call, method, type(e).__name__, elapsed, 0)
+                if call:
+                    call[1].upstream_error = type(e).__name__
+                raise
+            elapsed = time.perf_counter() - started
+            if span is not None:
+                span.set_attribute("http.status_code", response.status_code)
+        self._tool_metrics.record_upstream(call, method, response.status_code, elapsed, len(response.content))
+        if call and response.status_code >= 400:
+            call[1].upstream_error = f"HTTP {response.status_code}"
+        return response
+
+
+class ToolMetrics:
+    """Metrics for the tools of one MCP server"""
+
+    def __init__(self, server_name, registry=None):
+        self.server_name = server_name
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.calls = r.counter("mcp_tool_calls_total", "Tool calls by outcome", ["server", "tool", "outcome"])
+        self.errors = r.counter("mcp_tool_errors_total", "Failed tool calls by error class",
+                                ["server", "tool", "error_class"])
+        self.duration = r.histogram("mcp_tool_duration_seconds", "Wall time of tool calls", ["server", "tool"])
+        self.upstream = r.histogram("mcp_tool_upstream_seconds", "Time per tool call spent in upstream HTTP",
+                                    ["server", "tool"])
+        self.upstream_requests = r.counter("mcp_tool_upstream_requests_total", "Upstream HTTP requests",
+                                           ["server", "tool", "method", "status"])
+        self.upstream_bytes = r.histogram("mcp_tool_upstream_response_bytes", "Upstream HTTP response size",
+                                          ["server", "tool"], buckets=DEFAULT_SIZE_BUCKETS)
+        self.argument_bytes = r.histogram("mcp_tool_argument_bytes", "JSON size of tool arguments",
+                                          ["server", "tool"], buckets=DEFAULT_SIZE_BUCKETS)
+        self.result_bytes = r.histogram("mcp_tool_result_bytes", "JSON size of tool results",
+                                        ["server", "tool"], buckets=DEFAULT_SIZE_BUCKETS)
+        self._tools = []
+        self._http = None
+
+    @property
+    def http(self):
+        """Shared HTTP session (keep-alive) whose requests are attributed to the calling tool"""
+        if self._http is None:
+            self._http = InstrumentedSession(self)
+        return self._http
+
+    def record_upstream(self, call, method, status, seconds, size):
+        tool = call[0] if call else "none"
+        self.upstream_requests.inc(server=self.server_name, tool=tool, method=method.upper(), status=status)
+        self.upstream_bytes.observe(size, server=self.server_name, tool=tool)
+        if call:
+            call[1].upstream_seconds += seconds
+
+    def _start(self, name, args, kwargs):
+        self.argument_bytes.observe(_payload_size({"args": args, "kwargs": kwargs}),
+                                    server=self.server_name, tool=name)
+        stats = _CallStats()
+        stats.span = tracing.start_span(f"tool {name}", tracing.KIND_SERVER, _incoming_trace_context(),
+                                        {"mcp.server": self.server_name, "mcp.tool": name})
+        if stats.span is not None:
+            stats.span_token = tracing.activate(stats.span)
+        token = _current_call.set((name, stats))
+        return stats, token, time.perf_counter()
+
+    def _finish(self, name, stats, token, started, result=None, exc=None):
+        elapsed = time.perf_counter() - started
+        _current_call.reset(token)
+        if stats.span is not None:
+            tracing.deactivate(stats.span_token)
+            if exc is not None:
+                stats.span.record_error(exc)
+            elif isinstance(result, dict) and "error" in result:
+                stats.span.record_error(stats.upstream_error or "ToolError")
+            stats.span.end()
+        labels = {"server": self.server_name, "tool": name}
+        self.duration.observe(elapsed, **labels)
+        self.upstream.observe(stats.upstream_seconds, **labels)
+        if exc is not None:
+            self.calls.inc(outcome="exception", **labels)
+            self.errors.inc(error_class=type(exc).__name__, **labels)
+            return
+        self.result_bytes.observe(_payload_size(result), **labels)
+        if isinstance(result, dict) and "error" in result:
+            self.calls.inc(outcome="error", **labels)
+            self.errors.inc(error_class=stats.upstream_error or "ToolError", **labels)
+        else:
+            self.calls.inc(outcome="ok", **labels)
+
+    def instrument(self, fn):
+        """Decorator recording metrics for one tool; place it under @mcp.tool()"""
+        name = fn.__name__
+        self._tools.append(name)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                stats, token, started = self._start(name, args, kwargs)
+                try:
+                    result = await fn(*args, **kwargs)
+                except Exception as e:
+                    self._finish(name, stats, token, started, exc=e)
+                    raise
+                self._finish(name, stats, token, started, result=result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            stats, token, started = self._start(name, args, kwargs)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self._finish(name, stats, token, started, exc=e)
+                raise
+            self._finish(name, stats, token, started, result=result)
+            return result
+        return wrapper
+
+    def summary(self):
+        """Per-tool counts, error classes and latency quantiles as a JSON-ready dict"""
+        calls = self.calls.snapshot()
+        errors = self.errors.snapshot()
+        durations = self.duration.snapshot()
+        upstream = self.upstream.snapshot()
+        tools = {}
+        for name in self._tools:
+            key = (self.server_name, name)
+            duration = durations.get(key, {"sum": 0.0, "count": 0})
+            count = duration["count"]
+            tools[name] = {
+                "calls": {outcome: n for (_, tool, outcome), n in calls.items() if tool == name},
+                "errors": {error_class: n for (_, tool, error_class), n in errors.items() if tool == name},
+                "latency_seconds": {
+                    "mean": duration["sum"] / count if count else None,
+                    "p50": self.duration.quantile(0.5, server=self.server_name, tool=name),
+                    "p95": self.duration.quantile(0.95, server=self.server_name, tool=name),
+                    "p99": self.duration.quantile(0.99, server=self.server_name, tool=name),
+                },
+                "upstream_seconds_mean": upstream[key]["sum"] / count if count and key in upstream else None,
+            }
+        return {"server": self.server_name, "tools": tools}
+
+    def register(self, mcp):
+        """Expose the metrics on an MCP server as a resource and a /metrics HTTP route"""
+
+        @mcp.resource("metrics://tools", mime_type="application/json")
+        def tool_metrics_summary() -> dict:
+            """Per-tool call counts, error classes and latency quantiles"""
+            return self.summary()
+
+        @mcp.custom_route("/metrics", methods=["GET"])
+        async def prometheus_metrics(request):
+            return PlainTextResponse(self.registry.render_prometheus(),
+                                     media_type="text/plain; version=0.0.4")
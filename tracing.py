@@ -0,0 +1,306 @@
+"""
+Lightweight distributed tracing for the agent -> MCP server -> Flask API path.
+
+Trace context travels between processes in the W3C `traceparent` header. Every
+process that calls configure() while TRACE_DIR is set writes its finished spans to
+its own file in that directory:
+- TRACE_FORMAT=chrome (default): <service>-<pid>.trace.json in the Chrome trace
+  event format; open it in chrome://tracing or https://ui.perfetto.dev, or run
+  `python tracing.py merge TRACE_DIR` to combine every process into one timeline
+- TRACE_FORMAT=otlp: <service>-<pid>.otlp.jsonl, one OTLP/JSON
+  ExportTraceServiceRequest per line (the OpenTelemetry file exporter layout)
+
+When TRACE_DIR is unset, span() and start_span() are no-ops and nothing is written.
+"""
+import argparse
+import contextvars
+import glob
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+TRACEPARENT_HEADER = "traceparent"
+
+KIND_INTERNAL = "internal"
+KIND_SERVER = "server"
+KIND_CLIENT = "client"
+
+# OTLP SpanKind values
+_OTLP_KINDS = {KIND_INTERNAL: 1, KIND_SERVER: 2, KIND_CLIENT: 3}
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_exporter = None
+
+
+class SpanContext:
+    """The identity of a span, as carried across process boundaries"""
+    __slots__ = ("trace_id", "span_id")
+
+    def __init__(self, trace_id, span_id):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+
+class Span:
+    """A timed operation; call end() (or use span()) to export it"""
+
+    def __init__(self, name, kind, parent, attributes):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.thread_id = threading.get_ident()
+
+    @property
+    def context(self):
+        return SpanContext(self.trace_id, self.span_id)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if _exporter is not None:
+            _exporter.export(self)
+
+
+class ChromeTraceExporter:
+    """Chrome trace event format (JSON array form; the closing bracket is optional)"""
+
+    def __init__(self, path, service_name):
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write("[\n")
+        self._write({"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": service_name}})
+
+    def _write(self, event):
+        with self._lock:
+            self._file.write(json.dumps(event, default=str) + ",\n")
+            self._file.flush()
+
+    def export(self, span):
+        args = {"trace_id": span.trace_id, "span_id": span.span_id, "parent_id": span.parent_id,
+                "kind": span.kind, **span.attributes}
+        if span.error:
+            args["error"] = span.error
+        self._write({
+            "name": span.name,
+            "cat": span.kind,
+            "ph": "X",
+            "ts": span.start_ns / 1000,
+            "dur": (span.end_ns - span.start_ns) / 1000,
+            "pid": self.pid,
+            "tid": span.thread_id,
+            "args": args,
+        })
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpJsonExporter:
+    """OTLP/JSON, one ExportTraceServiceRequest per span per line"""
+
+    def __init__(self, path, service_name):
+        self.service_name = service_name
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, span):
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": _OTLP_KINDS[span.kind],
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        line = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "care-navigator"}, "spans": [otlp_span]}],
+        }]})
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+
+EXPORTERS = {"chrome": (ChromeTraceExporter, "trace.json"), "otlp": (OtlpJsonExporter, "otlp.jsonl")}
+
+
+def configure(service_name, trace_dir=None, trace_format=None):
+    """Start exporting this process's spans if tracing is enabled (default: TRACE_DIR env var)"""
+    global _exporter
+    if _exporter is not None:
+        return True
+    trace_dir = trace_dir or os.environ.get("TRACE_DIR")
+    if not trace_dir:
+        return False
+    trace_format = trace_format or os.environ.get("TRACE_FORMAT", "chrome")
+    if trace_format not in EXPORTERS:
+        raise ValueError(f"Unknown TRACE_FORMAT {trace_format!r}; choose from {sorted(EXPORTERS)}")
+    exporter_class, suffix = EXPORTERS[trace_format]
+    os.makedirs(trace_dir, exist_ok=True)
+    _exporter = exporter_class(os.path.join(trace_dir, f"{service_name}-{os.getpid()}.{suffix}"), service_name)
+    return True
+
+
+def enabled():
+    return _exporter is not None
+
+
+def current_span():
+    return _current_span.get()
+
+
+def start_span(name, kind=KIND_INTERNAL, parent=None, attributes=None):
+    """
+    Start a span that is not made current; returns None when tracing is off.
+
+    The parent defaults to the current span; pass a SpanContext from extract() to
+    continue a trace from another process.
+    """
+    if _exporter is None:
+        return None
+    if parent is None:
+        current = _current_span.get()
+        parent = current.context if current else None
+    return Span(name, kind, parent, attributes)
+
+
+def activate(span):
+    """Make span the current one; returns a token for deactivate()"""
+    return _current_span.set(span)
+
+
+def deactivate(token):
+    _current_span.reset(token)
+
+
+@contextmanager
+def span(name, kind=KIND_INTERNAL, parent=None, **attributes):
+    """Trace the enclosed block as a child of the current span (or of parent)"""
+    if _exporter is None:
+        yield None
+        return
+    s = start_span(name, kind, parent, attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        s.end()
+
+
+def inject(headers=None):
+    """Add the current trace context to a dict of outgoing headers"""
+    headers = {} if headers is None else headers
+    current = _current_span.get()
+    if current is not None:
+        headers[TRACEPARENT_HEADER] = f"00-{current.trace_id}-{current.span_id}-01"
+    return headers
+
+
+def extract(headers):
+    """SpanContext from incoming headers, or None when absent or malformed"""
+    if not headers:
+        return None
+    value = headers.get(TRACEPARENT_HEADER)
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return SpanContext(parts[1], parts[2])
+
+
+def instrument_flask(app, service_name="api_server"):
+    """Trace every request of a Flask app as a server span continuing the caller's trace"""
+    if not configure(service_name):
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_span():
+        s = start_span(f"{request.method} {request.path}", KIND_SERVER, extract(request.headers),
+                       {"http.method": request.method, "http.target": request.full_path.rstrip("?")})
+        g._trace_span = s
+        g._trace_token = activate(s)
+
+    @app.teardown_request
+    def _end_request_span(error):
+        s = g.pop("_trace_span", None)
+        if s is None:
+            return
+        if error is not None:
+            s.record_error(error)
+        deactivate(g.pop("_trace_token"))
+        s.end()
+
+    @app.after_request
+    def _record_status(response):
+        s = g.get("_trace_span")
+        if s is not None:
+            s.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                s.record_error(f"HTTP {response.status_code}")
+        return response
+
+
+def merge_chrome_traces(trace_dir, output):
+    """Combine the per-process Chrome trace files in trace_dir into one file"""
+    events = []
+    for path in sorted(glob.glob(os.path.join(trace_dir, "*.trace.json"))):
+        with open(path, encoding="utf-8") as f:
+            text = f.read().rstrip().rstrip(",")
+        if not text.endswith("]"):
+            text += "]"
+        events.extend(json.loads(text))
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trace file utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    merge = sub.add_parser("merge", help="Merge per-process Chrome trace files into one timeline")
+    merge.add_argument("trace_dir")
+    merge.add_argument("-o", "--output", default=None, help="Output file (default: TRACE_DIR/merged.json)")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.join(args.trace_dir, "merged.json")
+    count = merge_chrome_traces(args.trace_dir, output)
+    print(f"Wrote {count} events to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()